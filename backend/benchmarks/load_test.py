@@ -0,0 +1,469 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dt_time, timedelta
+
+# Seeds a database with synthetic clinic data and measures p50/p95/p99 latency and throughput
+# for every router, plus upload throughput. Results are printed (or written) as JSON so runs
+# can be diffed to catch regressions in crud.py query patterns.
+#   cd backend && python benchmarks/load_test.py --patients 2000 --output results.json
+# By default a fresh SQLite file in a temporary directory is used and requests go through the
+# app in-process. Pass --database-url for a local MySQL instead, and --base-url to load a
+# running server (seeded through the same --database-url).
+# Before timing anything, a few functional checks confirm the routes still answer the way the
+# scenarios expect (exit status 1 if one fails, --skip-checks to time anyway).
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_NAMES = ["María", "Ana", "Lucía", "Guadalupe", "Sofía", "Fernanda", "Patricia", "Verónica", "Rocío", "Elena"]
+LAST_NAMES = ["García", "Hernández", "López", "Martínez", "González", "Pérez", "Rodríguez", "Sánchez", "Ramírez", "Peña"]
+DIAGNOSES = ["Colposcopia normal", "Lesión intraepitelial de bajo grado (NIC I)", "NIC II", "Cervicitis crónica", "Ectropión"]
+RESOLUTIONS = ["Parto", "Cesárea", "Aborto"]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Seed synthetic clinic data and load-test the API")
+    parser.add_argument("--database-url", help="Database to seed (default: fresh SQLite file in a temp directory)")
+    parser.add_argument("--base-url", help="Load a running server instead of the in-process app")
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--exams-per-patient", type=int, default=5)
+    parser.add_argument("--appointments", type=int, default=2000)
+    parser.add_argument("--images-per-exam", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--upload-kb", type=int, default=256, help="Size of each uploaded image")
+    parser.add_argument("--scenario", action="append", help="Only run these scenarios (repeatable)")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse data already in --database-url")
+    parser.add_argument("--skip-checks", action="store_true", help="Do not run the functional checks first")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    return parser.parse_args(argv)
+
+# Synthetic data
+def patient_record(rng: random.Random, index: int):
+    birth_date = date(1950, 1, 1) + timedelta(days=rng.randrange(0, 365 * 55))
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+    return {
+        "name": name,
+        "birth_date": birth_date.isoformat(),
+        "age": (date.today() - birth_date).days // 365,
+        "sex": "Femenino",
+        "phone": f"442{rng.randrange(10**6, 10**7)}",
+        "email": f"paciente{index}@correo.mx",
+        "referrer": f"Dr. {rng.choice(LAST_NAMES)}",
+    }
+
+def pregnancy_registry(rng: random.Random):
+    return [
+        {
+            "year": str(rng.randrange(1990, 2024)),
+            "term": rng.choice(["Término", "Pretérmino"]),
+            "resolution": rng.choice(RESOLUTIONS),
+            "sex": rng.choice(["F", "M"]),
+            "weight": f"{rng.uniform(2.4, 4.1):.2f} kg",
+            "evolution": "Normal",
+            "nutrition": rng.choice(["Seno materno", "Fórmula", "Mixta"]),
+            "comments": "",
+        }
+        for _ in range(rng.randrange(0, 4))
+    ]
+
+def exam_record(rng: random.Random, patient_id: int, images_per_exam: int):
+    gestas = rng.randrange(0, 5)
+    return {
+        "patient_id": patient_id,
+        "study_date": (date(2018, 1, 1) + timedelta(days=rng.randrange(0, 365 * 7))).isoformat(),
+        "vulva_vagina_desc": "Sin lesiones aparentes en vulva y vagina. " * rng.randrange(1, 4),
+        "observations": "Zona de transformación tipo 1, epitelio acetoblanco tenue. " * rng.randrange(1, 6),
+        "diagnosis": rng.choice(DIAGNOSES),
+        "plan": "Control citológico en seis meses.",
+        "colposcopy_quality": "Adecuada",
+        "schiller_test": rng.choice(["Positivo", "Negativo"]),
+        "menarche_age": rng.randrange(10, 16),
+        "gestas": gestas,
+        "partos": gestas // 2,
+        "h_enfermedades": rng.choice(["Negados", "DM2", "HAS", "DM2, HAS"]),
+        "h_registro_embarazos": pregnancy_registry(rng),
+        "image_paths": [f"/static/{rng.getrandbits(256):064x}.jpg" for _ in range(images_per_exam)],
+    }
+
+def appointment_slots(start: date, count: int):
+    # Back-to-back 30 minute slots, 09:00-19:00, Monday to Saturday
+    day = start
+    while count > 0:
+        if day.weekday() < 6:
+            for slot in range(min(20, count)):
+                yield datetime.combine(day, dt_time(9)) + timedelta(minutes=30 * slot)
+            count -= min(20, count)
+        day += timedelta(days=1)
+
+def seed(args, rng: random.Random):
+    import bulk, models
+    from database import SessionLocal
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        patients = (json.dumps(patient_record(rng, index)) for index in range(args.patients))
+        report = {"patients": bulk.import_records(db, "patients", patients)}
+        patient_ids = id_range(db, models.Patient)
+
+        exams = (
+            json.dumps(exam_record(rng, patient_id, args.images_per_exam))
+            for patient_id in range(patient_ids[0], patient_ids[1] + 1)
+            for _ in range(args.exams_per_patient)
+        )
+        report["exams"] = bulk.import_records(db, "exams", exams)
+
+        appointments = (
+            json.dumps({
+                "patient_id": rng.randint(*patient_ids),
+                "date_time": slot.isoformat(),
+                "reason": "Revisión",
+                "status": rng.choice(["Pendiente", "Confirmada", "Completada"]),
+            })
+            for slot in appointment_slots(date.today() - timedelta(days=30), args.appointments)
+        )
+        report["appointments"] = bulk.import_records(db, "appointments", appointments)
+    finally:
+        db.close()
+    return {
+        entity: {"inserted": result["inserted"], "failed": result["failed"]} for entity, result in report.items()
+    } | {"seconds": round(time.perf_counter() - started, 3)}
+
+def id_range(db, model):
+    from sqlalchemy import func, select
+    return tuple(db.execute(select(func.min(model.id), func.max(model.id))).one())
+
+def sample_jpeg(size_kb: int):
+    from PIL import Image
+    side = max(64, int((size_kb * 1024 / 3) ** 0.5))
+    noise = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    noise.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+# Scenarios: each takes (client, rng, ctx) and returns the response
+class Context:
+    def __init__(self, patient_ids, patient_count, exam_ids, upload_image):
+        self.patient_ids = patient_ids
+        self.patient_count = patient_count
+        self.exam_ids = exam_ids
+        self.upload_image = upload_image
+        self.summary_cursors = [] # next_cursor of every /patients/summary page, filled in by main()
+        self.lock = threading.Lock()
+        self.slot = datetime.combine(date.today() + timedelta(days=400), dt_time(9))
+
+    def patient_id(self, rng):
+        return rng.randint(*self.patient_ids)
+
+    def exam_id(self, rng):
+        return rng.randint(*self.exam_ids)
+
+    def next_slot(self):
+        # Fresh, non-overlapping slots far in the future so bookings never conflict
+        with self.lock:
+            self.slot += timedelta(minutes=30)
+            return self.slot
+
+def _today():
+    return datetime.combine(date.today(), dt_time())
+
+def create_appointment(client, rng, ctx):
+    return client.post("/appointments/", json={
+        "patient_id": ctx.patient_id(rng), "date_time": ctx.next_slot().isoformat(), "reason": "Carga",
+    })
+
+def delete_appointment(client, rng, ctx):
+    created = create_appointment(client, rng, ctx).json()
+    return client.delete(f"/appointments/{created['id']}")
+
+def create_exam(client, rng, ctx):
+    return client.post("/exams/", json=exam_record(rng, ctx.patient_id(rng), 2))
+
+def delete_exam(client, rng, ctx):
+    created = create_exam(client, rng, ctx).json()
+    return client.delete(f"/exams/{created['id']}")
+
+def delete_patient(client, rng, ctx):
+    created = client.post("/patients/", json=patient_record(rng, rng.getrandbits(32))).json()
+    return client.delete(f"/patients/{created['id']}")
+
+def create_exam_with_images(client, rng, ctx):
+    return client.post(
+        "/exams/with-images",
+        data={"exam": json.dumps(exam_record(rng, ctx.patient_id(rng), 0))},
+        files=[("files", (f"exam{index}.jpg", unique_image(ctx), "image/jpeg")) for index in range(2)],
+    )
+
+def delete_exams(client, rng, ctx):
+    created = [create_exam(client, rng, ctx).json()["id"] for _ in range(3)]
+    return client.delete("/exams/", params={"ids": ",".join(map(str, created))})
+
+def unique_image(ctx):
+    # Unique bytes per file so the content-addressed store writes every one
+    return ctx.upload_image + os.urandom(16)
+
+def upload(client, rng, ctx):
+    return client.post("/upload/", files={"file": ("exam.jpg", unique_image(ctx), "image/jpeg")})
+
+def upload_batch(client, rng, ctx):
+    return client.post("/upload/batch", files=[("files", (f"exam{index}.jpg", unique_image(ctx), "image/jpeg")) for index in range(3)])
+
+def summary_page(client, rng, ctx):
+    params = {"limit": 50}
+    if ctx.summary_cursors:
+        params["cursor"] = rng.choice(ctx.summary_cursors)
+    return client.get("/patients/summary", params=params)
+
+def walk_summary(client, order_by: str, limit: int = 50):
+    # Follows next_cursor to the end; returns (patient ids in page order, cursors)
+    ids, cursors, cursor = [], [], None
+    while True:
+        params = {"limit": limit, "order_by": order_by}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/patients/summary", params=params)
+        expect(response.status_code == 200, f"/patients/summary?order_by={order_by} returned {response.status_code}")
+        page = response.json()
+        ids.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return ids, cursors
+        cursors.append(cursor)
+
+# Functional checks: each takes (client, ctx) and raises CheckFailed
+class CheckFailed(Exception):
+    pass
+
+def expect(condition, message: str):
+    if not condition:
+        raise CheckFailed(message)
+
+def check_summary_cursors(client, ctx):
+    # Every patient exactly once, in order, whichever key the cursor carries
+    for order_by in ("id", "name"):
+        ids, _ = walk_summary(client, order_by, limit=37)
+        expect(len(ids) == len(set(ids)), f"order_by={order_by}: a patient appears on two pages")
+        expect(len(ids) == ctx.patient_count, f"order_by={order_by}: {len(ids)} patients listed, {ctx.patient_count} in the database")
+    # A cursor handed out for one order is rejected by the other
+    _, name_cursors = walk_summary(client, "name", limit=37)
+    if name_cursors:
+        status = client.get("/patients/summary", params={"order_by": "id", "cursor": name_cursors[0]}).status_code
+        expect(status == 400, f"a name-order cursor with order_by=id returned {status}, expected 400")
+
+def check_exam_with_images(client, ctx):
+    response = create_exam_with_images(client, random.Random(0), ctx)
+    expect(response.status_code == 200, f"/exams/with-images returned {response.status_code}")
+    exam = response.json()
+    try:
+        paths = exam["image_paths"]
+        expect(len(paths) == 2 and all(path.startswith("/static/") for path in paths), f"unexpected image_paths {paths}")
+        for path in paths:
+            expect(client.get(path).status_code == 200, f"{path} is not served")
+    finally:
+        client.delete(f"/exams/{exam['id']}")
+
+def check_phone_search(client, ctx):
+    # Phones are indexed as one digit string; queries typed with separators must still find them
+    record = patient_record(random.Random(0), 0) | {"name": "Zuleima Check", "phone": "442-987-6543"}
+    patient = client.post("/patients/", json=record).json()
+    try:
+        for q in ("442-987-6543", "442 987", "4429876543", "zuleima 442 98"):
+            hits = client.get("/patients/search", params={"q": q, "limit": 50}).json()
+            expect(patient["id"] in [hit["id"] for hit in hits], f"/patients/search?q={q} does not find the patient")
+    finally:
+        client.delete(f"/patients/{patient['id']}")
+
+CHECKS = {
+    "patients.summary_cursors": check_summary_cursors,
+    "patients.phone_search": check_phone_search,
+    "exams.with_images": check_exam_with_images,
+}
+
+def run_checks(client, ctx):
+    failures = {}
+    for name, check in CHECKS.items():
+        try:
+            check(client, ctx)
+        except CheckFailed as e:
+            failures[name] = str(e)
+        print(f"check {name:<32} {'FAILED: ' + failures[name] if name in failures else 'ok'}", file=sys.stderr)
+    return failures
+
+SCENARIOS = {
+    # patients router
+    "patients.list": lambda c, rng, ctx: c.get("/patients/", params={"skip": rng.randrange(0, 500), "limit": 100}),
+    "patients.summary": summary_page,
+    "patients.batch": lambda c, rng, ctx: c.get("/patients/batch", params={"ids": ",".join(str(ctx.patient_id(rng)) for _ in range(20))}),
+    "patients.search": lambda c, rng, ctx: c.get("/patients/search", params={"q": rng.choice(FIRST_NAMES)[:3] + " " + rng.choice(LAST_NAMES)[:4]}),
+    "patients.detail": lambda c, rng, ctx: c.get(f"/patients/{ctx.patient_id(rng)}"),
+    "patients.history": lambda c, rng, ctx: c.get(f"/patients/{ctx.patient_id(rng)}/history"),
+    "patients.history_versions": lambda c, rng, ctx: c.get(f"/patients/{ctx.patient_id(rng)}/history/versions"),
+    "patients.create": lambda c, rng, ctx: c.post("/patients/", json=patient_record(rng, rng.getrandbits(32))),
+    "patients.update": lambda c, rng, ctx: c.put(f"/patients/{ctx.patient_id(rng)}", json=patient_record(rng, rng.getrandbits(32))),
+    "patients.delete": delete_patient,
+    # exams router
+    "exams.detail": lambda c, rng, ctx: c.get(f"/exams/{ctx.exam_id(rng)}"),
+    "exams.history": lambda c, rng, ctx: c.get(f"/exams/{ctx.exam_id(rng)}/history"),
+    "exams.create": create_exam,
+    "exams.create_with_images": create_exam_with_images,
+    "exams.search": lambda c, rng, ctx: c.get("/exams/search", params={"q": rng.choice(["acetoblanco", "NIC", "lesiones vagina", "control citológico"])}),
+    "exams.report": lambda c, rng, ctx: c.get(f"/exams/{ctx.exam_id(rng)}/report.pdf"),
+    "exams.update": lambda c, rng, ctx: c.put(f"/exams/{ctx.exam_id(rng)}", json={"study_date": date.today().isoformat(), "plan": "Colposcopia de control", "diagnosis": rng.choice(DIAGNOSES)}),
+    "exams.delete": delete_exam,
+    "exams.delete_batch": delete_exams,
+    # appointments router
+    "appointments.list": lambda c, rng, ctx: c.get("/appointments/", params={"start": _today().isoformat(), "limit": 100}),
+    "appointments.list_patient": lambda c, rng, ctx: c.get("/appointments/", params={"patient_id": ctx.patient_id(rng)}),
+    "appointments.counts": lambda c, rng, ctx: c.get("/appointments/counts", params={"start": (_today() - timedelta(days=30)).isoformat(), "end": (_today() + timedelta(days=30)).isoformat()}),
+    "appointments.availability": lambda c, rng, ctx: c.get("/appointments/availability", params={"start": _today().isoformat(), "duration_minutes": 30}),
+    "appointments.create": create_appointment,
+    "appointments.delete": delete_appointment,
+    # upload router
+    "upload.image": upload,
+    "upload.batch": upload_batch,
+    # bulk router
+    "bulk.export_patients": lambda c, rng, ctx: c.get("/bulk/patients/export", params={"format": "ndjson"}),
+}
+
+# Scenarios whose throughput is also reported in MB/s, and the files each request sends
+UPLOAD_FILES = {"upload.image": 1, "upload.batch": 3, "exams.create_with_images": 2}
+
+# Requests per scenario are capped for the heavy ones so a default run stays short
+REQUEST_CAPS = {"bulk.export_patients": 10, "exams.report": 20}
+
+def percentile(sorted_values, fraction: float):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_scenario(client, name: str, scenario, ctx, requests: int, concurrency: int, seed_value: int):
+    latencies = []
+    errors = {}
+    bytes_sent = 0
+    lock = threading.Lock()
+
+    def one(index: int):
+        nonlocal bytes_sent
+        rng = random.Random(seed_value * 100003 + index)
+        started = time.perf_counter()
+        try:
+            response = scenario(client, rng, ctx)
+            status = response.status_code
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if not (isinstance(status, int) and status < 400):
+                errors[str(status)] = errors.get(str(status), 0) + 1
+            elif name in UPLOAD_FILES:
+                bytes_sent += UPLOAD_FILES[name] * (len(ctx.upload_image) + 16)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "requests": requests,
+        "errors": sum(errors.values()),
+        "error_statuses": errors,
+        "throughput_rps": round(requests / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 3),
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3),
+        },
+    }
+    if bytes_sent:
+        result["upload_mb_per_s"] = round(bytes_sent / wall / (1024 * 1024), 2)
+    return result
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    workdir = tempfile.mkdtemp(prefix="colposcopia-bench-")
+    # Before importing the app: database.py and the routers read these at import time
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir) # uploads/ is created relative to the working directory
+
+    import main as app_main
+    import migrations
+    import models
+    from sqlalchemy import func, select
+    from database import SessionLocal, engine
+
+    migrations.upgrade(engine)
+    rng = random.Random(args.seed)
+    seeded = None if args.skip_seed else seed(args, rng)
+
+    db = SessionLocal()
+    try:
+        ctx = Context(
+            id_range(db, models.Patient),
+            db.scalar(select(func.count(models.Patient.id))),
+            id_range(db, models.ColposcopyExam),
+            sample_jpeg(args.upload_kb),
+        )
+    finally:
+        db.close()
+
+    if args.base_url:
+        import httpx
+        client = httpx.Client(base_url=args.base_url, timeout=60)
+    else:
+        from fastapi.testclient import TestClient
+        client = TestClient(app_main.app)
+
+    results = {}
+    # Entering the client runs the app's lifespan startup/shutdown
+    with client:
+        if not args.skip_checks:
+            failures = run_checks(client, ctx)
+            if failures:
+                sys.exit(1)
+        _, ctx.summary_cursors = walk_summary(client, "id")
+        for index, (name, scenario) in enumerate(SCENARIOS.items()):
+            if args.scenario and name not in args.scenario:
+                continue
+            requests = min(args.requests, REQUEST_CAPS.get(name, args.requests))
+            results[name] = run_scenario(client, name, scenario, ctx, requests, args.concurrency, args.seed + index)
+            print(f"{name:<28} p50={results[name]['latency_ms']['p50']:>8} ms  p99={results[name]['latency_ms']['p99']:>8} ms  errors={results[name]['errors']}", file=sys.stderr)
+
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output",)},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.url.get_backend_name(),
+            "async_db": app_main.USE_ASYNC_DB,
+        },
+        "seed": seeded,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            out.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
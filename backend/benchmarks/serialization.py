@@ -0,0 +1,85 @@
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import date
+
+# Per-response latency and CPU of building and encoding GET /patients/{id} bodies for
+# synthetic patients with 1-200 exams. No database or HTTP: the ORM objects are built in
+# memory so only validation and encoding are measured.
+#   legacy: response_model validation, then jsonable_encoder + json.dumps (FastAPI < 0.130,
+#           or any endpoint with a custom response_class)
+#   stock:  response_model validation, then pydantic's JSON serializer (FastAPI >= 0.130)
+#   fast:   responses.model_response with FAST_JSON on (one validation, orjson)
+# Run from backend/: python benchmarks/serialization.py --iterations 500
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.encoders import jsonable_encoder
+import models, schemas, responses
+
+EXAM_COUNTS = (1, 10, 50, 100, 200)
+
+def synthetic_patient(exam_count: int):
+    patient = models.Patient(
+        id=exam_count, name="Paciente de Prueba", birth_date=date(1985, 5, 17), age=40, sex="Femenino",
+        phone="4421234567", email="paciente@correo.mx", referrer="Dr. Pérez", additional_data="Sin datos adicionales",
+    )
+    patient.exams = [
+        models.ColposcopyExam(
+            id=index, patient_id=patient.id, study_date=date(2020 + index % 5, 1 + index % 12, 1 + index % 28),
+            diagnosis="Lesión intraepitelial de bajo grado (NIC I), control en seis meses", referred_by="GENERICO",
+        )
+        for index in range(1, exam_count + 1)
+    ]
+    return patient
+
+def legacy(patient):
+    model = schemas.from_orm(schemas.Patient, patient)
+    return json.dumps(jsonable_encoder(schemas.dump(model)), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def stock(patient):
+    model = schemas.from_orm(schemas.Patient, patient)
+    return model.model_dump_json().encode("utf-8") if hasattr(model, "model_dump_json") else model.json().encode("utf-8")
+
+def fast(patient):
+    return responses.model_response(schemas.Patient, patient).body
+
+PATHS = {"legacy": legacy, "stock": stock, "fast": fast}
+
+def measure(render, patient, iterations: int):
+    wall, cpu = [], []
+    for _ in range(iterations):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        body = render(patient)
+        cpu.append(time.process_time() - cpu_start)
+        wall.append(time.perf_counter() - wall_start)
+    return statistics.median(wall) * 1000, statistics.mean(cpu) * 1000, body
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark response serialization paths")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if responses.orjson is None:
+        sys.exit("orjson is not installed")
+    responses.FAST_JSON = True
+
+    print(f"{'exams':>5} {'bytes':>7} {'gzip':>6}" + "".join(f" {name + ' ms':>10} {name + ' cpu':>10}" for name in PATHS))
+    for count in EXAM_COUNTS:
+        patient = synthetic_patient(count)
+        row, bodies = "", []
+        for render in PATHS.values():
+            measure(render, patient, 5)
+            wall_ms, cpu_ms, body = measure(render, patient, args.iterations)
+            bodies.append(json.loads(body))
+            row += f" {wall_ms:>10.3f} {cpu_ms:>10.3f}"
+        assert all(body == bodies[0] for body in bodies)
+        print(f"{count:>5} {len(body):>7} {len(gzip.compress(body)):>6}" + row)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+from collections import defaultdict
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from pydantic import ValidationError
+import argparse
+import csv
+import io
+import json
+import sys
+import models, schemas, crud, cache, scheduling, reporting
+from database import SessionLocal
+
+# Bulk NDJSON/CSV import and export for patients, exams and appointments.
+# Imports validate each row, then insert in chunked transactions; rows that fail are
+# reported with their line number instead of aborting the whole file.
+#
+# Imported patients always get new ids. To bring in another clinic's archive, import its
+# patients, then its exams and appointments, all with the same source name: the archive's
+# patient ids are recorded (models.PatientSourceKey) and the patient_id of later rows is
+# resolved through them. Without a source, patient_id must be an id of this database.
+
+CHUNK_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ("ndjson", "csv")
+
+ENTITIES = {
+    "patients": {
+        "model": models.Patient,
+        "create_schema": schemas.PatientCreate,
+        "export_schema": schemas.PatientBrief,
+    },
+    "exams": {
+        "model": models.ColposcopyExam,
+        "create_schema": schemas.ColposcopyExamCreate,
+        "export_schema": schemas.ColposcopyExam,
+    },
+    "appointments": {
+        "model": models.Appointment,
+        "create_schema": schemas.AppointmentCreate,
+        "export_schema": schemas.Appointment,
+    },
+}
+
+class BulkImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line: int, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self):
+        return {"inserted": self.inserted, "failed": self.failed, "errors": self.errors}
+
+# Parsing
+def _csv_value(value: str, keep_empty: bool = False):
+    # The export writes None as "": read back as None unless the field cannot be null
+    if value == "":
+        return "" if keep_empty else None
+    if value[:1] in ("[", "{"):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+def iter_records(text_stream, fmt: str, string_fields=frozenset()):
+    # Yields (line_number, record_or_None, parse_error_or_None); string_fields keep "" in CSV
+    if fmt == "csv":
+        reader = csv.DictReader(text_stream)
+        for record in reader:
+            yield reader.line_num, {key: _csv_value(value, key in string_fields) for key, value in record.items() if key}, None
+        return
+
+    for line_number, line in enumerate(text_stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, record, None
+
+def _chunks(iterable, size: int):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Import
+def _new_source_patients(db: Session, rows, source: str, result: BulkImportResult):
+    # Skips patients of the source that an earlier import already brought in
+    if source is None:
+        return rows
+    source_ids = {data["source_id"] for _, data in rows}
+    imported = dict(db.execute(
+        select(models.PatientSourceKey.source_id, models.PatientSourceKey.patient_id)
+        .where(models.PatientSourceKey.source == source, models.PatientSourceKey.source_id.in_(source_ids))
+    ).all())
+    valid = []
+    for line, data in rows:
+        if data["source_id"] in imported:
+            result.error(line, f"Patient id {data['source_id']} of source '{source}' was already imported as patient {imported[data['source_id']]}")
+        else:
+            valid.append((line, data))
+    return valid
+
+def _prepare_patients(db: Session, rows):
+    prepared = []
+    for line, data in rows:
+        source, source_id = data.pop("source", None), data.pop("source_id", None)
+        db_patient = models.Patient(**data)
+        if source is not None:
+            db_patient.source_keys.append(models.PatientSourceKey(source=source, source_id=source_id))
+        prepared.append((line, db_patient))
+    return prepared
+
+def _insert_patients(db: Session, prepared):
+    # ORM objects so each patient's search terms are written with it
+    for _, db_patient in prepared:
+        crud._index_patient(db_patient)
+    db.add_all(db_patient for _, db_patient in prepared)
+    db.flush()
+
+def _local_patient_ids(db: Session, rows, source: str):
+    # {patient_id as written in the file: local patient id}
+    ids = {data.get("patient_id") for _, data in rows}
+    if source is None:
+        return {patient_id: patient_id for patient_id in db.scalars(select(models.Patient.id).where(models.Patient.id.in_(ids)))}
+    return dict(db.execute(
+        select(models.PatientSourceKey.source_id, models.PatientSourceKey.patient_id)
+        .where(models.PatientSourceKey.source == source, models.PatientSourceKey.source_id.in_(ids))
+    ).all())
+
+def _with_local_patients(db: Session, rows, source: str, result: BulkImportResult):
+    # Rewrites patient_id to the local patient; rows whose patient is unknown are rejected
+    patient_ids = _local_patient_ids(db, rows, source)
+    valid = []
+    for line, data in rows:
+        patient_id = patient_ids.get(data.get("patient_id"))
+        if patient_id is None:
+            where = f" in source '{source}'" if source is not None else ""
+            result.error(line, f"Unknown patient_id {data.get('patient_id')}{where}")
+        else:
+            valid.append((line, {**data, "patient_id": patient_id}))
+    return valid
+
+def _load_histories(db: Session, keys):
+    # {(patient_id, content_hash): earliest matching version}, loaded into the session
+    stmt = (
+        select(models.PatientHistory)
+        .where(
+            models.PatientHistory.patient_id.in_({patient_id for patient_id, _ in keys}),
+            models.PatientHistory.content_hash.in_({content_hash for _, content_hash in keys}),
+        )
+        .order_by(models.PatientHistory.version.desc())
+    )
+    return {(history.patient_id, history.content_hash): history for history in db.scalars(stmt)}
+
+def _resolve_histories(db: Session, pending):
+    # Chunk-wide crud.resolve_history: pending is {(patient_id, content_hash): (effective_date, values)}
+    # in file order. Existing versions are read in one query and the missing ones written in
+    # one executemany, instead of a lookup and a flush per new history.
+    histories = _load_histories(db, pending)
+    missing = [key for key in pending if key not in histories]
+    if not missing:
+        return histories
+
+    last_versions = dict(db.execute(
+        select(models.PatientHistory.patient_id, func.max(models.PatientHistory.version))
+        .where(models.PatientHistory.patient_id.in_({patient_id for patient_id, _ in missing}))
+        .group_by(models.PatientHistory.patient_id)
+    ).all())
+    new_rows = []
+    for patient_id, content_hash in missing:
+        last_versions[patient_id] = (last_versions.get(patient_id) or 0) + 1
+        effective_date, values = pending[(patient_id, content_hash)]
+        new_rows.append({
+            "patient_id": patient_id,
+            "version": last_versions[patient_id],
+            "effective_date": effective_date,
+            "content_hash": content_hash,
+            **{field: values.get(field) for field in models.HISTORY_FIELDS},
+        })
+    # render_nulls: one executemany, rather than a batch per distinct set of non-null columns
+    db.execute(insert(models.PatientHistory).execution_options(render_nulls=True), new_rows)
+    return _load_histories(db, pending)
+
+def _prepare_exams(db: Session, rows):
+    split = []
+    pending = {}
+    for line, data in rows:
+        data, history_values = crud.split_history(data)
+        key = (data["patient_id"], crud.history_hash(history_values))
+        # The first exam recording a version dates it
+        pending.setdefault(key, (data.get("study_date"), history_values))
+        split.append((line, data, key))
+
+    histories = _resolve_histories(db, pending)
+    # The version objects themselves, not their ids: the session only holds them weakly
+    return [(line, {**data, "history": histories[key]}) for line, data, key in split]
+
+def _insert_exams(db: Session, prepared):
+    # ORM objects so each exam's search terms are written with it
+    db_exams = []
+    for _, data in prepared:
+        db_exam = models.ColposcopyExam(**data)
+        crud._index_exam(db_exam)
+        db_exams.append(db_exam)
+    db.add_all(db_exams)
+    db.flush()
+    # One summary upsert per (month, value) for the whole chunk
+    reporting.track_exam_changes(db, [(None, reporting.exam_values(db_exam)) for db_exam in db_exams])
+
+def _without_overlaps(db: Session, rows, result: BulkImportResult):
+    # crud.create_appointment's rule for the whole chunk: an appointment that occupies its slot
+    # may not overlap an existing booking or an earlier row of the file. The days involved
+    # stay locked until the chunk commits.
+    # ends_at is what the checks compare against, so it is filled in here and stored with the row
+    for _, data in rows:
+        data["ends_at"] = scheduling.appointment_end(data["date_time"], data["duration_minutes"])
+    blocking = [data for _, data in rows if data.get("status") not in scheduling.NON_BLOCKING_STATUSES]
+    if not blocking:
+        return rows
+    intervals = [(data["date_time"], data["ends_at"]) for data in blocking]
+    crud.lock_schedule_days(db, (day for start, end in intervals for day in scheduling.days_spanned(start, end)))
+
+    booked = defaultdict(list) # day -> [(start, end, what)]
+    stmt = crud.busy_appointments_stmt(min(start for start, _ in intervals), max(end for _, end in intervals), lock=True)
+    for db_appointment in db.scalars(stmt):
+        for day in scheduling.days_spanned(db_appointment.date_time, db_appointment.ends_at):
+            booked[day].append((db_appointment.date_time, db_appointment.ends_at, f"appointment {db_appointment.id}"))
+
+    valid = []
+    for line, data in rows:
+        if data.get("status") not in scheduling.NON_BLOCKING_STATUSES:
+            start, end = data["date_time"], data["ends_at"]
+            days = list(scheduling.days_spanned(start, end))
+            conflicts = sorted({what for day in days for other_start, other_end, what in booked[day] if other_start < end and other_end > start})
+            if conflicts:
+                result.error(line, f"Overlaps {', '.join(conflicts)}")
+                continue
+            for day in days:
+                booked[day].append((start, end, f"line {line}"))
+        valid.append((line, data))
+    return valid
+
+def _bookable_appointments(db: Session, rows, source: str, result: BulkImportResult):
+    return _without_overlaps(db, _with_local_patients(db, rows, source, result), result)
+
+def _prepare_rows(db: Session, rows):
+    return rows
+
+def _insert_rows(model):
+    def insert_rows(db: Session, prepared):
+        db.execute(insert(model), [data for _, data in prepared])
+    return insert_rows
+
+# entity -> (filter rows, prepare rows, insert prepared rows)
+IMPORTERS = {
+    "patients": (_new_source_patients, _prepare_patients, _insert_patients),
+    "exams": (_with_local_patients, _prepare_exams, _insert_exams),
+    "appointments": (_bookable_appointments, _prepare_rows, _insert_rows(models.Appointment)),
+}
+
+def _invalidate_cached(entity: str, rows):
+    # New exams change their patients' cached detail responses
+    if entity == "exams":
+        for patient_id in {data["patient_id"] for _, data in rows}:
+            cache.invalidate_patient(patient_id)
+
+def _insert_chunk(db: Session, entity: str, rows, result: BulkImportResult, source: str = None):
+    filter_rows, prepare, insert_prepared = IMPORTERS[entity]
+
+    accepted = filter_rows(db, rows, source, result)
+    if not accepted:
+        db.commit() # releases the schedule-day locks
+        return
+
+    try:
+        insert_prepared(db, prepare(db, [(line, dict(data)) for line, data in accepted]))
+        db.commit()
+        _invalidate_cached(entity, accepted)
+        result.inserted += len(accepted)
+        return
+    except SQLAlchemyError:
+        db.rollback()
+
+    # Chunk failed: retry row by row to isolate the offending records. The rollback released
+    # the locks taken by filter_rows, so each row is filtered again in its own transaction.
+    accepted_lines = {line for line, _ in accepted}
+    for line, data in rows:
+        if line not in accepted_lines:
+            continue
+        try:
+            retried = filter_rows(db, [(line, data)], source, result)
+            if retried:
+                insert_prepared(db, prepare(db, [(line, dict(data)) for line, data in retried]))
+            db.commit()
+            _invalidate_cached(entity, retried)
+            result.inserted += len(retried)
+        except SQLAlchemyError as e:
+            db.rollback()
+            result.error(line, str(e.orig if getattr(e, "orig", None) is not None else e))
+
+def _source_id(record: dict):
+    try:
+        return int(record.get("id"))
+    except (TypeError, ValueError):
+        return None
+
+def import_records(db: Session, entity: str, text_stream, fmt: str = "ndjson", chunk_size: int = CHUNK_SIZE, source: str = None):
+    # source: name of the archive the rows come from (see the module comment)
+    create_schema = ENTITIES[entity]["create_schema"]
+    string_fields = schemas.non_nullable_string_fields(create_schema)
+    result = BulkImportResult()
+
+    def validated():
+        for line, record, parse_error in iter_records(text_stream, fmt, string_fields):
+            if parse_error:
+                result.error(line, parse_error)
+                continue
+            try:
+                data = create_schema(**record).dict()
+            except ValidationError as e:
+                result.error(line, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+                continue
+            if entity == "patients" and source is not None:
+                source_id = _source_id(record)
+                if source_id is None:
+                    result.error(line, "id: the patient's id in the source archive is required when importing with a source")
+                    continue
+                data.update(source=source, source_id=source_id)
+            yield line, data
+
+    for rows in _chunks(validated(), chunk_size):
+        _insert_chunk(db, entity, rows, result, source)
+    return result.as_dict()
+
+# Export
+def _export_query(db: Session, entity: str, last_id: int):
+    model = ENTITIES[entity]["model"]
+    query = db.query(model)
+    if entity == "exams":
+        query = query.options(*crud.exam_detail_options())
+    return query.filter(model.id > last_id).order_by(model.id.asc()).limit(EXPORT_BATCH_SIZE)
+
+def iter_export_rows(entity: str):
+    # Own session: the generator outlives the request's dependency-managed session
+    export_schema = ENTITIES[entity]["export_schema"]
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            batch = _export_query(db, entity, last_id).all()
+            if not batch:
+                break
+            for db_obj in batch:
+                yield schemas.from_orm(export_schema, db_obj).dict()
+            last_id = batch[-1].id
+            db.expunge_all()
+    finally:
+        db.close()
+
+def export_fieldnames(entity: str):
+    return list(ENTITIES[entity]["export_schema"].__fields__)
+
+def _csv_cell(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str, ensure_ascii=False)
+    return "" if value is None else value
+
+def iter_export_lines(entity: str, fmt: str = "ndjson"):
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=export_fieldnames(entity))
+        writer.writeheader()
+        for row in iter_export_rows(entity):
+            writer.writerow({key: _csv_cell(value) for key, value in row.items()})
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+        return
+
+    for row in iter_export_rows(entity):
+        yield json.dumps(row, default=str, ensure_ascii=False) + "\n"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export of clinic data")
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("entity", choices=sorted(ENTITIES))
+    parser.add_argument("path", nargs="?", default="-", help="File to read/write ('-' for stdin/stdout)")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--source", help="Archive name: maps the file's patient ids to the patients imported from it")
+    args = parser.parse_args(argv)
+
+    if args.action == "export":
+        out = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8", newline="")
+        try:
+            for chunk in iter_export_lines(args.entity, args.format):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return
+
+    source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8-sig", newline="")
+    db = SessionLocal()
+    try:
+        result = import_records(db, args.entity, source, args.format, args.chunk_size, args.source)
+    finally:
+        db.close()
+        if source is not sys.stdin:
+            source.close()
+    print(json.dumps(result, default=str, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
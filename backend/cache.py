@@ -0,0 +1,147 @@
+from collections import OrderedDict
+from fastapi import HTTPException, Request, Response
+import hashlib
+import os
+import threading
+import time
+import responses
+
+# Serialized-response cache for the patient and exam detail endpoints.
+# Entries hold the encoded JSON body and its ETag, so a hit skips the database and encoding,
+# and a matching If-None-Match skips the body too. crud.py invalidates entries after every
+# committed write.
+# The store is per process and invalidations only reach the process that made the write, so it
+# is opt-in (RESPONSE_CACHE=true) and only correct when a single process serves the app: plain
+# "uvicorn main:app" or WEB_CONCURRENCY=1 with gunicorn. With several workers (gunicorn, or
+# uvicorn --workers) the others would serve the pre-edit record until its TTL; leave it off
+# there unless a shared store is installed with set_backend(). Disabled, responses still carry
+# ETags and answer If-None-Match.
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "false").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+
+class CacheEntry:
+    __slots__ = ("body", "etag", "tags", "expires_at")
+
+    def __init__(self, body: bytes, etag: str, tags, expires_at: float):
+        self.body = body
+        self.etag = etag
+        self.tags = tags
+        self.expires_at = expires_at
+
+class LRUCache:
+    # TTL + LRU store. Entries may carry tags (e.g. an exam is tagged with its patient) so
+    # invalidating a key also drops every entry that embeds that record.
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a response built from a read that raced a write is not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry: CacheEntry, generation: int = None):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        keys = set(keys)
+        with self._lock:
+            self.generation += 1
+            for cache_key in [k for k, entry in self._entries.items() if k in keys or keys & entry.tags]:
+                del self._entries[cache_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+_backend = LRUCache(max_entries=RESPONSE_CACHE_SIZE if RESPONSE_CACHE else 0)
+
+def set_backend(backend):
+    # Any object with get/set/invalidate/clear/stats and ttl/generation attributes, e.g. a Redis-backed store
+    global _backend
+    _backend = backend
+
+def backend():
+    return _backend
+
+def disable():
+    # Nothing is stored; responses are still built with ETags and answer If-None-Match
+    set_backend(LRUCache(max_entries=0))
+
+def patient_key(patient_id: int):
+    return ("patient", patient_id)
+
+def exam_key(exam_id: int):
+    return ("exam", exam_id)
+
+def invalidate_patient(patient_id: int):
+    _backend.invalidate(patient_key(patient_id))
+
+def invalidate_exam(exam_id: int, *patient_ids):
+    # The patient response lists the patient's exams, so it goes stale with them
+    _backend.invalidate(exam_key(exam_id), *(patient_key(patient_id) for patient_id in patient_ids if patient_id is not None))
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+def if_match_version(request: Request):
+    # PATCH precondition: If-Match carries the row version the client read (the "version" field
+    # of the patient, exam or appointment), e.g. If-Match: "3". Body ETags above are for caching.
+    header = request.headers.get("if-match")
+    if header is None or header.strip() == "*":
+        return None
+    tag = header.strip().removeprefix("W/").strip('"')
+    if not tag.isdigit():
+        raise HTTPException(status_code=400, detail="If-Match must be the record version")
+    return int(tag)
+
+def _response(request: Request, entry: CacheEntry) -> Response:
+    # no-cache: browsers keep the body but revalidate with If-None-Match every time
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+def cached_response(request: Request, key):
+    # Returns (response, None) on a hit, or (None, generation) to pass to store_response on a miss
+    entry = _backend.get(key)
+    if entry is None:
+        return None, _backend.generation
+    return _response(request, entry), None
+
+def store_response(request: Request, key, content, generation: int, tags=()) -> Response:
+    body = responses.dumps(content)
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    entry = CacheEntry(body, etag, frozenset(tags), time.monotonic() + _backend.ttl)
+    _backend.set(key, entry, generation)
+    return _response(request, entry)
@@ -1,90 +1,629 @@
+from sqlalchemy import select, insert, update, func, and_, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy.orm import joinedload
-import models, schemas
+from sqlalchemy.orm import joinedload, selectinload, undefer_group
+import base64
+import hashlib
+import json
+import models, schemas, search, scheduling, cache, reporting, pdf_reports
+from datetime import timedelta
+
+# Optimistic concurrency. Patients, exams and appointments carry a version column that the ORM
+# checks and bumps on every UPDATE (models.py version_id_col), so a write racing another one
+# fails with StaleDataError; PATCH callers can also pin the version they read (If-Match).
+class VersionMismatch(Exception):
+    def __init__(self, current_version: int):
+        super().__init__("Record was modified since it was read")
+        self.current_version = current_version
+
+def check_version(db_obj, expected_version: int = None):
+    if expected_version is not None and db_obj.version != expected_version:
+        raise VersionMismatch(db_obj.version)
+
+def apply_changes(db_obj, values: dict) -> dict:
+    # Sets only the values that differ, so the flush UPDATEs just those columns; returns them
+    changed = {key: value for key, value in values.items() if getattr(db_obj, key) != value}
+    for key, value in changed.items():
+        setattr(db_obj, key, value)
+    return changed
+
+def commit_loaded(db: Session):
+    # The caller serializes the objects it already holds (the ORM computes the new version
+    # itself), so skip expiring them and the SELECT a refresh would cost
+    expire_on_commit, db.expire_on_commit = db.expire_on_commit, False
+    try:
+        db.commit()
+    finally:
+        db.expire_on_commit = expire_on_commit
 
 # Patient CRUD
 def get_patient(db: Session, patient_id: int):
     return db.query(models.Patient).options(joinedload(models.Patient.exams)).filter(models.Patient.id == patient_id).first()
 
 def get_patients(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Patient).offset(skip).limit(limit).all()
+    # selectinload: one extra query for every page's exams instead of one per patient
+    return db.query(models.Patient).options(selectinload(models.Patient.exams)).order_by(models.Patient.id).offset(skip).limit(limit).all()
+
+def get_patients_by_ids(db: Session, patient_ids):
+    # In the requested order; unknown ids are left out
+    db_patients = (
+        db.query(models.Patient)
+        .options(selectinload(models.Patient.exams))
+        .filter(models.Patient.id.in_(patient_ids))
+        .all()
+    )
+    by_id = {db_patient.id: db_patient for db_patient in db_patients}
+    return [by_id[patient_id] for patient_id in patient_ids if patient_id in by_id]
+
+def _encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+# Cursor layouts per order_by: [id] or [name, id]
+_CURSOR_TYPES = {"id": (int,), "name": ((str, type(None)), int)}
+
+def _cursor_value_ok(value, types) -> bool:
+    if isinstance(value, bool) or not isinstance(value, types):
+        return False
+    return not isinstance(value, int) or -2**63 <= value < 2**63
+
+def _decode_cursor(cursor: str, order_by: str):
+    # ValueError (answered with 400) for anything but a cursor this order_by handed out: a
+    # well-formed cursor of the other order, or with other types, would otherwise reach SQL
+    padded = cursor + "=" * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    types = _CURSOR_TYPES[order_by]
+    if not isinstance(values, list) or len(values) != len(types) or not all(map(_cursor_value_ok, values, types)):
+        raise ValueError("Invalid cursor")
+    return values
+
+def patient_summaries_stmt(cursor: str = None, limit: int = 50, order_by: str = "id"):
+    # One aggregate query over exams instead of loading every exam per patient
+    exam_stats = (
+        select(
+            models.ColposcopyExam.patient_id.label("patient_id"),
+            func.count(models.ColposcopyExam.id).label("exam_count"),
+            func.max(models.ColposcopyExam.study_date).label("last_study_date"),
+        )
+        .group_by(models.ColposcopyExam.patient_id)
+        .subquery()
+    )
+
+    stmt = select(
+        models.Patient.id,
+        models.Patient.name,
+        models.Patient.age,
+        models.Patient.sex,
+        func.coalesce(exam_stats.c.exam_count, 0).label("exam_count"),
+        exam_stats.c.last_study_date,
+    ).outerjoin(exam_stats, exam_stats.c.patient_id == models.Patient.id)
+
+    # Keyset pagination: continue strictly after the last row of the previous page
+    if order_by == "name":
+        if cursor:
+            last_name, last_id = _decode_cursor(cursor, order_by)
+            stmt = stmt.where(or_(
+                models.Patient.name > last_name,
+                and_(models.Patient.name == last_name, models.Patient.id > last_id),
+            ))
+        stmt = stmt.order_by(models.Patient.name.asc(), models.Patient.id.asc())
+    else:
+        if cursor:
+            (last_id,) = _decode_cursor(cursor, order_by)
+            stmt = stmt.where(models.Patient.id > last_id)
+        stmt = stmt.order_by(models.Patient.id.asc())
+
+    # Fetch one extra row to know whether another page exists
+    return stmt.limit(limit + 1)
+
+def patient_summary_page(rows, limit: int, order_by: str = "id"):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = _encode_cursor([last.name, last.id] if order_by == "name" else [last.id])
+
+    items = [schemas.PatientSummary(**row._asdict()) for row in rows]
+    return schemas.PatientPage(items=items, next_cursor=next_cursor)
+
+def get_patient_summaries(db: Session, cursor: str = None, limit: int = 50, order_by: str = "id"):
+    rows = db.execute(patient_summaries_stmt(cursor, limit, order_by)).all()
+    return patient_summary_page(rows, limit, order_by)
+
+def _index_patient(db_patient: models.Patient):
+    terms = search.patient_terms(db_patient.name, db_patient.phone, db_patient.email)
+    db_patient.search_terms = [models.PatientSearchTerm(term=term) for term in sorted(terms)]
+
+def search_patients_stmt(q: str, limit: int = 10):
+    tokens = search.patient_query_terms(q)
+    if not tokens:
+        return None
+
+    term = models.PatientSearchTerm
+    stmt = select(models.Patient)
+    # Every query token must prefix-match some indexed term of the patient
+    for token in tokens:
+        stmt = stmt.where(models.Patient.id.in_(
+            select(term.patient_id).where(term.term.like(f"{token}%"))
+        ))
+
+    # Rank whole-word matches above prefix-only matches
+    exact_matches = (
+        select(func.count(term.id))
+        .where(term.patient_id == models.Patient.id, term.term.in_(tokens))
+        .correlate(models.Patient)
+        .scalar_subquery()
+    )
+    return stmt.order_by(exact_matches.desc(), models.Patient.name.asc()).limit(limit)
+
+def search_patients(db: Session, q: str, limit: int = 10):
+    stmt = search_patients_stmt(q, limit)
+    if stmt is None:
+        return []
+    return db.scalars(stmt).all()
+
+def rebuild_patient_search_index(db: Session, batch_size: int = 500):
+    last_id = 0
+    while True:
+        batch = db.query(models.Patient).filter(models.Patient.id > last_id).order_by(models.Patient.id.asc()).limit(batch_size).all()
+        if not batch:
+            break
+        for db_patient in batch:
+            _index_patient(db_patient)
+        db.commit()
+        last_id = batch[-1].id
+        db.expunge_all()
 
 def create_patient(db: Session, patient: schemas.PatientCreate):
     db_patient = models.Patient(**patient.dict())
+    _index_patient(db_patient)
     db.add(db_patient)
     db.commit()
     db.refresh(db_patient)
     return db_patient
 
-def update_patient(db: Session, patient_id: int, patient_update: schemas.PatientBase):
-    db_patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
+def patch_patient(db: Session, patient_id: int, values: dict, expected_version: int = None):
+    db_patient = db.query(models.Patient).options(selectinload(models.Patient.exams)).filter(models.Patient.id == patient_id).first()
     if not db_patient:
         return None
-    
-    update_data = patient_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_patient, key, value)
-    
-    db.commit()
-    db.refresh(db_patient)
+    check_version(db_patient, expected_version)
+
+    changed = apply_changes(db_patient, values)
+    if not changed:
+        return db_patient
+    if changed.keys() & {"name", "phone", "email"}:
+        _index_patient(db_patient)
+
+    commit_loaded(db)
+    cache.invalidate_patient(patient_id)
+    pdf_reports.discard_reports(db_exam.id for db_exam in db_patient.exams)
     return db_patient
 
+def update_patient(db: Session, patient_id: int, patient_update: schemas.PatientBase):
+    return patch_patient(db, patient_id, patient_update.dict(exclude_unset=True))
+
+def delete_patient_options():
+    return (
+        selectinload(models.Patient.exams).selectinload(models.ColposcopyExam.search_terms),
+        selectinload(models.Patient.histories),
+    )
+
 def delete_patient(db: Session, patient_id: int):
-    db_patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
+    db_patient = db.query(models.Patient).options(*delete_patient_options()).filter(models.Patient.id == patient_id).first()
     if not db_patient:
         return False
     
-    # Exams will be deleted if ondelete="CASCADE" is set in models, 
-    # but manually deleting for safety if not explicitly confirmed.
+    # Exams and their clinical history versions are deleted with the patient. The foreign keys
+    # have no ondelete, so they used to be left with patient_id NULL and their images were
+    # never collected by storage_gc.
+    exam_ids = [db_exam.id for db_exam in db_patient.exams]
+    reporting.track_exam_changes(db, [(reporting.exam_values(db_exam), None) for db_exam in db_patient.exams])
+    for db_row in db_patient.exams + db_patient.histories:
+        db.delete(db_row)
     db.delete(db_patient)
     db.commit()
+    cache.invalidate_patient(patient_id)
+    for exam_id in exam_ids:
+        cache.invalidate_exam(exam_id)
+    pdf_reports.discard_reports(exam_ids)
     return True
 
 
+# Clinical history versions
+def split_history(data: dict):
+    history_values = {field: data.pop(field) for field in models.HISTORY_FIELDS if field in data}
+    return data, history_values
+
+def history_values_of(db_history):
+    if db_history is None:
+        return {}
+    return {field: getattr(db_history, field) for field in models.HISTORY_FIELDS}
+
+def history_hash(values: dict) -> str:
+    canonical = {field: values.get(field) for field in models.HISTORY_FIELDS}
+    raw = json.dumps(canonical, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def new_history_version(patient_id: int, version: int, effective_date, values: dict, content_hash: str):
+    return models.PatientHistory(
+        patient_id=patient_id,
+        version=version,
+        effective_date=effective_date,
+        content_hash=content_hash,
+        **{field: values.get(field) for field in models.HISTORY_FIELDS},
+    )
+
+def resolve_history(db: Session, patient_id: int, effective_date, values: dict):
+    # Reuse an identical version of this patient's history; only write a new one on change
+    content_hash = history_hash(values)
+    existing = (
+        db.query(models.PatientHistory)
+        .filter(models.PatientHistory.patient_id == patient_id, models.PatientHistory.content_hash == content_hash)
+        .order_by(models.PatientHistory.version.asc())
+        .first()
+    )
+    if existing:
+        return existing
+
+    last_version = db.query(func.max(models.PatientHistory.version)).filter(models.PatientHistory.patient_id == patient_id).scalar() or 0
+    db_history = new_history_version(patient_id, last_version + 1, effective_date, values, content_hash)
+    db.add(db_history)
+    return db_history
+
+def get_patient_history_at(db: Session, patient_id: int, at):
+    # History recorded with the patient's latest exam on or before the given date
+    return (
+        db.query(models.PatientHistory)
+        .join(models.ColposcopyExam, models.ColposcopyExam.history_id == models.PatientHistory.id)
+        .filter(models.ColposcopyExam.patient_id == patient_id, models.ColposcopyExam.study_date <= at)
+        .order_by(models.ColposcopyExam.study_date.desc(), models.ColposcopyExam.id.desc())
+        .first()
+    )
+
+def get_patient_history_versions(db: Session, patient_id: int):
+    return db.query(models.PatientHistory).filter(models.PatientHistory.patient_id == patient_id).order_by(models.PatientHistory.version.asc()).all()
+
 # Exam CRUD
+EXAM_COLUMNS = [attr.key for attr in models.ColposcopyExam.__mapper__.column_attrs]
+
+def exam_detail_options():
+    return [joinedload(models.ColposcopyExam.history)] + [undefer_group(group) for group in models.EXAM_DETAIL_GROUPS]
+
+def _index_exam(db_exam: models.ColposcopyExam):
+    # History fields are read through the exam's history version
+    values = {field: getattr(db_exam, field) for field in search.EXAM_FIELD_WEIGHTS}
+    terms = search.exam_terms(values)
+    db_exam.search_terms = [models.ExamSearchTerm(term=term, weight=weight) for term, weight in sorted(terms.items())]
+
+def exam_index_changed(update_data: dict, history_update: dict) -> bool:
+    return any(field in search.EXAM_FIELD_WEIGHTS for field in (*update_data, *history_update))
+
+def search_exams_stmt(q: str, start=None, end=None, referred_by: str = None, skip: int = 0, limit: int = 20):
+    terms = list(dict.fromkeys(search.text_terms(q)))
+    if not terms:
+        return None
+
+    term = models.ExamSearchTerm
+    # Exams containing every query term, scored by the summed weights of the matches
+    matches = (
+        select(term.exam_id, func.sum(term.weight).label("score"))
+        .where(term.term.in_(terms))
+        .group_by(term.exam_id)
+        .having(func.count(term.id) == len(terms))
+        .subquery()
+    )
+    exam = models.ColposcopyExam
+    stmt = (
+        select(exam, matches.c.score)
+        .join(matches, matches.c.exam_id == exam.id)
+        .options(joinedload(exam.patient))
+    )
+    if start is not None:
+        stmt = stmt.where(exam.study_date >= start)
+    if end is not None:
+        stmt = stmt.where(exam.study_date <= end)
+    if referred_by:
+        stmt = stmt.where(exam.referred_by == referred_by)
+    # One extra row tells whether there is a next page
+    return stmt.order_by(matches.c.score.desc(), exam.study_date.desc(), exam.id.desc()).offset(skip).limit(limit + 1)
+
+def exam_search_page(rows, skip: int, limit: int):
+    items = [
+        {
+            "id": db_exam.id,
+            "patient_id": db_exam.patient_id,
+            "patient_name": db_exam.patient.name if db_exam.patient is not None else None,
+            "study_date": db_exam.study_date,
+            "diagnosis": db_exam.diagnosis,
+            "referred_by": db_exam.referred_by,
+            "score": score,
+        }
+        for db_exam, score in rows[:limit]
+    ]
+    return {"items": items, "next_skip": skip + limit if len(rows) > limit else None}
+
+def search_exams(db: Session, q: str, start=None, end=None, referred_by: str = None, skip: int = 0, limit: int = 20):
+    stmt = search_exams_stmt(q, start, end, referred_by, skip, limit)
+    if stmt is None:
+        return {"items": [], "next_skip": None}
+    return exam_search_page(db.execute(stmt).all(), skip, limit)
+
+def rebuild_exam_search_index(db: Session, batch_size: int = 500):
+    last_id = 0
+    while True:
+        batch = (
+            db.query(models.ColposcopyExam)
+            .options(*exam_detail_options(), selectinload(models.ColposcopyExam.search_terms))
+            .filter(models.ColposcopyExam.id > last_id)
+            .order_by(models.ColposcopyExam.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        for db_exam in batch:
+            _index_exam(db_exam)
+        db.commit()
+        last_id = batch[-1].id
+        db.expunge_all()
+
+def iter_exam_image_paths(db: Session, batch_size: int = 1000):
+    # Yields batches of (exam_id, patient_id, image_paths) in id order without loading exams
+    exams = models.ColposcopyExam.__table__
+    last_id = 0
+    while True:
+        batch = db.execute(
+            select(exams.c.id, exams.c.patient_id, exams.c.image_paths)
+            .where(exams.c.id > last_id, exams.c.image_paths.isnot(None))
+            .order_by(exams.c.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        yield batch
+        last_id = batch[-1].id
+
 def create_patient_exam(db: Session, exam: schemas.ColposcopyExamCreate):
     # Ensure image_paths is stored as JSON (SQLAlchemy handles this with JSON type but good to be safe)
-    db_exam = models.ColposcopyExam(**exam.dict())
+    data, history_values = split_history(exam.dict())
+    db_exam = models.ColposcopyExam(**data)
+    db_exam.history = resolve_history(db, exam.patient_id, exam.study_date, history_values)
+    _index_exam(db_exam)
     db.add(db_exam)
+    # Flush first so column defaults are in the snapshot counted by the report summaries
+    db.flush()
+    reporting.track_exam_changes(db, [(None, reporting.exam_values(db_exam))])
     db.commit()
-    db.refresh(db_exam)
+    cache.invalidate_exam(db_exam.id, exam.patient_id)
+    # Reload deferred columns too, in a single SELECT
+    db.refresh(db_exam, attribute_names=EXAM_COLUMNS)
     return db_exam
 
 def get_patient_exam(db: Session, exam_id: int):
-    return db.query(models.ColposcopyExam).options(joinedload(models.ColposcopyExam.patient)).filter(models.ColposcopyExam.id == exam_id).first()
+    return db.query(models.ColposcopyExam).options(joinedload(models.ColposcopyExam.patient), *exam_detail_options()).filter(models.ColposcopyExam.id == exam_id).first()
 
-def update_colposcopy_exam(db: Session, exam_id: int, exam_update: schemas.ColposcopyExamBase):
-    db_exam = db.query(models.ColposcopyExam).filter(models.ColposcopyExam.id == exam_id).first()
+def get_patient_exams_by_ids(db: Session, exam_ids):
+    return (
+        db.query(models.ColposcopyExam)
+        .options(joinedload(models.ColposcopyExam.patient), *exam_detail_options())
+        .filter(models.ColposcopyExam.id.in_(exam_ids))
+        .order_by(models.ColposcopyExam.id)
+        .all()
+    )
+
+def get_exam_history(db: Session, exam_id: int):
+    return db.query(models.ColposcopyExam).options(joinedload(models.ColposcopyExam.history)).filter(models.ColposcopyExam.id == exam_id).first()
+
+def exam_history_changes(db_exam: models.ColposcopyExam, history_update: dict) -> dict:
+    # Exams read history fields through their history version
+    return {field: value for field, value in history_update.items() if getattr(db_exam, field) != value}
+
+def patch_colposcopy_exam(db: Session, exam_id: int, values: dict, expected_version: int = None):
+    # Loads every column the response needs up front; the UPDATE then writes only what changed
+    db_exam = db.query(models.ColposcopyExam).options(*exam_detail_options()).filter(models.ColposcopyExam.id == exam_id).first()
     if not db_exam:
         return None
-    
-    update_data = exam_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_exam, key, value)
-    
-    db.commit()
-    db.refresh(db_exam)
+    check_version(db_exam, expected_version)
+    previous_values = reporting.exam_values(db_exam)
+
+    update_data, history_update = split_history(values)
+    changed = apply_changes(db_exam, update_data)
+    history_changed = exam_history_changes(db_exam, history_update)
+    if not changed and not history_changed:
+        return db_exam
+
+    if history_changed:
+        history_values = {**history_values_of(db_exam.history), **history_changed}
+        db_exam.history = resolve_history(db, db_exam.patient_id, db_exam.study_date, history_values)
+    if exam_index_changed(changed, history_changed):
+        _index_exam(db_exam)
+
+    reporting.track_exam_changes(db, [(previous_values, reporting.exam_values(db_exam))])
+    commit_loaded(db)
+    cache.invalidate_exam(exam_id, db_exam.patient_id)
+    pdf_reports.discard_reports([exam_id])
     return db_exam
 
+def update_colposcopy_exam(db: Session, exam_id: int, exam_update: schemas.ColposcopyExamBase):
+    return patch_colposcopy_exam(db, exam_id, exam_update.dict(exclude_unset=True))
+
 def delete_colposcopy_exam(db: Session, exam_id: int):
     db_exam = db.query(models.ColposcopyExam).filter(models.ColposcopyExam.id == exam_id).first()
     if not db_exam:
         return False
     
+    patient_id = db_exam.patient_id
+    reporting.track_exam_changes(db, [(reporting.exam_values(db_exam), None)])
     db.delete(db_exam)
     db.commit()
+    cache.invalidate_exam(exam_id, patient_id)
+    pdf_reports.discard_reports([exam_id])
     return True
 
+def delete_colposcopy_exams(db: Session, exam_ids):
+    # One transaction for the whole batch; returns the ids that existed
+    db_exams = (
+        db.query(models.ColposcopyExam)
+        .options(selectinload(models.ColposcopyExam.search_terms))
+        .filter(models.ColposcopyExam.id.in_(exam_ids))
+        .all()
+    )
+    deleted = [(db_exam.id, db_exam.patient_id) for db_exam in db_exams]
+    reporting.track_exam_changes(db, [(reporting.exam_values(db_exam), None) for db_exam in db_exams])
+    for db_exam in db_exams:
+        db.delete(db_exam)
+    db.commit()
+    for exam_id, patient_id in deleted:
+        cache.invalidate_exam(exam_id, patient_id)
+    pdf_reports.discard_reports(exam_id for exam_id, _ in deleted)
+    return sorted(exam_id for exam_id, _ in deleted)
+
 # Appointment CRUD
+def busy_appointments_stmt(start, end, lock: bool = False):
+    # Bounded below by the longest allowed duration so the (date_time, status) index limits the scan
+    lookback = start - timedelta(minutes=scheduling.MAX_DURATION_MINUTES)
+    stmt = select(models.Appointment).where(
+        models.Appointment.date_time > lookback,
+        models.Appointment.date_time < end,
+        models.Appointment.ends_at > start,
+        or_(models.Appointment.status.is_(None), models.Appointment.status.notin_(scheduling.NON_BLOCKING_STATUSES)),
+    ).order_by(models.Appointment.date_time.asc())
+    return stmt.with_for_update() if lock else stmt
+
+def schedule_day_insert(day):
+    return insert(models.ScheduleDay).values(day=day, version=0)
+
+def schedule_day_lock(day):
+    return update(models.ScheduleDay).where(models.ScheduleDay.day == day).values(version=models.ScheduleDay.version + 1)
+
+def _lock_schedule_days(db: Session, start, end):
+    # Serializes bookings touching the same days across workers: the row lock is held until commit
+    for day in scheduling.days_spanned(start, end):
+        if db.get(models.ScheduleDay, day) is None:
+            try:
+                with db.begin_nested():
+                    db.execute(schedule_day_insert(day))
+            except IntegrityError:
+                pass # created concurrently
+        db.execute(schedule_day_lock(day))
+
+def lock_schedule_days(db: Session, days):
+    # _lock_schedule_days for many days at once (bulk imports): missing rows in one insert, then
+    # a single UPDATE, which locks the rows in primary key order like single bookings do
+    days = sorted(set(days))
+    if not days:
+        return
+    existing = set(db.scalars(select(models.ScheduleDay.day).where(models.ScheduleDay.day.in_(days))))
+    missing = [day for day in days if day not in existing]
+    if missing:
+        try:
+            with db.begin_nested():
+                db.execute(insert(models.ScheduleDay), [{"day": day, "version": 0} for day in missing])
+        except IntegrityError:
+            # Some were created concurrently
+            for day in missing:
+                try:
+                    with db.begin_nested():
+                        db.execute(schedule_day_insert(day))
+                except IntegrityError:
+                    pass
+    db.execute(
+        update(models.ScheduleDay)
+        .where(models.ScheduleDay.day.in_(days))
+        .values(version=models.ScheduleDay.version + 1)
+    )
+
 def create_appointment(db: Session, appointment: schemas.AppointmentCreate):
-    db_appointment = models.Appointment(**appointment.dict())
+    data = appointment.dict()
+    ends_at = scheduling.appointment_end(data["date_time"], data["duration_minutes"])
+
+    if data.get("status") not in scheduling.NON_BLOCKING_STATUSES:
+        _lock_schedule_days(db, data["date_time"], ends_at)
+        conflicts = db.scalars(busy_appointments_stmt(data["date_time"], ends_at, lock=True)).all()
+        if conflicts:
+            conflict_ids = [appt.id for appt in conflicts]
+            db.rollback()
+            raise scheduling.AppointmentConflict(conflict_ids)
+
+    db_appointment = models.Appointment(**data, ends_at=ends_at)
     db.add(db_appointment)
     db.commit()
     db.refresh(db_appointment)
     return db_appointment
 
-def get_appointments(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Appointment).options(joinedload(models.Appointment.patient)).order_by(models.Appointment.date_time.asc()).offset(skip).limit(limit).all()
+def patch_appointment(db: Session, appointment_id: int, values: dict, expected_version: int = None):
+    db_appointment = db.get(models.Appointment, appointment_id)
+    if db_appointment is None:
+        return None
+    check_version(db_appointment, expected_version)
+
+    changed = apply_changes(db_appointment, values)
+    if not changed:
+        return db_appointment
+    if changed.keys() & {"date_time", "duration_minutes"}:
+        db_appointment.ends_at = scheduling.appointment_end(db_appointment.date_time, db_appointment.duration_minutes)
+
+    # Rescheduling, or reactivating a cancelled appointment, goes through the same overlap check as booking
+    if changed.keys() & {"date_time", "duration_minutes", "status"} and db_appointment.status not in scheduling.NON_BLOCKING_STATUSES:
+        start, end = db_appointment.date_time, db_appointment.ends_at
+        _lock_schedule_days(db, start, end)
+        conflicts = db.scalars(busy_appointments_stmt(start, end, lock=True).where(models.Appointment.id != appointment_id)).all()
+        if conflicts:
+            conflict_ids = [appt.id for appt in conflicts]
+            db.rollback()
+            raise scheduling.AppointmentConflict(conflict_ids)
+
+    commit_loaded(db)
+    return db_appointment
+
+def get_available_slots(db: Session, start, end, duration_minutes: int = scheduling.DEFAULT_DURATION_MINUTES, limit: int = 20):
+    busy = db.scalars(busy_appointments_stmt(start, end)).all()
+    index = scheduling.IntervalIndex((appt.date_time, appt.ends_at) for appt in busy)
+    return [
+        schemas.AvailableSlot(start=slot_start, end=slot_end)
+        for slot_start, slot_end in scheduling.free_slots(index, start, end, duration_minutes, limit)
+    ]
+
+def _appointment_filters(start=None, end=None, status=None, patient_id=None):
+    filters = []
+    if start is not None:
+        filters.append(models.Appointment.date_time >= start)
+    if end is not None:
+        filters.append(models.Appointment.date_time < end)
+    if status is not None:
+        filters.append(models.Appointment.status == status)
+    if patient_id is not None:
+        filters.append(models.Appointment.patient_id == patient_id)
+    return filters
+
+def appointment_patient_option():
+    # Only the columns the agenda shows; never the patient's exams
+    return joinedload(models.Appointment.patient).load_only(
+        models.Patient.id, models.Patient.name, models.Patient.age, models.Patient.phone
+    )
+
+def get_appointments(db: Session, skip: int = 0, limit: int = 100, start=None, end=None, status=None, patient_id=None):
+    return (
+        db.query(models.Appointment)
+        .options(appointment_patient_option())
+        .filter(*_appointment_filters(start, end, status, patient_id))
+        .order_by(models.Appointment.date_time.asc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+def get_appointment_day_counts(db: Session, start, end, status=None, patient_id=None):
+    day = func.date(models.Appointment.date_time).label("day")
+    return (
+        db.query(day, func.count(models.Appointment.id).label("count"))
+        .filter(*_appointment_filters(start, end, status, patient_id))
+        .group_by(day)
+        .order_by(day)
+        .all()
+    )
 
 def delete_appointment(db: Session, appointment_id: int):
     db_appointment = db.query(models.Appointment).filter(models.Appointment.id == appointment_id).first()
@@ -0,0 +1,268 @@
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+import models, schemas, scheduling, cache, reporting, pdf_reports
+from crud import (
+    _appointment_filters, _index_exam, _index_patient, apply_changes, appointment_patient_option, busy_appointments_stmt, check_version,
+    delete_patient_options, exam_detail_options, exam_history_changes, exam_index_changed, exam_search_page, history_hash, history_values_of, new_history_version,
+    patient_summaries_stmt, patient_summary_page, schedule_day_insert, schedule_day_lock, search_exams_stmt, search_patients_stmt, split_history,
+)
+
+# Async mirrors of crud.py for the DB_ASYNC=true path. Relationships that the response
+# schemas serialize are eager-loaded, because AsyncSession cannot lazy-load.
+
+# Patient CRUD
+async def get_patient(db: AsyncSession, patient_id: int):
+    stmt = select(models.Patient).options(selectinload(models.Patient.exams)).where(models.Patient.id == patient_id)
+    return (await db.scalars(stmt)).first()
+
+async def get_patients_by_ids(db: AsyncSession, patient_ids):
+    stmt = select(models.Patient).options(selectinload(models.Patient.exams)).where(models.Patient.id.in_(patient_ids))
+    by_id = {db_patient.id: db_patient for db_patient in (await db.scalars(stmt)).all()}
+    return [by_id[patient_id] for patient_id in patient_ids if patient_id in by_id]
+
+async def get_patient_summaries(db: AsyncSession, cursor: str = None, limit: int = 50, order_by: str = "id"):
+    rows = (await db.execute(patient_summaries_stmt(cursor, limit, order_by))).all()
+    return patient_summary_page(rows, limit, order_by)
+
+async def search_patients(db: AsyncSession, q: str, limit: int = 10):
+    stmt = search_patients_stmt(q, limit)
+    if stmt is None:
+        return []
+    return (await db.scalars(stmt)).all()
+
+async def create_patient(db: AsyncSession, patient: schemas.PatientCreate):
+    db_patient = models.Patient(**patient.dict(), exams=[])
+    _index_patient(db_patient)
+    db.add(db_patient)
+    await db.commit()
+    return db_patient
+
+async def patch_patient(db: AsyncSession, patient_id: int, values: dict, expected_version: int = None):
+    stmt = select(models.Patient).options(selectinload(models.Patient.exams)).where(models.Patient.id == patient_id)
+    db_patient = (await db.scalars(stmt)).first()
+    if not db_patient:
+        return None
+    check_version(db_patient, expected_version)
+
+    changed = apply_changes(db_patient, values)
+    if not changed:
+        return db_patient
+    if changed.keys() & {"name", "phone", "email"}:
+        # Only now: the index rows are replaced, and AsyncSession cannot lazy-load them
+        await db.refresh(db_patient, attribute_names=["search_terms"])
+        _index_patient(db_patient)
+
+    await db.commit()
+    cache.invalidate_patient(patient_id)
+    pdf_reports.discard_reports(db_exam.id for db_exam in db_patient.exams)
+    return db_patient
+
+async def update_patient(db: AsyncSession, patient_id: int, patient_update: schemas.PatientBase):
+    return await patch_patient(db, patient_id, patient_update.dict(exclude_unset=True))
+
+async def delete_patient(db: AsyncSession, patient_id: int):
+    stmt = select(models.Patient).options(*delete_patient_options()).where(models.Patient.id == patient_id)
+    db_patient = (await db.scalars(stmt)).first()
+    if not db_patient:
+        return False
+
+    # Exams and history versions go with the patient, as in crud.delete_patient
+    exam_ids = [db_exam.id for db_exam in db_patient.exams]
+    await track_exam_changes(db, [(reporting.exam_values(db_exam), None) for db_exam in db_patient.exams])
+    for db_row in db_patient.exams + db_patient.histories:
+        await db.delete(db_row)
+    await db.delete(db_patient)
+    await db.commit()
+    cache.invalidate_patient(patient_id)
+    for exam_id in exam_ids:
+        cache.invalidate_exam(exam_id)
+    pdf_reports.discard_reports(exam_ids)
+    return True
+
+
+# Clinical history versions
+async def resolve_history(db: AsyncSession, patient_id: int, effective_date, values: dict):
+    content_hash = history_hash(values)
+    stmt = (
+        select(models.PatientHistory)
+        .where(models.PatientHistory.patient_id == patient_id, models.PatientHistory.content_hash == content_hash)
+        .order_by(models.PatientHistory.version.asc())
+    )
+    existing = (await db.scalars(stmt)).first()
+    if existing:
+        return existing
+
+    last_version = await db.scalar(select(func.max(models.PatientHistory.version)).where(models.PatientHistory.patient_id == patient_id)) or 0
+    db_history = new_history_version(patient_id, last_version + 1, effective_date, values, content_hash)
+    db.add(db_history)
+    return db_history
+
+# Exam CRUD
+async def track_exam_changes(db: AsyncSession, changes):
+    # Async counterpart of reporting.track_exam_changes
+    for stmt in reporting.stat_upserts(reporting.stat_deltas(changes)):
+        await db.execute(stmt)
+
+async def create_patient_exam(db: AsyncSession, exam: schemas.ColposcopyExamCreate):
+    data, history_values = split_history(exam.dict())
+    db_exam = models.ColposcopyExam(**data)
+    db_exam.history = await resolve_history(db, exam.patient_id, exam.study_date, history_values)
+    _index_exam(db_exam)
+    db.add(db_exam)
+    await db.flush()
+    await track_exam_changes(db, [(None, reporting.exam_values(db_exam))])
+    await db.commit()
+    cache.invalidate_exam(db_exam.id, exam.patient_id)
+    return db_exam
+
+async def get_patient_exam(db: AsyncSession, exam_id: int):
+    stmt = (
+        select(models.ColposcopyExam)
+        .options(selectinload(models.ColposcopyExam.patient), *exam_detail_options())
+        .where(models.ColposcopyExam.id == exam_id)
+    )
+    return (await db.scalars(stmt)).first()
+
+async def search_exams(db: AsyncSession, q: str, start=None, end=None, referred_by: str = None, skip: int = 0, limit: int = 20):
+    stmt = search_exams_stmt(q, start, end, referred_by, skip, limit)
+    if stmt is None:
+        return {"items": [], "next_skip": None}
+    return exam_search_page((await db.execute(stmt)).all(), skip, limit)
+
+async def get_exam_history(db: AsyncSession, exam_id: int):
+    stmt = select(models.ColposcopyExam).options(joinedload(models.ColposcopyExam.history)).where(models.ColposcopyExam.id == exam_id)
+    return (await db.scalars(stmt)).first()
+
+async def patch_colposcopy_exam(db: AsyncSession, exam_id: int, values: dict, expected_version: int = None):
+    stmt = select(models.ColposcopyExam).options(*exam_detail_options()).where(models.ColposcopyExam.id == exam_id)
+    db_exam = (await db.scalars(stmt)).first()
+    if not db_exam:
+        return None
+    check_version(db_exam, expected_version)
+    previous_values = reporting.exam_values(db_exam)
+
+    update_data, history_update = split_history(values)
+    changed = apply_changes(db_exam, update_data)
+    history_changed = exam_history_changes(db_exam, history_update)
+    if not changed and not history_changed:
+        return db_exam
+
+    if history_changed:
+        history_values = {**history_values_of(db_exam.history), **history_changed}
+        db_exam.history = await resolve_history(db, db_exam.patient_id, db_exam.study_date, history_values)
+    if exam_index_changed(changed, history_changed):
+        await db.refresh(db_exam, attribute_names=["search_terms"])
+        _index_exam(db_exam)
+
+    await track_exam_changes(db, [(previous_values, reporting.exam_values(db_exam))])
+    await db.commit()
+    cache.invalidate_exam(exam_id, db_exam.patient_id)
+    pdf_reports.discard_reports([exam_id])
+    return db_exam
+
+async def update_colposcopy_exam(db: AsyncSession, exam_id: int, exam_update: schemas.ColposcopyExamBase):
+    return await patch_colposcopy_exam(db, exam_id, exam_update.dict(exclude_unset=True))
+
+async def delete_colposcopy_exam(db: AsyncSession, exam_id: int):
+    db_exam = await db.get(models.ColposcopyExam, exam_id)
+    if not db_exam:
+        return False
+
+    patient_id = db_exam.patient_id
+    await track_exam_changes(db, [(reporting.exam_values(db_exam), None)])
+    await db.delete(db_exam)
+    await db.commit()
+    cache.invalidate_exam(exam_id, patient_id)
+    pdf_reports.discard_reports([exam_id])
+    return True
+
+async def delete_colposcopy_exams(db: AsyncSession, exam_ids):
+    stmt = (
+        select(models.ColposcopyExam)
+        .options(selectinload(models.ColposcopyExam.search_terms))
+        .where(models.ColposcopyExam.id.in_(exam_ids))
+    )
+    db_exams = (await db.scalars(stmt)).all()
+    deleted = [(db_exam.id, db_exam.patient_id) for db_exam in db_exams]
+    await track_exam_changes(db, [(reporting.exam_values(db_exam), None) for db_exam in db_exams])
+    for db_exam in db_exams:
+        await db.delete(db_exam)
+    await db.commit()
+    for exam_id, patient_id in deleted:
+        cache.invalidate_exam(exam_id, patient_id)
+    pdf_reports.discard_reports(exam_id for exam_id, _ in deleted)
+    return sorted(exam_id for exam_id, _ in deleted)
+
+# Appointment CRUD
+async def _lock_schedule_days(db: AsyncSession, start, end):
+    for day in scheduling.days_spanned(start, end):
+        if await db.get(models.ScheduleDay, day) is None:
+            try:
+                async with db.begin_nested():
+                    await db.execute(schedule_day_insert(day))
+            except IntegrityError:
+                pass # created concurrently
+        await db.execute(schedule_day_lock(day))
+
+async def create_appointment(db: AsyncSession, appointment: schemas.AppointmentCreate):
+    data = appointment.dict()
+    ends_at = scheduling.appointment_end(data["date_time"], data["duration_minutes"])
+
+    if data.get("status") not in scheduling.NON_BLOCKING_STATUSES:
+        await _lock_schedule_days(db, data["date_time"], ends_at)
+        conflicts = (await db.scalars(busy_appointments_stmt(data["date_time"], ends_at, lock=True))).all()
+        if conflicts:
+            conflict_ids = [appt.id for appt in conflicts]
+            await db.rollback()
+            raise scheduling.AppointmentConflict(conflict_ids)
+
+    db_appointment = models.Appointment(**data, ends_at=ends_at)
+    db.add(db_appointment)
+    await db.commit()
+    return db_appointment
+
+async def patch_appointment(db: AsyncSession, appointment_id: int, values: dict, expected_version: int = None):
+    db_appointment = await db.get(models.Appointment, appointment_id)
+    if db_appointment is None:
+        return None
+    check_version(db_appointment, expected_version)
+
+    changed = apply_changes(db_appointment, values)
+    if not changed:
+        return db_appointment
+    if changed.keys() & {"date_time", "duration_minutes"}:
+        db_appointment.ends_at = scheduling.appointment_end(db_appointment.date_time, db_appointment.duration_minutes)
+
+    if changed.keys() & {"date_time", "duration_minutes", "status"} and db_appointment.status not in scheduling.NON_BLOCKING_STATUSES:
+        start, end = db_appointment.date_time, db_appointment.ends_at
+        await _lock_schedule_days(db, start, end)
+        stmt = busy_appointments_stmt(start, end, lock=True).where(models.Appointment.id != appointment_id)
+        conflicts = (await db.scalars(stmt)).all()
+        if conflicts:
+            conflict_ids = [appt.id for appt in conflicts]
+            await db.rollback()
+            raise scheduling.AppointmentConflict(conflict_ids)
+
+    await db.commit()
+    return db_appointment
+
+async def get_appointments(db: AsyncSession, skip: int = 0, limit: int = 100, start=None, end=None, status=None, patient_id=None):
+    stmt = (
+        select(models.Appointment)
+        .options(appointment_patient_option())
+        .where(*_appointment_filters(start, end, status, patient_id))
+        .order_by(models.Appointment.date_time.asc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return (await db.scalars(stmt)).all()
+
+async def delete_appointment(db: AsyncSession, appointment_id: int):
+    db_appointment = await db.get(models.Appointment, appointment_id)
+    if db_appointment:
+        await db.delete(db_appointment)
+        await db.commit()
+        return True
+    return False
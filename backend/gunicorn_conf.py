@@ -0,0 +1,48 @@
+import os
+
+# Production server: gunicorn -c gunicorn_conf.py main:app
+# (for development keep using "uvicorn main:app --reload").
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# One event loop per core; sync endpoints run in each worker's threadpool. Every worker has its
+# own DB pool (DB_POOL_SIZE + DB_MAX_OVERFLOW) and image/PDF process pools, so size MySQL's
+# max_connections for workers * (pool_size + max_overflow).
+workers = int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Import the app (routers, models, metadata) once in the master; workers fork from it
+preload_app = True
+
+# Restart drains: workers stop accepting, finish in-flight requests for up to graceful_timeout
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Longer than the slowest legitimate request (bulk imports, PDF batches)
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+# Heartbeat files on tmpfs: a slow container disk must not get workers killed
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = os.getenv("ACCESS_LOG", "-")
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+def on_starting(server):
+    # Migrate once, in the master, instead of in every worker's lifespan
+    import migrations
+    from database import engine
+    if migrations.MIGRATE_ON_STARTUP:
+        applied = migrations.upgrade(engine)
+        if applied:
+            server.log.info("Applied migrations %s", applied)
+        migrations.MIGRATE_ON_STARTUP = False
+    # Workers must not share the master's connections
+    engine.dispose()
+
+    # RESPONSE_CACHE is single-process only (see cache.py): each worker would keep its own copy
+    # and miss the other workers' invalidations, so it is switched back off here
+    import cache
+    if cache.RESPONSE_CACHE and workers > 1 and type(cache.backend()) is cache.LRUCache:
+        cache.disable()
+        server.log.warning("RESPONSE_CACHE ignored: the per-process cache is not shared by the %d workers", workers)
+
+def post_fork(server, worker):
+    from database import engine
+    engine.dispose(close=False)
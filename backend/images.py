@@ -0,0 +1,97 @@
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+import logging
+import os
+import uuid
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Derivative renditions generated for every uploaded image: name -> max edge in pixels
+VARIANTS = {
+    "thumb": 320,
+    "web": 1280,
+}
+VARIANT_FORMAT = "webp"
+# Sniffed upload types Pillow can decode; other uploads (PDFs, HEIC) are stored without renditions
+SOURCE_EXTENSIONS = {".jpg", ".png", ".gif", ".tif", ".webp"}
+WEBP_QUALITY = 80
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+_executor = None
+
+def derivative_name(filename: str, variant: str) -> str:
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}.{variant}.{VARIANT_FORMAT}"
+
+def derivative_url(url: str, variant: str) -> str:
+    # "/static/abc.jpg" -> "/static/abc.thumb.webp"; works for absolute URLs too
+    prefix, _, filename = url.rpartition("/")
+    return f"{prefix}/{derivative_name(filename, variant)}"
+
+def has_derivatives(key: str) -> bool:
+    return os.path.splitext(key)[1].lower() in SOURCE_EXTENSIONS and not is_derivative(key)
+
+def derivative_urls(url: str) -> dict:
+    return {variant: derivative_url(url, variant) for variant in VARIANTS}
+
+def generate_derivatives(key: str):
+    # Runs in a worker process; skips renditions that already exist (deduplicated uploads)
+    backend = storage.get_storage()
+    targets = {variant: derivative_name(key, variant) for variant in VARIANTS}
+    pending = {variant: target for variant, target in targets.items() if not backend.exists(target)}
+    if not pending:
+        return []
+
+    with backend.local_file(key) as source_path, Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        for variant, target in pending.items():
+            size = VARIANTS[variant]
+            rendition = image.copy()
+            rendition.thumbnail((size, size))
+            tmp_target = os.path.join(backend.staging_dir(), f"{uuid.uuid4()}.part")
+            try:
+                rendition.save(tmp_target, format=VARIANT_FORMAT, quality=WEBP_QUALITY)
+                backend.save_file(target, tmp_target, move=True)
+            finally:
+                if os.path.exists(tmp_target):
+                    os.remove(tmp_target)
+    return list(pending.values())
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _executor
+
+def shutdown():
+    # Let scheduled renditions finish before the server process exits
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.warning("Image derivative generation failed: %s", error)
+
+def schedule_derivatives(key: str):
+    future = _get_executor().submit(generate_derivatives, key)
+    future.add_done_callback(_log_failure)
+    return future
+
+def is_derivative(filename: str) -> bool:
+    return any(filename.endswith(f".{variant}.{VARIANT_FORMAT}") for variant in VARIANTS)
+
+if __name__ == "__main__":
+    # Backfill renditions for images uploaded before derivatives existed
+    storage.get_storage().prepare()
+    sources = sorted(key for key, _, _ in storage.get_storage().iter_files() if has_derivatives(key))
+    with ProcessPoolExecutor(max_workers=IMAGE_WORKERS) as pool:
+        for source, result in zip(sources, pool.map(generate_derivatives, sources)):
+            if result:
+                print(f"{source}: {len(result)} renditions")
@@ -1,12 +1,60 @@
 from fastapi import FastAPI
+from fastapi.datastructures import Default
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-import models
-from database import engine
-from routers import patients, exams, upload, appointments
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.orm.exc import StaleDataError
+from contextlib import asynccontextmanager
+import logging
+import migrations
+from database import engine, async_engine, pool_stats, USE_ASYNC_DB
+import cache, responses, metrics, images, pdf_reports, storage
+from routers import patients, exams, upload, appointments, bulk, reports
 
-models.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Colposcopia API")
+def startup():
+    # One-time work per process; importing this module stays free of I/O so it can be preloaded
+    upload.ensure_upload_dirs()
+    if migrations.MIGRATE_ON_STARTUP:
+        # Reads schema_migrations and applies only what is pending
+        migrations.upgrade(engine)
+
+def shutdown():
+    images.shutdown()
+    pdf_reports.shutdown()
+    engine.dispose()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(startup)
+    yield
+    # Runs once the server has stopped accepting connections and in-flight requests finished
+    await run_in_threadpool(shutdown)
+    if async_engine is not None:
+        await async_engine.dispose()
+
+app = FastAPI(
+    title="Colposcopia API",
+    lifespan=lifespan,
+    # Default(...) keeps FastAPI's own direct-to-bytes path for response models when FAST_JSON is off
+    default_response_class=responses.FastJSONResponse if responses.FAST_JSON else Default(JSONResponse),
+)
+
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request, exc):
+    # Another request updated or deleted the row between this one's read and write (models.py version columns)
+    return JSONResponse(status_code=409, content={"detail": "Record was modified concurrently, reload it and retry"})
+
+metrics.instrument_engine(engine)
+if async_engine is not None:
+    metrics.instrument_engine(async_engine)
+app.add_middleware(metrics.SQLMetricsMiddleware)
+app.add_middleware(upload.UploadLimitMiddleware)
+
+if responses.GZIP_RESPONSES:
+    app.add_middleware(responses.APIGZipMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,19 +64,72 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if USE_ASYNC_DB:
+    # Async routes shadow the sync ones they mirror; endpoints without an async variant fall through
+    from routers import patients_async, exams_async, appointments_async
+    app.include_router(patients_async.router, include_in_schema=False)
+    app.include_router(exams_async.router, include_in_schema=False)
+    app.include_router(appointments_async.router, include_in_schema=False)
+
 app.include_router(patients.router)
 app.include_router(exams.router)
 app.include_router(upload.router)
 app.include_router(appointments.router)
+app.include_router(bulk.router)
+app.include_router(reports.router)
 
-from fastapi.staticfiles import StaticFiles
-import os
-
-if not os.path.exists("uploads"):
-    os.makedirs("uploads")
+from static_files import ImmutableStaticFiles, StorageStaticFiles
 
-app.mount("/static", StaticFiles(directory="uploads"), name="static")
+if storage.STORAGE_BACKEND == "local":
+    # The directory is created by startup()
+    app.mount("/static", ImmutableStaticFiles(directory=storage.UPLOAD_DIR, check_dir=False), name="static")
+else:
+    app.mount("/static", StorageStaticFiles(
+        directory=storage.STORAGE_FALLBACK_DIR,
+        redirect_max_age=storage.S3_PRESIGN_SECONDS // 2,
+    ), name="static")
 
 @app.get("/")
 def read_root():
     return {"message": "Colposcopy API is running"}
+
+@app.get("/health")
+def read_health():
+    # Liveness: the process answers; deliberately does not touch the database
+    return {"status": "ok"}
+
+@app.get("/ready")
+def read_readiness():
+    # Readiness: the database is reachable and the schema is current
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        logger.warning("Readiness check failed: %s", e)
+        return JSONResponse(status_code=503, content={"status": "unavailable", "database": "unreachable"})
+    pending = [migration.version for migration in migrations.pending(engine)]
+    if pending:
+        return JSONResponse(status_code=503, content={"status": "migrating", "pending_migrations": pending})
+    return {"status": "ready"}
+
+@app.get("/stats/db-pool")
+def read_db_pool_stats():
+    return pool_stats()
+
+@app.get("/stats/cache")
+def read_cache_stats():
+    return cache.backend().stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    pool = pool_stats()
+    cache_stats = cache.backend().stats()
+    gauges = [
+        ("db_pool_checked_out", "Connections currently checked out of the pool.", pool.get("checkedout", 0)),
+        ("db_pool_overflow", "Connections open beyond pool_size.", pool.get("overflow", 0)),
+        ("db_pool_wait_seconds_max", "Longest wait for a pooled connection.", pool["wait_seconds_max"]),
+        ("response_cache_entries", "Entries in the response cache.", cache_stats["entries"]),
+        ("response_cache_hits", "Response cache hits since start.", cache_stats["hits"]),
+        ("response_cache_misses", "Response cache misses since start.", cache_stats["misses"]),
+    ]
+    return PlainTextResponse(metrics.registry.render(gauges), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,218 @@
+from contextvars import ContextVar
+from sqlalchemy import event
+import logging
+import os
+import re
+import threading
+import time
+
+# Per-request SQL instrumentation. Engine hooks count the queries, database time and rows of
+# the request in progress (tracked in a ContextVar, which follows sync endpoints into the
+# threadpool and async ones through the greenlet bridge). The middleware reports them in
+# X-DB-* / Server-Timing headers and aggregates them per route for GET /metrics.
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger("sql.slow")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Requests issuing more queries than this are logged: the usual sign of an N+1 pattern
+QUERY_COUNT_WARN = int(os.getenv("QUERY_COUNT_WARN", "50"))
+EXPLAIN_SLOW_QUERIES = os.getenv("EXPLAIN_SLOW_QUERIES", "true").lower() in ("1", "true", "yes")
+# Each distinct slow statement is EXPLAINed at most once per interval
+EXPLAIN_INTERVAL_SECONDS = 600
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "rows", "scope")
+
+    def __init__(self, scope=None):
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.scope = scope
+
+    @property
+    def route(self):
+        # Route template ("/patients/{patient_id}") once routing has matched, to keep labels bounded
+        route = (self.scope or {}).get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+_current = ContextVar("request_sql_stats", default=None)
+
+def current_stats():
+    return _current.get()
+
+# Engine hooks
+_explained = {}
+_explained_lock = threading.Lock()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        # Drivers report -1 when unknown (e.g. SQLite SELECTs); MySQL drivers buffer and report it
+        if cursor.rowcount and cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        registry.slow_query()
+        # Parameters are not logged: they carry patient data
+        slow_logger.warning("Slow query (%.1f ms) on %s: %s", elapsed * 1000, stats.route if stats else "-", _one_line(statement))
+        if EXPLAIN_SLOW_QUERIES and not executemany and _should_explain(statement):
+            _log_explain(conn, cursor, statement, parameters)
+
+def _one_line(statement: str) -> str:
+    return re.sub(r"\s+", " ", statement).strip()
+
+def _should_explain(statement: str) -> bool:
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return False
+    now = time.monotonic()
+    with _explained_lock:
+        if now - _explained.get(statement, -EXPLAIN_INTERVAL_SECONDS) < EXPLAIN_INTERVAL_SECONDS:
+            return False
+        if len(_explained) > 1000:
+            _explained.clear()
+        _explained[statement] = now
+        return True
+
+def _log_explain(conn, cursor, statement, parameters):
+    # Separate DBAPI cursor on the same connection, so the plan matches the session's view
+    prefix = "EXPLAIN QUERY PLAN" if conn.dialect.name == "sqlite" else "EXPLAIN"
+    try:
+        explain_cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            explain_cursor.execute(f"{prefix} {statement}", parameters)
+            plan = explain_cursor.fetchall()
+        finally:
+            explain_cursor.close()
+        slow_logger.warning("Plan:\n%s", "\n".join(" | ".join(str(value) for value in row) for row in plan))
+    except Exception as e:
+        slow_logger.warning("EXPLAIN failed: %s", e)
+
+def instrument_engine(engine):
+    # Accepts sync engines and AsyncEngine (whose events live on the wrapped sync engine)
+    engine = getattr(engine, "sync_engine", engine)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+# Aggregation
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {} # (method, route, status) -> count
+        self.durations = {} # (method, route) -> [bucket counts..., sum, count]
+        self.db = {} # route -> [queries, seconds, rows]
+        self.slow_queries = 0
+
+    def observe(self, method: str, route: str, status: int, duration: float, stats: RequestStats):
+        with self._lock:
+            key = (method, route, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            histogram = self.durations.setdefault((method, route), [0] * (len(DURATION_BUCKETS) + 2))
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    histogram[index] += 1
+            histogram[-2] += duration
+            histogram[-1] += 1
+
+            totals = self.db.setdefault(route, [0, 0.0, 0])
+            totals[0] += stats.queries
+            totals[1] += stats.db_time
+            totals[2] += stats.rows
+
+    def slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def render(self, gauges=()):
+        def labels(**values):
+            return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in values.items()) + "}"
+
+        lines = [
+            "# HELP http_requests_total HTTP requests by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        with self._lock:
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{labels(method=method, route=route, status=status)} {count}")
+
+            lines += [
+                "# HELP http_request_duration_seconds Request latency by route.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route), histogram in sorted(self.durations.items()):
+                for index, bound in enumerate(DURATION_BUCKETS):
+                    lines.append(f"http_request_duration_seconds_bucket{labels(method=method, route=route, le=bound)} {histogram[index]}")
+                lines.append(f"http_request_duration_seconds_bucket{labels(method=method, route=route, le='+Inf')} {histogram[-1]}")
+                lines.append(f"http_request_duration_seconds_sum{labels(method=method, route=route)} {histogram[-2]:.6f}")
+                lines.append(f"http_request_duration_seconds_count{labels(method=method, route=route)} {histogram[-1]}")
+
+            for name, index, help_text in (
+                ("db_queries_total", 0, "SQL statements executed, by route."),
+                ("db_query_seconds_total", 1, "Time spent in SQL statements, by route."),
+                ("db_rows_total", 2, "Rows returned or affected where the driver reports them, by route."),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for route, totals in sorted(self.db.items()):
+                    value = f"{totals[index]:.6f}" if isinstance(totals[index], float) else totals[index]
+                    lines.append(f"{name}{labels(route=route)} {value}")
+
+            lines += [
+                f"# HELP db_slow_queries_total Statements slower than {SLOW_QUERY_MS:g} ms.",
+                "# TYPE db_slow_queries_total counter",
+                f"db_slow_queries_total {self.slow_queries}",
+            ]
+
+        for name, help_text, value in gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+registry = MetricsRegistry()
+
+class SQLMetricsMiddleware:
+    # Pure ASGI so the ContextVar set here is the one the endpoint (and its threadpool) sees
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"x-db-queries", str(stats.queries).encode()),
+                    (b"x-db-time-ms", f"{stats.db_time * 1000:.2f}".encode()),
+                    (b"x-db-rows", str(stats.rows).encode()),
+                    (b"server-timing", f"db;dur={stats.db_time * 1000:.2f}".encode()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            registry.observe(scope["method"], stats.route, status, time.perf_counter() - started, stats)
+            if stats.queries > QUERY_COUNT_WARN:
+                logger.warning("%s %s issued %d queries (%.1f ms in the database)", scope["method"], stats.route, stats.queries, stats.db_time * 1000)
@@ -0,0 +1,25 @@
+import argparse
+import logging
+import migrations
+from database import engine
+
+# Schema migrations: "docker-compose exec backend python migrate.py" applies every pending
+# migration (also done at startup unless MIGRATE_ON_STARTUP=false); --status lists them.
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    parser.add_argument("--status", action="store_true", help="List migrations and whether they are applied")
+    parser.add_argument("--target", type=int, help="Stop after this migration version")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.status:
+        for version, name, applied in migrations.status(engine):
+            print(f"{version:03d} {name:<30} {'applied' if applied else 'pending'}")
+        return
+
+    applied = migrations.upgrade(engine, args.target)
+    print(f"Applied {len(applied)} migration(s)" if applied else "Database is up to date.")
+
+if __name__ == "__main__":
+    main()
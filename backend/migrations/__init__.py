@@ -0,0 +1,103 @@
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, insert, select, text
+from sqlalchemy.exc import DBAPIError
+from datetime import datetime
+import importlib
+import logging
+import os
+import pkgutil
+import re
+from migrations.operations import Operations
+
+# Versioned schema migrations. Each module named vNNN_<description>.py defines upgrade(op);
+# applied versions are recorded in schema_migrations, so startup only reads that table instead
+# of reflecting the whole schema. Migrations use their own frozen table definitions rather than
+# models.py, which always describes the latest schema.
+
+logger = logging.getLogger(__name__)
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+# Seconds to wait for another process (e.g. a second worker) that is already migrating
+LOCK_TIMEOUT = int(os.getenv("MIGRATION_LOCK_TIMEOUT", "600"))
+
+_MODULE_RE = re.compile(r"v(\d+)_(\w+)")
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+class Migration:
+    def __init__(self, version: int, name: str, module):
+        self.version = version
+        self.name = name
+        self.module = module
+
+def discover():
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MODULE_RE.fullmatch(module_info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{module_info.name}")
+            migrations.append(Migration(int(match.group(1)), match.group(2), module))
+    migrations.sort(key=lambda migration: migration.version)
+    return migrations
+
+def applied_versions(engine):
+    # One cheap query on every boot; a missing table just means nothing was applied yet
+    try:
+        with engine.connect() as conn:
+            return set(conn.scalars(select(schema_migrations.c.version)))
+    except DBAPIError:
+        return set()
+
+def pending(engine, target: int = None):
+    applied = applied_versions(engine)
+    return [
+        migration for migration in discover()
+        if migration.version not in applied and (target is None or migration.version <= target)
+    ]
+
+class _MigrationLock:
+    # MySQL named lock so concurrent workers/containers do not run the same migration twice
+    def __init__(self, engine):
+        self.engine = engine
+        self.conn = None
+
+    def __enter__(self):
+        if self.engine.dialect.name == "mysql":
+            self.conn = self.engine.connect()
+            acquired = self.conn.scalar(text("SELECT GET_LOCK('schema_migrations', :timeout)"), {"timeout": LOCK_TIMEOUT})
+            if acquired != 1:
+                self.conn.close()
+                raise RuntimeError("Timed out waiting for the schema migration lock")
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.conn is not None:
+            self.conn.execute(text("SELECT RELEASE_LOCK('schema_migrations')"))
+            self.conn.close()
+
+def upgrade(engine, target: int = None):
+    if not pending(engine, target):
+        return []
+
+    with _MigrationLock(engine):
+        schema_migrations.create(bind=engine, checkfirst=True)
+        # Re-read under the lock: another process may have finished them meanwhile
+        todo = pending(engine, target)
+        op = Operations(engine)
+        for migration in todo:
+            logger.info("Applying migration %03d_%s", migration.version, migration.name)
+            migration.module.upgrade(op)
+            with engine.begin() as conn:
+                conn.execute(insert(schema_migrations).values(
+                    version=migration.version, name=migration.name, applied_at=datetime.utcnow(),
+                ))
+        return [migration.version for migration in todo]
+
+def status(engine):
+    applied = applied_versions(engine)
+    return [(migration.version, migration.name, migration.version in applied) for migration in discover()]
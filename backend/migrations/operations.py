@@ -0,0 +1,96 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn
+import logging
+
+logger = logging.getLogger(__name__)
+
+# MySQL ALTER clauses tried in order: metadata-only first, then an in-place rebuild that keeps
+# the table readable and writable. The plain statement is the last resort (and the only form
+# other dialects understand).
+MYSQL_ADD_COLUMN_ALGORITHMS = ("ALGORITHM=INSTANT", "ALGORITHM=INPLACE, LOCK=NONE")
+MYSQL_ADD_INDEX_ALGORITHMS = ("ALGORITHM=INPLACE, LOCK=NONE",)
+
+class Operations:
+    # Idempotent schema operations: every helper checks the live schema first, so a migration
+    # interrupted halfway can simply be run again.
+    def __init__(self, engine):
+        self.engine = engine
+        self.dialect = engine.dialect
+
+    @property
+    def is_mysql(self):
+        return self.dialect.name == "mysql"
+
+    def has_table(self, table_name: str) -> bool:
+        return inspect(self.engine).has_table(table_name)
+
+    def columns(self, table_name: str):
+        return {column["name"] for column in inspect(self.engine).get_columns(table_name)}
+
+    def indexes(self, table_name: str):
+        inspector = inspect(self.engine)
+        names = {index["name"] for index in inspector.get_indexes(table_name)}
+        names.update(constraint["name"] for constraint in inspector.get_unique_constraints(table_name))
+        return names
+
+    def _alter(self, statement: str, mysql_algorithms):
+        with self.engine.connect() as conn:
+            if self.is_mysql:
+                for algorithm in mysql_algorithms:
+                    try:
+                        conn.execute(text(f"{statement}, {algorithm}"))
+                        conn.commit()
+                        return
+                    except DBAPIError as e:
+                        # Not supported for this change on this server version: try the next one
+                        conn.rollback()
+                        logger.info("%s rejected (%s), retrying", algorithm, e.orig)
+            conn.execute(text(statement))
+            conn.commit()
+
+    def create_table(self, table):
+        if self.has_table(table.name):
+            return False
+        table.create(bind=self.engine)
+        logger.info("Created table %s", table.name)
+        return True
+
+    def add_column(self, column):
+        # column belongs to a frozen Table in the migration module
+        table_name = column.table.name
+        if column.name in self.columns(table_name):
+            return False
+        spec = CreateColumn(column).compile(dialect=self.dialect)
+        self._alter(f"ALTER TABLE {table_name} ADD COLUMN {spec}", MYSQL_ADD_COLUMN_ALGORITHMS)
+        logger.info("Added column %s.%s", table_name, column.name)
+        return True
+
+    def drop_column(self, table_name: str, column_name: str):
+        if column_name not in self.columns(table_name):
+            return False
+        self._alter(f"ALTER TABLE {table_name} DROP COLUMN {column_name}", MYSQL_ADD_COLUMN_ALGORITHMS)
+        logger.info("Dropped column %s.%s", table_name, column_name)
+        return True
+
+    def create_index(self, index):
+        table_name = index.table.name
+        if index.name in self.indexes(table_name):
+            return False
+        if self.is_mysql:
+            columns = ", ".join(column.name for column in index.columns)
+            kind = "UNIQUE INDEX" if index.unique else "INDEX"
+            self._alter(f"ALTER TABLE {table_name} ADD {kind} {index.name} ({columns})", MYSQL_ADD_INDEX_ALGORITHMS)
+        else:
+            index.create(bind=self.engine)
+        logger.info("Created index %s on %s", index.name, table_name)
+        return True
+
+    def ensure_table(self, table):
+        # Create the table, or bring an older copy of it up to this definition
+        if self.create_table(table):
+            return
+        for column in table.columns:
+            self.add_column(column)
+        for index in table.indexes:
+            self.create_index(index)
@@ -0,0 +1,60 @@
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Index, Integer, JSON, MetaData, String, Table, Text
+
+# Schema as it stood before versioned migrations: the original tables plus the columns the old
+# update_db.py ... update_db_v5.py scripts added. On an existing database only what is missing
+# is created, so databases that skipped some of those scripts are brought level too.
+# The per-exam clinical history columns of that schema are left out: v003 moves them to
+# patient_histories and v011 drops them, so new databases never get them.
+
+metadata = MetaData()
+
+patients = Table(
+    "patients", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(255)),
+    Column("birth_date", Date),
+    Column("age", Integer),
+    Column("sex", String(50)),
+    Column("phone", String(20), nullable=True),
+    Column("email", String(255), nullable=True),
+    Column("referrer", String(255), nullable=True),
+    Column("additional_data", Text, nullable=True),
+    Index("ix_patients_id", "id"),
+    Index("ix_patients_name", "name"),
+)
+
+colposcopy_exams = Table(
+    "colposcopy_exams", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("patient_id", Integer, ForeignKey("patients.id")),
+    Column("study_date", Date),
+    Column("vulva_vagina_desc", Text, nullable=True),
+    Column("observations", Text, nullable=True),
+    Column("diagnosis", Text, nullable=True),
+    Column("others", Text, nullable=True),
+    Column("referred_by", String(255), nullable=True, server_default="GENERICO"),
+    Column("plan", Text, nullable=True),
+    Column("colposcopy_quality", String(50), nullable=True),
+    Column("cervix_status", String(50), nullable=True),
+    Column("zone_transform", String(50), nullable=True),
+    Column("borders", String(50), nullable=True),
+    Column("surface", String(50), nullable=True),
+    Column("schiller_test", String(50), nullable=True),
+    Column("acetowhite_epithelium", String(50), nullable=True),
+    Column("image_paths", JSON, nullable=True),
+    Index("ix_colposcopy_exams_id", "id"),
+)
+
+appointments = Table(
+    "appointments", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("patient_id", Integer, ForeignKey("patients.id")),
+    Column("date_time", DateTime),
+    Column("reason", String(255), nullable=True),
+    Column("status", String(50), server_default="Pendiente"),
+    Index("ix_appointments_id", "id"),
+)
+
+def upgrade(op):
+    for table in (patients, colposcopy_exams, appointments):
+        op.ensure_table(table)
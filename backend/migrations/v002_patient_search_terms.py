@@ -0,0 +1,66 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, MetaData, String, Table, delete, insert, select
+import re
+import unicodedata
+
+# Accent-insensitive patient search index (formerly update_db_v6.py): creates
+# patient_search_terms and indexes every existing patient.
+
+BATCH_SIZE = 500
+
+metadata = MetaData()
+
+patients = Table(
+    "patients", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(255)),
+    Column("phone", String(20)),
+    Column("email", String(255)),
+)
+
+patient_search_terms = Table(
+    "patient_search_terms", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("patient_id", Integer, ForeignKey("patients.id", ondelete="CASCADE"), nullable=False),
+    Column("term", String(64), nullable=False),
+    Index("ix_patient_search_terms_term_patient", "term", "patient_id"),
+)
+
+# search.patient_terms as of this migration
+TERM_MAX_LENGTH = 64
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def _tokenize(text: str):
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+    return [token[:TERM_MAX_LENGTH] for token in _TOKEN_RE.findall(folded)]
+
+def patient_terms(name: str = None, phone: str = None, email: str = None):
+    terms = set(_tokenize(name))
+    terms.update(_tokenize(email))
+    digits = re.sub(r"\D", "", phone or "")
+    if digits:
+        terms.add(digits[:TERM_MAX_LENGTH])
+    return terms
+
+def upgrade(op):
+    op.ensure_table(patient_search_terms)
+
+    last_id = 0
+    while True:
+        with op.engine.begin() as conn:
+            rows = conn.execute(
+                select(patients).where(patients.c.id > last_id).order_by(patients.c.id).limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            ids = [row.id for row in rows]
+            # Replace rather than append so a rerun after an interruption does not duplicate terms
+            conn.execute(delete(patient_search_terms).where(patient_search_terms.c.patient_id.in_(ids)))
+            terms = [
+                {"patient_id": row.id, "term": term}
+                for row in rows
+                for term in sorted(patient_terms(row.name, row.phone, row.email))
+            ]
+            if terms:
+                conn.execute(insert(patient_search_terms), terms)
+        last_id = ids[-1]
@@ -0,0 +1,122 @@
+from sqlalchemy import (
+    Column, Date, ForeignKey, Index, Integer, JSON, MetaData, String, Table, Text, UniqueConstraint, func, insert, select, update,
+)
+import hashlib
+import json
+
+# Versioned clinical history (formerly update_db_v7.py): moves the history copied into every
+# colposcopy_exams row into patient_histories (one row per distinct history per patient) and
+# links exams through history_id. The legacy columns are dropped by v011 once every exam is
+# linked; databases created after v001 stopped creating them have nothing to move.
+
+BATCH_SIZE = 500
+
+metadata = MetaData()
+
+patients = Table("patients", metadata, Column("id", Integer, primary_key=True))
+
+patient_histories = Table(
+    "patient_histories", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("patient_id", Integer, ForeignKey("patients.id"), nullable=True),
+    Column("version", Integer, nullable=False),
+    Column("effective_date", Date, nullable=True),
+    Column("content_hash", String(64), nullable=False),
+    Column("menarche_age", Integer, nullable=True),
+    Column("menstrual_rhythm", String(50), nullable=True),
+    Column("contraceptive_method", String(100), nullable=True),
+    Column("ivsa_age", Integer, nullable=True),
+    Column("gestas", Integer, nullable=True),
+    Column("partos", Integer, nullable=True),
+    Column("abortos", Integer, nullable=True),
+    Column("cesareas", Integer, nullable=True),
+    Column("fum", Date, nullable=True),
+    Column("last_pap_smear", String(100), nullable=True),
+    Column("h_enfermedades", Text, nullable=True),
+    Column("h_medicamentos", Text, nullable=True),
+    Column("h_adicciones", Text, nullable=True),
+    Column("h_alergicos", Text, nullable=True),
+    Column("h_transfusionales", Text, nullable=True),
+    Column("h_quirurgicos", Text, nullable=True),
+    Column("h_grupo_sanguineo", String(50), nullable=True),
+    Column("h_no_patologicos", Text, nullable=True),
+    Column("h_familiares_oncologicos", Text, nullable=True),
+    Column("h_parejas", Integer, nullable=True),
+    Column("h_fpp", Date, nullable=True),
+    Column("h_ectopicos", String(100), nullable=True),
+    Column("h_tratamiento_hormonal", String(100), nullable=True),
+    Column("h_ant_cancer_familiar", String(100), nullable=True),
+    Column("h_dismenorrea", String(50), nullable=True),
+    Column("h_dispareunia", String(50), nullable=True),
+    Column("h_registro_embarazos", JSON, nullable=True),
+    UniqueConstraint("patient_id", "version", name="uq_patient_histories_patient_version"),
+    Index("ix_patient_histories_id", "id"),
+    Index("ix_patient_histories_patient_hash", "patient_id", "content_hash"),
+)
+
+HISTORY_FIELDS = [
+    column.name for column in patient_histories.columns
+    if column.name not in ("id", "patient_id", "version", "effective_date", "content_hash")
+]
+
+def history_hash(values: dict) -> str:
+    # crud.history_hash as of this migration; hashes written here must not change with it
+    canonical = {field: values.get(field) for field in HISTORY_FIELDS}
+    raw = json.dumps(canonical, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+# Legacy exam columns typed like their history counterparts so dates and JSON read back as Python objects
+colposcopy_exams = Table(
+    "colposcopy_exams", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("patient_id", Integer),
+    Column("study_date", Date),
+    Column("history_id", Integer, nullable=True),
+    *(Column(field, patient_histories.c[field].type) for field in HISTORY_FIELDS),
+    Index("ix_colposcopy_exams_history_id", "history_id"),
+)
+
+def upgrade(op):
+    op.ensure_table(patient_histories)
+    op.add_column(colposcopy_exams.c.history_id)
+    op.create_index(next(iter(colposcopy_exams.indexes)))
+
+    exam_columns = op.columns("colposcopy_exams")
+    legacy_fields = [field for field in HISTORY_FIELDS if field in exam_columns]
+    if legacy_fields:
+        backfill(op, legacy_fields)
+
+def _resolve_history(conn, patient_id, effective_date, values):
+    content_hash = history_hash(values)
+    existing = conn.scalar(
+        select(patient_histories.c.id)
+        .where(patient_histories.c.patient_id == patient_id, patient_histories.c.content_hash == content_hash)
+        .order_by(patient_histories.c.version)
+        .limit(1)
+    )
+    if existing is not None:
+        return existing
+
+    last_version = conn.scalar(select(func.max(patient_histories.c.version)).where(patient_histories.c.patient_id == patient_id)) or 0
+    result = conn.execute(insert(patient_histories).values(
+        patient_id=patient_id, version=last_version + 1, effective_date=effective_date, content_hash=content_hash, **values,
+    ))
+    return result.inserted_primary_key[0]
+
+def backfill(op, legacy_fields):
+    exams = colposcopy_exams.c
+    select_legacy = select(exams.id, exams.patient_id, exams.study_date, *(exams[field] for field in legacy_fields))
+
+    last_id = 0
+    while True:
+        with op.engine.begin() as conn:
+            rows = conn.execute(
+                select_legacy.where(exams.history_id.is_(None), exams.id > last_id).order_by(exams.id).limit(BATCH_SIZE)
+            ).mappings().all()
+            if not rows:
+                break
+            for row in rows:
+                values = {field: row[field] for field in legacy_fields}
+                history_id = _resolve_history(conn, row["patient_id"], row["study_date"], values)
+                conn.execute(update(colposcopy_exams).where(exams.id == row["id"]).values(history_id=history_id))
+        last_id = rows[-1]["id"]
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table
+
+# Appointment calendar indexes (formerly update_db_v8.py).
+
+metadata = MetaData()
+
+appointments = Table(
+    "appointments", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("patient_id", Integer),
+    Column("date_time", DateTime),
+    Column("status", String(50)),
+    Index("ix_appointments_patient_id", "patient_id"),
+    # Calendar range scans, optionally narrowed by status
+    Index("ix_appointments_date_time_status", "date_time", "status"),
+)
+
+def upgrade(op):
+    for index in appointments.indexes:
+        op.create_index(index)
@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Date, DateTime, Integer, MetaData, String, Table, select, update
+from datetime import timedelta
+
+# Appointment durations and the schedule_days lock table (formerly update_db_v9.py), then
+# ends_at for existing appointments in batches.
+
+BATCH_SIZE = 1000
+
+metadata = MetaData()
+
+appointments = Table(
+    "appointments", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("date_time", DateTime),
+    Column("duration_minutes", Integer, nullable=False, server_default="30"),
+    Column("ends_at", DateTime, nullable=True),
+    Column("status", String(50)),
+)
+
+schedule_days = Table(
+    "schedule_days", metadata,
+    Column("day", Date, primary_key=True),
+    Column("version", Integer, nullable=False, server_default="0"),
+)
+
+def upgrade(op):
+    op.create_table(schedule_days)
+    op.add_column(appointments.c.duration_minutes)
+    op.add_column(appointments.c.ends_at)
+
+    columns = appointments.c
+    while True:
+        with op.engine.begin() as conn:
+            rows = conn.execute(
+                select(columns.id, columns.date_time, columns.duration_minutes)
+                .where(columns.ends_at.is_(None), columns.date_time.isnot(None))
+                .limit(BATCH_SIZE)
+            ).all()
+            for row in rows:
+                ends_at = row.date_time + timedelta(minutes=row.duration_minutes or 30)
+                conn.execute(update(appointments).where(columns.id == row.id).values(ends_at=ends_at))
+        if not rows:
+            break
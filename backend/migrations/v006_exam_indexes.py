@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Date, Index, Integer, MetaData, Table
+
+# Exam lookups by patient (newest first) and by study date range. On MySQL the indexes are
+# built in place without locking colposcopy_exams against writes.
+
+metadata = MetaData()
+
+colposcopy_exams = Table(
+    "colposcopy_exams", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("patient_id", Integer),
+    Column("study_date", Date),
+    Index("ix_colposcopy_exams_patient_study_date", "patient_id", "study_date"),
+    Index("ix_colposcopy_exams_study_date", "study_date"),
+)
+
+def upgrade(op):
+    for index in colposcopy_exams.indexes:
+        op.create_index(index)
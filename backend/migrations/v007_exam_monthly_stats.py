@@ -0,0 +1,55 @@
+from sqlalchemy import Column, Date, Integer, MetaData, String, Table, Text, delete, extract, func, insert, select
+from collections import Counter
+from datetime import date
+
+# Summary table behind the /reports endpoints: exam counts per month and reported value,
+# counted once here from the existing exams and kept current by crud.py afterwards.
+
+# reporting.py's dimensions as of this migration
+TOTAL = "exams"
+DIMENSIONS = ("diagnosis", "referred_by", "schiller_test", "acetowhite_epithelium")
+VALUE_MAX_LENGTH = 255
+
+metadata = MetaData()
+
+colposcopy_exams = Table(
+    "colposcopy_exams", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("study_date", Date),
+    Column("diagnosis", Text),
+    Column("referred_by", String(255)),
+    Column("schiller_test", String(50)),
+    Column("acetowhite_epithelium", String(50)),
+)
+
+exam_monthly_stats = Table(
+    "exam_monthly_stats", metadata,
+    Column("month", Date, primary_key=True),
+    Column("dimension", String(32), primary_key=True),
+    Column("value", String(255), primary_key=True),
+    Column("count", Integer, nullable=False, default=0),
+)
+
+def upgrade(op):
+    op.create_table(exam_monthly_stats)
+    # A full recount, so rerunning after an interruption is safe
+    with op.engine.begin() as conn:
+        recount(conn)
+
+def recount(conn):
+    exams, stats = colposcopy_exams.c, exam_monthly_stats
+    year, month = extract("year", exams.study_date), extract("month", exams.study_date)
+
+    conn.execute(delete(stats))
+    for dimension in (TOTAL,) + DIMENSIONS:
+        group = [year, month] if dimension == TOTAL else [year, month, exams[dimension]]
+        rows = conn.execute(select(*group, func.count()).where(exams.study_date.isnot(None)).group_by(*group)).all()
+        totals = Counter()
+        for row in rows:
+            value = "" if dimension == TOTAL else (row[2] or "")[:VALUE_MAX_LENGTH]
+            totals[(date(int(row[0]), int(row[1]), 1), value)] += row[-1]
+        if totals:
+            conn.execute(insert(stats), [
+                {"month": month_key, "dimension": dimension, "value": value, "count": count}
+                for (month_key, value), count in totals.items()
+            ])
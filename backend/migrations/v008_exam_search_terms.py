@@ -0,0 +1,118 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, MetaData, String, Table, Text, delete, insert, select
+import re
+import unicodedata
+
+# Full-text index over exam narrative and clinical history text: creates exam_search_terms
+# and indexes every existing exam.
+
+BATCH_SIZE = 500
+
+metadata = MetaData()
+
+patient_histories = Table(
+    "patient_histories", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("h_enfermedades", Text),
+    Column("h_medicamentos", Text),
+    Column("h_adicciones", Text),
+    Column("h_alergicos", Text),
+    Column("h_transfusionales", Text),
+    Column("h_quirurgicos", Text),
+    Column("h_no_patologicos", Text),
+    Column("h_familiares_oncologicos", Text),
+)
+
+colposcopy_exams = Table(
+    "colposcopy_exams", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("history_id", Integer, ForeignKey("patient_histories.id")),
+    Column("vulva_vagina_desc", Text),
+    Column("observations", Text),
+    Column("diagnosis", Text),
+    Column("others", Text),
+    Column("plan", Text),
+)
+
+exam_search_terms = Table(
+    "exam_search_terms", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("exam_id", Integer, ForeignKey("colposcopy_exams.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("term", String(64), nullable=False),
+    Column("weight", Integer, nullable=False),
+    Index("ix_exam_search_terms_term_exam", "term", "exam_id"),
+)
+
+# search.exam_terms as of this migration
+TERM_MAX_LENGTH = 64
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+EXAM_FIELD_WEIGHTS = {
+    "diagnosis": 3,
+    "observations": 2,
+    "plan": 1,
+    "others": 1,
+    "vulva_vagina_desc": 1,
+    "h_enfermedades": 1,
+    "h_medicamentos": 1,
+    "h_adicciones": 1,
+    "h_alergicos": 1,
+    "h_transfusionales": 1,
+    "h_quirurgicos": 1,
+    "h_no_patologicos": 1,
+    "h_familiares_oncologicos": 1,
+}
+STOPWORDS = frozenset(
+    "a al con de del e el en es la las lo los o para por que se su sus u un una unos unas y".split()
+)
+_PLURAL_SUFFIXES = (("ces", "z"), ("iones", "ion"), ("es", ""), ("s", ""))
+
+def _stem(token: str) -> str:
+    if len(token) <= 4 or token.isdigit():
+        return token
+    for suffix, replacement in _PLURAL_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            token = token[:-len(suffix)] + replacement
+            break
+    if len(token) > 4 and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+def _text_terms(text: str):
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+    tokens = [token[:TERM_MAX_LENGTH] for token in _TOKEN_RE.findall(folded)]
+    return [_stem(token) for token in tokens if token not in STOPWORDS]
+
+def exam_terms(values):
+    weights = {}
+    for field, weight in EXAM_FIELD_WEIGHTS.items():
+        for term in _text_terms(values.get(field)):
+            weights[term] = weights.get(term, 0) + weight
+    return weights
+
+def upgrade(op):
+    op.ensure_table(exam_search_terms)
+
+    history_columns = [column for column in patient_histories.c if column.name != "id"]
+    last_id = 0
+    while True:
+        with op.engine.begin() as conn:
+            rows = conn.execute(
+                select(colposcopy_exams, *history_columns)
+                .outerjoin(patient_histories, patient_histories.c.id == colposcopy_exams.c.history_id)
+                .where(colposcopy_exams.c.id > last_id)
+                .order_by(colposcopy_exams.c.id)
+                .limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            ids = [row.id for row in rows]
+            # Replace rather than append so a rerun after an interruption does not duplicate terms
+            conn.execute(delete(exam_search_terms).where(exam_search_terms.c.exam_id.in_(ids)))
+            terms = [
+                {"exam_id": row.id, "term": term, "weight": weight}
+                for row in rows
+                for term, weight in sorted(exam_terms(row._mapping).items())
+            ]
+            if terms:
+                conn.execute(insert(exam_search_terms), terms)
+        last_id = ids[-1]
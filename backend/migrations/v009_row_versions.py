@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, MetaData, Table
+
+# Row versions for optimistic concurrency on patients, exams and appointments (PATCH with
+# If-Match). Existing rows start at version 1 through the server default.
+
+metadata = MetaData()
+
+tables = [
+    Table(name, metadata, Column("id", Integer, primary_key=True), Column("version", Integer, nullable=False, server_default="1"))
+    for name in ("patients", "colposcopy_exams", "appointments")
+]
+
+def upgrade(op):
+    for table in tables:
+        op.add_column(table.c.version)
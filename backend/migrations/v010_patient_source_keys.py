@@ -0,0 +1,20 @@
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Table
+
+# Maps patient ids of imported archives to local patients (bulk imports with a source name).
+
+metadata = MetaData()
+
+patients = Table(
+    "patients", metadata,
+    Column("id", Integer, primary_key=True),
+)
+
+patient_source_keys = Table(
+    "patient_source_keys", metadata,
+    Column("source", String(64), primary_key=True),
+    Column("source_id", Integer, primary_key=True, autoincrement=False),
+    Column("patient_id", Integer, ForeignKey("patients.id", ondelete="CASCADE"), nullable=False, index=True),
+)
+
+def upgrade(op):
+    op.ensure_table(patient_source_keys)
@@ -0,0 +1,21 @@
+from sqlalchemy import func, select
+from migrations import v003_patient_histories
+
+# Drops the per-exam clinical history columns of colposcopy_exams that v003 copied into
+# patient_histories. Exams still unlinked (e.g. restored from an old backup after v003) are
+# backfilled the same way first, and nothing is dropped unless every exam has a history.
+
+def upgrade(op):
+    exam_columns = op.columns("colposcopy_exams")
+    legacy_fields = [field for field in v003_patient_histories.HISTORY_FIELDS if field in exam_columns]
+    if not legacy_fields:
+        return
+    v003_patient_histories.backfill(op, legacy_fields)
+
+    exams = v003_patient_histories.colposcopy_exams
+    with op.engine.connect() as conn:
+        unlinked = conn.scalar(select(func.count()).select_from(exams).where(exams.c.history_id.is_(None)))
+    if unlinked:
+        raise RuntimeError(f"{unlinked} exam(s) are not linked to a clinical history; legacy history columns kept")
+    for field in legacy_fields:
+        op.drop_column("colposcopy_exams", field)
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Date, Text, JSON, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Date, Text, JSON, ForeignKey, DateTime, Index, UniqueConstraint
+from sqlalchemy.orm import relationship, deferred
 from database import Base
 
 class Patient(Base):
@@ -14,35 +14,47 @@ class Patient(Base):
     email = Column(String(255), nullable=True)
     referrer = Column(String(255), nullable=True)
     additional_data = Column(Text, nullable=True)
+    # Bumped by every ORM UPDATE, which also checks it (optimistic concurrency, see crud.check_version)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     exams = relationship("ColposcopyExam", back_populates="patient")
     appointments = relationship("Appointment", back_populates="patient")
+    search_terms = relationship("PatientSearchTerm", cascade="all, delete-orphan")
+    source_keys = relationship("PatientSourceKey", cascade="all, delete-orphan")
+    histories = relationship("PatientHistory", back_populates="patient")
 
-class ColposcopyExam(Base):
-    __tablename__ = "colposcopy_exams"
+    __mapper_args__ = {"version_id_col": version}
 
-    id = Column(Integer, primary_key=True, index=True)
-    patient_id = Column(Integer, ForeignKey("patients.id"))
-    study_date = Column(Date)
-    
-    # Text fields from the UI
-    vulva_vagina_desc = Column(Text, nullable=True)
-    observations = Column(Text, nullable=True)
-    diagnosis = Column(Text, nullable=True)
-    others = Column(Text, nullable=True)
-    referred_by = Column(String(255), nullable=True, default='GENERICO')
-    plan = Column(Text, nullable=True)
+class PatientSearchTerm(Base):
+    __tablename__ = "patient_search_terms"
 
-    # Dropdown/Selection fields
-    colposcopy_quality = Column(String(50), nullable=True) # Adecuada/No Adecuada
-    cervix_status = Column(String(50), nullable=True) # Atrofico/Normal/Hipotrofico
-    zone_transform = Column(String(50), nullable=True) # Normal/Anormal
-    borders = Column(String(50), nullable=True) # Definidos/No definidos
-    surface = Column(String(50), nullable=True) # Lisa/Irregular
-    schiller_test = Column(String(50), nullable=True) # Positivo/Negativo
-    acetowhite_epithelium = Column(String(50), nullable=True) # Ausente/Presente
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), nullable=False)
+    term = Column(String(64), nullable=False) # accent-folded, lowercase token
+
+    __table_args__ = (
+        Index("ix_patient_search_terms_term_patient", "term", "patient_id"),
+    )
+
+class PatientSourceKey(Base):
+    # Id a patient had in an imported archive, so that archive's exams and appointments
+    # can be attached to the patient it became here (see bulk.import_records)
+    __tablename__ = "patient_source_keys"
+
+    source = Column(String(64), primary_key=True) # archive name given to the import
+    source_id = Column(Integer, primary_key=True, autoincrement=False)
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), nullable=False, index=True)
 
-    # Gineco-Obstetric Data (Snapshot for this exam)
+class PatientHistory(Base):
+    __tablename__ = "patient_histories"
+
+    id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=True)
+    version = Column(Integer, nullable=False)
+    effective_date = Column(Date, nullable=True) # study date of the first exam recording this version
+    content_hash = Column(String(64), nullable=False)
+
+    # Gineco-Obstetric Data
     menarche_age = Column(Integer, nullable=True)
     menstrual_rhythm = Column(String(50), nullable=True)
     contraceptive_method = Column(String(100), nullable=True) # MPF
@@ -54,9 +66,6 @@ class ColposcopyExam(Base):
     fum = Column(Date, nullable=True) # Last period date
     last_pap_smear = Column(String(100), nullable=True) # Ultimo PAP (Date or result?)
 
-    # Images (Store paths as JSON list or specific columns)
-    image_paths = Column(JSON, nullable=True)
-
     # Patient History (Historial Clínico)
     h_enfermedades = Column(Text, nullable=True)
     h_medicamentos = Column(Text, nullable=True)
@@ -80,15 +89,118 @@ class ColposcopyExam(Base):
     # Detailed Pregnancy Registry (JSON list of objects)
     h_registro_embarazos = Column(JSON, nullable=True)
 
+    patient = relationship("Patient", back_populates="histories")
+
+    __table_args__ = (
+        UniqueConstraint("patient_id", "version", name="uq_patient_histories_patient_version"),
+        Index("ix_patient_histories_patient_hash", "patient_id", "content_hash"),
+    )
+
+HISTORY_FIELDS = [
+    column.key for column in PatientHistory.__table__.columns
+    if column.key not in ("id", "patient_id", "version", "effective_date", "content_hash")
+]
+
+# Bulky exam columns are deferred in these groups so listings only read the summary columns;
+# detail queries undefer them explicitly (see crud.exam_detail_options).
+EXAM_DETAIL_GROUPS = ("narrative", "images")
+
+class ColposcopyExam(Base):
+    __tablename__ = "colposcopy_exams"
+
+    id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"))
+    study_date = Column(Date)
+    
+    # Text fields from the UI
+    vulva_vagina_desc = deferred(Column(Text, nullable=True), group="narrative")
+    observations = deferred(Column(Text, nullable=True), group="narrative")
+    diagnosis = Column(Text, nullable=True)
+    others = deferred(Column(Text, nullable=True), group="narrative")
+    referred_by = Column(String(255), nullable=True, default='GENERICO')
+    plan = deferred(Column(Text, nullable=True), group="narrative")
+
+    # Dropdown/Selection fields
+    colposcopy_quality = Column(String(50), nullable=True) # Adecuada/No Adecuada
+    cervix_status = Column(String(50), nullable=True) # Atrofico/Normal/Hipotrofico
+    zone_transform = Column(String(50), nullable=True) # Normal/Anormal
+    borders = Column(String(50), nullable=True) # Definidos/No definidos
+    surface = Column(String(50), nullable=True) # Lisa/Irregular
+    schiller_test = Column(String(50), nullable=True) # Positivo/Negativo
+    acetowhite_epithelium = Column(String(50), nullable=True) # Ausente/Presente
+
+    # Images (Store paths as JSON list or specific columns)
+    image_paths = deferred(Column(JSON, nullable=True), group="images")
+
+    # Clinical history version in effect for this exam (shared across exams while unchanged)
+    history_id = Column(Integer, ForeignKey("patient_histories.id"), nullable=True, index=True)
+    # Bumped by every ORM UPDATE, which also checks it (optimistic concurrency, see crud.check_version)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
     patient = relationship("Patient", back_populates="exams")
+    history = relationship("PatientHistory")
+    search_terms = relationship("ExamSearchTerm", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Patient timelines (newest first) and study date ranges
+        Index("ix_colposcopy_exams_patient_study_date", "patient_id", "study_date"),
+        Index("ix_colposcopy_exams_study_date", "study_date"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+class ExamSearchTerm(Base):
+    # Inverted index over the exam narrative and clinical history text (see search.exam_terms)
+    __tablename__ = "exam_search_terms"
+
+    id = Column(Integer, primary_key=True)
+    exam_id = Column(Integer, ForeignKey("colposcopy_exams.id", ondelete="CASCADE"), nullable=False, index=True)
+    term = Column(String(64), nullable=False) # folded, stemmed token
+    weight = Column(Integer, nullable=False, default=1) # occurrences weighted by field
+
+    __table_args__ = (
+        Index("ix_exam_search_terms_term_exam", "term", "exam_id"),
+    )
 
 class Appointment(Base):
     __tablename__ = "appointments"
 
     id = Column(Integer, primary_key=True, index=True)
-    patient_id = Column(Integer, ForeignKey("patients.id"))
+    patient_id = Column(Integer, ForeignKey("patients.id"), index=True)
     date_time = Column(DateTime)
+    duration_minutes = Column(Integer, nullable=False, default=30)
+    ends_at = Column(DateTime, nullable=True) # date_time + duration, for overlap checks
     reason = Column(String(255), nullable=True)
     status = Column(String(50), default="Pendiente")
+    # Bumped by every ORM UPDATE, which also checks it (optimistic concurrency, see crud.check_version)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     patient = relationship("Patient", back_populates="appointments")
+
+    __table_args__ = (
+        # Calendar range scans, optionally narrowed by status
+        Index("ix_appointments_date_time_status", "date_time", "status"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+class ExamMonthlyStat(Base):
+    # Exam counts per month and reported value, kept current by reporting.track_exam_changes
+    __tablename__ = "exam_monthly_stats"
+
+    month = Column(Date, primary_key=True) # first day of the month
+    dimension = Column(String(32), primary_key=True) # "exams", "diagnosis", "referred_by", ...
+    value = Column(String(255), primary_key=True) # "" when the exam has no value
+    count = Column(Integer, nullable=False, default=0)
+
+class ScheduleDay(Base):
+    # One row per calendar day; bookings lock it so overlap checks and inserts are serialized
+    __tablename__ = "schedule_days"
+
+    day = Column(Date, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+def _history_proxy(field):
+    # Exams expose their history version's fields as read-only attributes for the response schemas
+    return property(lambda exam: getattr(exam.history, field) if exam.history is not None else None)
+
+for _field in HISTORY_FIELDS:
+    setattr(ColposcopyExam, _field, _history_proxy(_field))
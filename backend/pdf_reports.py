@@ -0,0 +1,358 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader, simpleSplit
+from reportlab.pdfgen import canvas
+from PIL import Image, ImageOps
+import glob
+import hashlib
+import io
+import json
+import os
+import uuid
+import zipfile
+import images, schemas, storage
+
+# Server-side colposcopy reports (same layout as ExamDetail.jsx). Rendering runs in a process
+# pool; finished PDFs are kept in PDF_CACHE_DIR under the exam id and a fingerprint of the
+# data they were rendered from, so re-prints are served from disk.
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "pdf_cache")
+PDF_BATCH_LIMIT = int(os.getenv("PDF_BATCH_LIMIT", "200"))
+# Bump when the layout changes so cached reports are rendered again
+RENDERER_VERSION = "1"
+
+IMAGE_LABELS = ("VISTA NORMAL", "VISTA ACIDO ACETICO", "VISTA LUGOL", "OTRA VISTA")
+IMAGE_MAX_EDGE = 1000 # ~300 dpi at the printed size
+ZIP_COPY_CHUNK = 1024 * 1024
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 36
+CONTENT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+BLUE = (0.12, 0.23, 0.54)
+GREY = (0.39, 0.45, 0.55)
+
+_executor = None
+
+# Report data
+def report_payload(db_exam) -> dict:
+    # Plain, picklable snapshot of everything the report shows
+    return schemas.dump(schemas.from_orm(schemas.ColposcopyExamWithPatient, db_exam))
+
+def report_fingerprint(payload: dict) -> str:
+    data = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(RENDERER_VERSION.encode() + data, digest_size=16).hexdigest()
+
+def report_path(exam_id: int, fingerprint: str) -> str:
+    return os.path.join(PDF_CACHE_DIR, f"exam-{exam_id}-{fingerprint}.pdf")
+
+def report_filename(payload: dict) -> str:
+    return f"colposcopia_{payload['id']}_{payload['study_date']}.pdf"
+
+def _image_key(backend, path: str):
+    # "/static/abc.jpg" (or an absolute URL) -> "abc.web.webp", falling back to the original
+    key = storage.key_from_url(path)
+    if key is None:
+        return None
+    for candidate in (images.derivative_name(key, "web"), key):
+        if backend.exists(candidate):
+            return candidate
+    return None
+
+def _load_image(path: str):
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE))
+        return ImageReader(image)
+
+def _image_reader(path: str):
+    backend = storage.get_storage()
+    key = _image_key(backend, path)
+    if key is None:
+        return None
+    with backend.local_file(key) as image_file:
+        return _load_image(image_file)
+
+# Layout
+class _ReportCanvas:
+    def __init__(self, buffer):
+        self.canvas = canvas.Canvas(buffer, pagesize=A4)
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def ensure_space(self, height: float):
+        if self.y - height < MARGIN:
+            self.canvas.showPage()
+            self.y = PAGE_HEIGHT - MARGIN
+
+    def centered(self, text: str, font: str, size: float, color=BLUE):
+        self.ensure_space(size + 4)
+        self.y -= size + 2
+        self.canvas.setFillColorRGB(*color)
+        self.canvas.setFont(font, size)
+        self.canvas.drawCentredString(PAGE_WIDTH / 2, self.y, text)
+
+    def section(self, title: str):
+        self.ensure_space(40)
+        self.y -= 18
+        self.canvas.setFillColorRGB(0.94, 0.95, 0.97)
+        self.canvas.rect(MARGIN, self.y - 4, CONTENT_WIDTH, 16, stroke=0, fill=1)
+        self.canvas.setFillColorRGB(*BLUE)
+        self.canvas.setFont("Helvetica-Bold", 9)
+        self.canvas.drawString(MARGIN + 4, self.y + 1, title.upper())
+        self.y -= 6
+
+    def paragraph(self, label: str, text: str, bold: bool = False):
+        font = "Helvetica-Bold" if bold else "Helvetica"
+        lines = simpleSplit((text or "").upper(), font, 9, CONTENT_WIDTH - 8) or [""]
+        self.ensure_space(14 + 11 * len(lines))
+        self.y -= 12
+        self.canvas.setFillColorRGB(*BLUE)
+        self.canvas.setFont("Helvetica-Bold", 8)
+        self.canvas.drawString(MARGIN + 4, self.y, f"{label.upper()}:")
+        self.canvas.setFillColorRGB(0, 0, 0)
+        self.canvas.setFont(font, 9)
+        for line in lines:
+            self.y -= 11
+            self.ensure_space(0)
+            self.canvas.drawString(MARGIN + 4, self.y, line)
+        self.y -= 2
+
+    def cells(self, items, label_size: float = 7):
+        # One row of equal-width label/value cells
+        width = CONTENT_WIDTH / len(items)
+        self.ensure_space(28)
+        self.y -= 26
+        for index, (label, value) in enumerate(items):
+            x = MARGIN + index * width
+            self.canvas.setStrokeColorRGB(0.8, 0.82, 0.86)
+            self.canvas.rect(x, self.y, width, 24, stroke=1, fill=0)
+            self.canvas.setFillColorRGB(*GREY)
+            self.canvas.setFont("Helvetica-Bold", label_size)
+            self.canvas.drawCentredString(x + width / 2, self.y + 15, label)
+            self.canvas.setFillColorRGB(0, 0, 0)
+            self.canvas.setFont("Helvetica", 8)
+            text = "" if value is None else str(value).strip()
+            text = (simpleSplit(text or "-", "Helvetica", 8, width - 4) or ["-"])[0]
+            self.canvas.drawCentredString(x + width / 2, self.y + 4, text)
+
+    def key_values(self, rows):
+        # Two columns of "LABEL  value" rows
+        column_width = CONTENT_WIDTH / 2
+        for left, right in zip(rows[0::2], rows[1::2] + [None]):
+            self.ensure_space(16)
+            self.y -= 15
+            for offset, row in ((0, left), (column_width, right)):
+                if row is None:
+                    continue
+                label, value = row
+                self.canvas.setFillColorRGB(*GREY)
+                self.canvas.setFont("Helvetica-Bold", 8)
+                self.canvas.drawString(MARGIN + offset + 4, self.y, label.upper())
+                self.canvas.setFillColorRGB(0, 0, 0)
+                self.canvas.setFont("Helvetica", 9)
+                self.canvas.drawString(MARGIN + offset + column_width * 0.45, self.y, str(value).upper())
+        self.y -= 4
+
+    def images_and_signature(self, image_readers):
+        box = CONTENT_WIDTH / 4 - 6
+        height = 2 * box + 24
+        self.ensure_space(height)
+        top = self.y - 12
+        for index, (label, reader) in enumerate(image_readers):
+            x = MARGIN + CONTENT_WIDTH / 2 + (index % 2) * (box + 8)
+            y = top - (index // 2 + 1) * (box + 8)
+            self.canvas.setStrokeColorRGB(0.8, 0.82, 0.86)
+            self.canvas.rect(x, y, box, box, stroke=1, fill=0)
+            if reader is not None:
+                self.canvas.drawImage(reader, x + 1, y + 1, box - 2, box - 2, preserveAspectRatio=True, anchor="c")
+            self.canvas.setFillColorRGB(0, 0, 0)
+            self.canvas.rect(x, y, box, 11, stroke=0, fill=1)
+            self.canvas.setFillColorRGB(1, 1, 1)
+            self.canvas.setFont("Helvetica", 6.5)
+            self.canvas.drawCentredString(x + box / 2, y + 3, label)
+
+        # Signature block on the left half
+        center = MARGIN + CONTENT_WIDTH / 4
+        bottom = top - height + 24
+        self.canvas.setFillColorRGB(*GREY)
+        self.canvas.setFont("Helvetica-Bold", 7)
+        self.canvas.drawCentredString(center, bottom + 56, "ATENTAMENTE:")
+        self.canvas.setStrokeColorRGB(0, 0, 0)
+        self.canvas.line(center - 100, bottom + 24, center + 100, bottom + 24)
+        self.canvas.setFillColorRGB(0, 0, 0)
+        self.canvas.setFont("Helvetica-Bold", 8)
+        self.canvas.drawCentredString(center, bottom + 14, "DR. JOSE LUIS ARTEAGA DOMINGUEZ")
+        self.canvas.setFont("Helvetica", 7)
+        self.canvas.drawCentredString(center, bottom + 5, "Ced. Prof.: 974987 / Ced. Esp.: 3225937")
+        self.y = top - height
+
+    def save(self):
+        self.canvas.save()
+
+def render_exam_pdf(payload: dict) -> bytes:
+    exam = payload
+    patient = exam.get("patient") or {}
+    buffer = io.BytesIO()
+    report = _ReportCanvas(buffer)
+    report.canvas.setTitle(f"Estudio de Colposcopia - {patient.get('name') or ''}")
+
+    report.centered("HOSPITAL SAN JOSE DE CELAYA", "Helvetica-Bold", 15)
+    report.centered("Dr. Jose Luis Arteaga Dominguez", "Times-BoldItalic", 14)
+    report.centered("ESPECIALISTA CERTIFICADO EN GINECOLOGÍA Y OBSTETRICIA", "Helvetica-Bold", 8)
+    report.centered("GINECOOBSTETRA COLPOSCOPISTA | HISTEROSCOPIA DX. Y QX.", "Helvetica", 7, GREY)
+    report.centered("CED. PROF. 974987 · CED. ESPEC. 3225937 · REG. S.S.A. GTO. 2561 Y 635 · CONSULTORIO: 461-61-49-393", "Helvetica", 6.5, GREY)
+    report.y -= 4
+    report.canvas.setStrokeColorRGB(*BLUE)
+    report.canvas.setLineWidth(1.5)
+    report.canvas.line(MARGIN, report.y, PAGE_WIDTH - MARGIN, report.y)
+    report.canvas.setLineWidth(1)
+
+    report.section("Estudio de Colposcopia.")
+    report.cells([
+        ("PACIENTE", patient.get("name")),
+        ("FECHA ESTUDIO", exam.get("study_date")),
+        ("EDAD", f"{patient['age']} Años" if patient.get("age") is not None else None),
+        ("ENVIO", exam.get("referred_by") or "GENERICO"),
+    ])
+
+    report.section("Datos Gineco-Obstetricos:")
+    years = lambda value: f"{value} Años" if value is not None else None
+    report.cells([
+        ("MENARCA", years(exam.get("menarche_age"))),
+        ("RITMO", exam.get("menstrual_rhythm")),
+        ("MPF", exam.get("contraceptive_method")),
+        ("IVSA", years(exam.get("ivsa_age"))),
+        ("G", exam.get("gestas")),
+        ("P", exam.get("partos")),
+        ("A", exam.get("abortos")),
+        ("C", exam.get("cesareas")),
+        ("ULTIMO PAP", exam.get("last_pap_smear")),
+    ], label_size=6)
+
+    report.section("Datos Colposcopicos:")
+    report.paragraph("Vulva y Vagina", exam.get("vulva_vagina_desc") or "SE OBSERVAN DE MANERA NORMAL")
+    report.key_values([
+        ("Colposcopia", exam.get("colposcopy_quality") or "EUTRÓFICO"),
+        ("Cervix", exam.get("cervix_status") or "EUTRÓFICO"),
+        ("Superficie", exam.get("surface") or "EUTRÓFICO"),
+        ("Bordes", exam.get("borders") or "EUTRÓFICO"),
+        ("Prueba de Schiller", exam.get("schiller_test") or "EUTRÓFICO"),
+        ("Zona Transformación", exam.get("zone_transform") or ""),
+        ("Epitelio Acetoblanco", exam.get("acetowhite_epithelium") or "AUSENTE"),
+    ])
+    report.paragraph("Observaciones", exam.get("observations"))
+    report.paragraph("Diagnostico Colposcopico", exam.get("diagnosis") or "SIN ALTERACIONES", bold=True)
+    report.paragraph("Otras", exam.get("others") or "Ninguna")
+    report.paragraph("Plan de Tratamiento", exam.get("plan"))
+
+    image_readers = []
+    for label, path in zip(IMAGE_LABELS, [path for path in (exam.get("image_paths") or []) if path][:4]):
+        image_readers.append((label, _image_reader(path)))
+    report.images_and_signature(image_readers)
+
+    report.save()
+    return buffer.getvalue()
+
+# Cache and worker pool
+def render_to_cache(payload: dict, fingerprint: str) -> str:
+    # Runs in a worker process; writes the PDF atomically and drops older renders of the exam
+    target = report_path(payload["id"], fingerprint)
+    if os.path.exists(target):
+        return target
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    tmp_target = f"{target}.{uuid.uuid4().hex}.part"
+    with open(tmp_target, "wb") as output:
+        output.write(render_exam_pdf(payload))
+    os.replace(tmp_target, target)
+    for stale in _cached_reports(payload["id"]):
+        if stale != target:
+            _remove(stale)
+    return target
+
+def _cached_reports(exam_id: int):
+    return glob.glob(os.path.join(PDF_CACHE_DIR, f"exam-{exam_id}-*.pdf"))
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def discard_reports(exam_ids):
+    # Called by crud after an exam (or its patient) changes or is deleted: the cached PDFs hold
+    # patient data and would otherwise stay on disk until the exam is printed again, or forever
+    for exam_id in exam_ids:
+        for path in _cached_reports(exam_id):
+            _remove(path)
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _executor
+
+def shutdown():
+    # In-flight requests have finished by now; queued renders have nobody waiting for them
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+def ensure_report(payload: dict):
+    # Returns (path, fingerprint); renders in the pool on a cache miss
+    fingerprint = report_fingerprint(payload)
+    path = report_path(payload["id"], fingerprint)
+    if not os.path.exists(path):
+        path = _get_executor().submit(render_to_cache, payload, fingerprint).result()
+    return path, fingerprint
+
+def iter_reports(payloads):
+    # Yields (payload, path): cached reports first, then renders as the pool finishes them
+    futures = {}
+    try:
+        for payload in payloads:
+            fingerprint = report_fingerprint(payload)
+            path = report_path(payload["id"], fingerprint)
+            if os.path.exists(path):
+                yield payload, path
+            else:
+                futures[_get_executor().submit(render_to_cache, payload, fingerprint)] = payload
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # Client went away: do not render what nobody will receive
+        for future in futures:
+            future.cancel()
+
+class _ZipStream(io.RawIOBase):
+    # Unseekable sink: zipfile writes data descriptors, and the response drains it per entry
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        chunks, self._chunks = self._chunks, []
+        return b"".join(chunks)
+
+def iter_zip(payloads):
+    stream = _ZipStream()
+    # PDFs are already compressed
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as archive:
+        for payload, path in iter_reports(payloads):
+            with open(path, "rb") as source, archive.open(report_filename(payload), "w") as target:
+                while True:
+                    chunk = source.read(ZIP_COPY_CHUNK)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    yield stream.drain()
+            yield stream.drain()
+    yield stream.drain()
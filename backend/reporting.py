@@ -0,0 +1,158 @@
+from sqlalchemy import select, insert, delete, func, case, extract
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+from collections import Counter
+from datetime import date, timedelta
+import argparse
+import os
+import models
+from database import engine
+
+# Clinical statistics over colposcopy exams. Every report is a GROUP BY in the database; when
+# the requested range covers whole months it is answered from exam_monthly_stats, a summary
+# table that crud.py updates in the same transaction as each exam insert/update/delete.
+
+USE_SUMMARIES = os.getenv("REPORT_SUMMARIES", "true").lower() in ("1", "true", "yes")
+
+TOTAL = "exams"
+DIMENSIONS = ("diagnosis", "referred_by", "schiller_test", "acetowhite_epithelium")
+POSITIVE_VALUES = {"schiller_test": "Positivo", "acetowhite_epithelium": "Presente"}
+VALUE_MAX_LENGTH = 255
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def _stat_value(value) -> str:
+    return (value or "")[:VALUE_MAX_LENGTH]
+
+# Incremental maintenance
+def exam_values(exam):
+    # Snapshot of the reported fields, from an ORM exam or a row dict
+    get = exam.get if isinstance(exam, dict) else lambda field: getattr(exam, field)
+    return {field: get(field) for field in ("study_date",) + DIMENSIONS}
+
+def _stat_keys(values):
+    if not values or values.get("study_date") is None:
+        return []
+    month = month_start(values["study_date"])
+    return [(month, TOTAL, "")] + [(month, dimension, _stat_value(values.get(dimension))) for dimension in DIMENSIONS]
+
+def stat_deltas(changes):
+    # changes: (before, after) snapshot pairs, None for a created/deleted exam
+    deltas = Counter()
+    for before, after in changes:
+        for key in _stat_keys(before):
+            deltas[key] -= 1
+        for key in _stat_keys(after):
+            deltas[key] += 1
+    return {key: delta for key, delta in deltas.items() if delta}
+
+def stat_upserts(deltas):
+    stats = models.ExamMonthlyStat.__table__
+    # Sorted so concurrent transactions lock summary rows in the same order
+    for (month, dimension, value), delta in sorted(deltas.items()):
+        row = {"month": month, "dimension": dimension, "value": value, "count": delta}
+        if engine.dialect.name == "mysql":
+            yield mysql.insert(stats).values(**row).on_duplicate_key_update(count=stats.c.count + delta)
+        else:
+            yield sqlite.insert(stats).values(**row).on_conflict_do_update(
+                index_elements=[stats.c.month, stats.c.dimension, stats.c.value],
+                set_={"count": stats.c.count + delta},
+            )
+
+def track_exam_changes(db: Session, changes):
+    for stmt in stat_upserts(stat_deltas(changes)):
+        db.execute(stmt)
+
+def rebuild_summaries(conn):
+    # Full recount, e.g. after importing data with SQL outside the application
+    exams = models.ColposcopyExam.__table__
+    stats = models.ExamMonthlyStat.__table__
+    year, month = extract("year", exams.c.study_date), extract("month", exams.c.study_date)
+
+    conn.execute(delete(stats))
+    for dimension in (TOTAL,) + DIMENSIONS:
+        group = [year, month] if dimension == TOTAL else [year, month, exams.c[dimension]]
+        rows = conn.execute(select(*group, func.count()).where(exams.c.study_date.isnot(None)).group_by(*group)).all()
+        totals = Counter()
+        for row in rows:
+            value = "" if dimension == TOTAL else _stat_value(row[2])
+            totals[(date(int(row[0]), int(row[1]), 1), value)] += row[-1]
+        if totals:
+            conn.execute(insert(stats), [
+                {"month": month_key, "dimension": dimension, "value": value, "count": count}
+                for (month_key, value), count in totals.items()
+            ])
+
+# Reports
+def _month_aligned(start: date = None, end: date = None) -> bool:
+    return (start is None or start.day == 1) and (end is None or (end + timedelta(days=1)).day == 1)
+
+def _use_summaries(start: date = None, end: date = None) -> bool:
+    return USE_SUMMARIES and _month_aligned(start, end)
+
+def _exam_range(start: date = None, end: date = None):
+    conditions = [models.ColposcopyExam.study_date.isnot(None)]
+    if start is not None:
+        conditions.append(models.ColposcopyExam.study_date >= start)
+    if end is not None:
+        conditions.append(models.ColposcopyExam.study_date <= end)
+    return conditions
+
+def _stat_range(dimension: str, start: date = None, end: date = None):
+    conditions = [models.ExamMonthlyStat.dimension == dimension]
+    if start is not None:
+        conditions.append(models.ExamMonthlyStat.month >= month_start(start))
+    if end is not None:
+        conditions.append(models.ExamMonthlyStat.month <= month_start(end))
+    return conditions
+
+def _value_counts_stmt(dimension: str, start: date = None, end: date = None):
+    if _use_summaries(start, end):
+        stat = models.ExamMonthlyStat
+        total = func.sum(stat.count)
+        return select(stat.value, total).where(*_stat_range(dimension, start, end)).group_by(stat.value).having(total > 0)
+    value = func.coalesce(getattr(models.ColposcopyExam, dimension), "")
+    return select(value, func.count()).where(*_exam_range(start, end)).group_by(value)
+
+def count_by(db: Session, dimension: str, start: date = None, end: date = None, limit: int = 50):
+    subquery = _value_counts_stmt(dimension, start, end).subquery()
+    value, count = subquery.c
+    rows = db.execute(select(value, count).order_by(count.desc(), value).limit(limit)).all()
+    return [{"value": value or None, "count": int(count)} for value, count in rows]
+
+def positivity(db: Session, dimension: str, start: date = None, end: date = None):
+    subquery = _value_counts_stmt(dimension, start, end).subquery()
+    value, count = subquery.c
+    total, positive = db.execute(select(
+        func.coalesce(func.sum(case((value != "", count), else_=0)), 0),
+        func.coalesce(func.sum(case((value == POSITIVE_VALUES[dimension], count), else_=0)), 0),
+    )).one()
+    total, positive = int(total), int(positive)
+    return {"field": dimension, "total": total, "positive": positive, "rate": round(positive / total, 4) if total else None}
+
+def exams_per_month(db: Session, start: date = None, end: date = None):
+    if _use_summaries(start, end):
+        stat = models.ExamMonthlyStat
+        rows = db.execute(
+            select(stat.month, func.sum(stat.count)).where(*_stat_range(TOTAL, start, end))
+            .group_by(stat.month).having(func.sum(stat.count) > 0).order_by(stat.month)
+        ).all()
+        return [{"month": f"{month:%Y-%m}", "count": int(count)} for month, count in rows]
+
+    study_date = models.ColposcopyExam.study_date
+    year, month = extract("year", study_date), extract("month", study_date)
+    rows = db.execute(select(year, month, func.count()).where(*_exam_range(start, end)).group_by(year, month).order_by(year, month)).all()
+    return [{"month": f"{int(year):04d}-{int(month):02d}", "count": count} for year, month, count in rows]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the exam report summary table")
+    parser.add_argument("--rebuild", action="store_true", help="Recount exam_monthly_stats from colposcopy_exams")
+    args = parser.parse_args(argv)
+    if args.rebuild:
+        with engine.begin() as conn:
+            rebuild_summaries(conn)
+        print("Report summaries rebuilt.")
+
+if __name__ == "__main__":
+    main()
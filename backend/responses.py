@@ -0,0 +1,61 @@
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from starlette.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel
+import json
+import logging
+import os
+import schemas
+
+try:
+    import orjson
+except ImportError: # optional: FAST_JSON falls back to the standard encoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Opt-in fast serialization: orjson instead of jsonable_encoder + json.dumps
+FAST_JSON = os.getenv("FAST_JSON", "false").lower() in ("1", "true", "yes")
+# Opt-in gzip for API responses of at least GZIP_MIN_SIZE bytes
+GZIP_RESPONSES = os.getenv("GZIP_RESPONSES", "false").lower() in ("1", "true", "yes")
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+
+if FAST_JSON and orjson is None:
+    logger.warning("FAST_JSON is set but orjson is not installed; using the standard JSON encoder")
+    FAST_JSON = False
+
+def _orjson_default(obj):
+    if isinstance(obj, BaseModel):
+        return schemas.dump(obj)
+    return jsonable_encoder(obj)
+
+def dumps(content) -> bytes:
+    if FAST_JSON:
+        return orjson.dumps(content, default=_orjson_default)
+    # Same encoding as FastAPI's default JSONResponse
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    # Default response class when FAST_JSON is on
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def model_response(schema, obj, status_code: int = 200) -> Response:
+    # Builds the response model from the ORM object once and encodes it directly; returning a
+    # Response skips FastAPI's second validation and serialization pass over the same data.
+    return Response(content=dumps(schemas.from_orm(schema, obj)), status_code=status_code, media_type="application/json")
+
+def models_response(schema, objs) -> Response:
+    return Response(content=dumps([schemas.from_orm(schema, obj) for obj in objs]), media_type="application/json")
+
+class APIGZipMiddleware(GZipMiddleware):
+    # Uploaded images are already compressed and served with their own caching headers
+    def __init__(self, app, minimum_size: int = GZIP_MIN_SIZE, excluded_prefixes=("/static",)):
+        super().__init__(app, minimum_size=minimum_size)
+        self.excluded_prefixes = excluded_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.excluded_prefixes):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
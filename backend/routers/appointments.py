@@ -1,23 +1,91 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timedelta
 from database import get_db
-import crud, schemas
+import cache, crud, schemas, scheduling
 
 router = APIRouter(
     prefix="/appointments",
     tags=["appointments"]
 )
 
+APPOINTMENT_REQUIRED = ("date_time", "duration_minutes")
+
 @router.post("/", response_model=schemas.Appointment)
 def create_appointment(appointment: schemas.AppointmentCreate, db: Session = Depends(get_db)):
-    return crud.create_appointment(db=db, appointment=appointment)
+    try:
+        return crud.create_appointment(db=db, appointment=appointment)
+    except scheduling.AppointmentConflict as e:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Appointment overlaps an existing booking", "conflicts": e.conflict_ids},
+        )
 
 @router.get("/", response_model=List[schemas.AppointmentWithPatient])
-def read_appointments(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    appointments = crud.get_appointments(db, skip=skip, limit=limit)
+def read_appointments(
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[str] = None,
+    patient_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    appointments = crud.get_appointments(db, skip=skip, limit=limit, start=start, end=end, status=status, patient_id=patient_id)
     return appointments
 
+@router.get("/counts", response_model=List[schemas.AppointmentDayCount])
+def read_appointment_day_counts(
+    start: datetime,
+    end: datetime,
+    status: Optional[str] = None,
+    patient_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    # Per-day totals for rendering a month/week calendar
+    return crud.get_appointment_day_counts(db, start=start, end=end, status=status, patient_id=patient_id)
+
+@router.get("/availability", response_model=List[schemas.AvailableSlot])
+def read_availability(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    duration_minutes: int = Query(scheduling.DEFAULT_DURATION_MINUTES, ge=5, le=scheduling.MAX_DURATION_MINUTES),
+    limit: int = Query(20, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    # Open slots within clinic hours; limit=1 answers "next free slot"
+    start = start or datetime.now().replace(second=0, microsecond=0)
+    end = end or start + timedelta(days=7)
+    if end <= start or end - start > timedelta(days=62):
+        raise HTTPException(status_code=400, detail="Range must be positive and at most 62 days")
+    return crud.get_available_slots(db, start=start, end=end, duration_minutes=duration_minutes, limit=limit)
+
+@router.patch("/{appointment_id}", response_model=schemas.Appointment)
+def patch_appointment(
+    appointment_id: int,
+    patch: schemas.AppointmentPatch,
+    expected_version: Optional[int] = Depends(cache.if_match_version),
+    db: Session = Depends(get_db),
+):
+    # Reschedule, resize or change the status; moves are checked for overlaps like new bookings
+    try:
+        values = schemas.patch_values(patch, APPOINTMENT_REQUIRED)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        db_appointment = crud.patch_appointment(db, appointment_id=appointment_id, values=values, expected_version=expected_version)
+    except crud.VersionMismatch as e:
+        raise HTTPException(status_code=412, detail={"message": "Appointment was modified since it was read", "version": e.current_version})
+    except scheduling.AppointmentConflict as e:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Appointment overlaps an existing booking", "conflicts": e.conflict_ids},
+        )
+    if db_appointment is None:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    return db_appointment
+
 @router.delete("/{appointment_id}")
 def delete_appointment(appointment_id: int, db: Session = Depends(get_db)):
     success = crud.delete_appointment(db, appointment_id=appointment_id)
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
+from database import get_async_db
+import cache, crud, crud_async, schemas, scheduling
+from routers.appointments import APPOINTMENT_REQUIRED
+
+# Async variants of the appointment endpoints, mounted ahead of routers/appointments.py when DB_ASYNC=true
+router = APIRouter(
+    prefix="/appointments",
+    tags=["appointments"]
+)
+
+@router.post("/", response_model=schemas.Appointment)
+async def create_appointment(appointment: schemas.AppointmentCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await crud_async.create_appointment(db=db, appointment=appointment)
+    except scheduling.AppointmentConflict as e:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Appointment overlaps an existing booking", "conflicts": e.conflict_ids},
+        )
+
+@router.get("/", response_model=List[schemas.AppointmentWithPatient])
+async def read_appointments(
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[str] = None,
+    patient_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    appointments = await crud_async.get_appointments(db, skip=skip, limit=limit, start=start, end=end, status=status, patient_id=patient_id)
+    return appointments
+
+@router.patch("/{appointment_id}", response_model=schemas.Appointment)
+async def patch_appointment(
+    appointment_id: int,
+    patch: schemas.AppointmentPatch,
+    expected_version: Optional[int] = Depends(cache.if_match_version),
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        values = schemas.patch_values(patch, APPOINTMENT_REQUIRED)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        db_appointment = await crud_async.patch_appointment(db, appointment_id=appointment_id, values=values, expected_version=expected_version)
+    except crud.VersionMismatch as e:
+        raise HTTPException(status_code=412, detail={"message": "Appointment was modified since it was read", "version": e.current_version})
+    except scheduling.AppointmentConflict as e:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Appointment overlaps an existing booking", "conflicts": e.conflict_ids},
+        )
+    if db_appointment is None:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    return db_appointment
+
+@router.delete("/{appointment_id}")
+async def delete_appointment(appointment_id: int, db: AsyncSession = Depends(get_async_db)):
+    success = await crud_async.delete_appointment(db, appointment_id=appointment_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    return {"message": "Appointment deleted"}
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+import io
+import database, bulk
+
+router = APIRouter(
+    prefix="/bulk",
+    tags=["bulk"],
+)
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def _check_entity(entity: str):
+    if entity not in bulk.ENTITIES:
+        raise HTTPException(status_code=404, detail=f"Unknown entity '{entity}'")
+
+@router.get("/{entity}/export")
+def export_entity(entity: str, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    _check_entity(entity)
+    return StreamingResponse(
+        bulk.iter_export_lines(entity, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{entity}.{format}"'},
+    )
+
+@router.post("/{entity}/import")
+def import_entity(
+    entity: str,
+    file: UploadFile = File(...),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    source: Optional[str] = Query(None, min_length=1, max_length=64, description="Archive name; patient ids in the file refer to the patients imported from it"),
+    db: Session = Depends(database.get_db),
+):
+    _check_entity(entity)
+    # The upload is spooled by Starlette; read it line by line instead of loading it whole
+    text_stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        return bulk.import_records(db, entity, text_stream, format, source=source)
+    finally:
+        text_stream.detach()
@@ -1,6 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile, File, Form
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-import database, schemas, crud
+from typing import Callable, List, Optional
+from datetime import date
+import json
+import database, schemas, crud, cache, responses, pdf_reports, images
+from routers import upload
 
 router = APIRouter(
     prefix="/exams",
@@ -8,13 +14,145 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+EXAM_BATCH_LIMIT = 500
+EXAM_REQUIRED = ("study_date",)
+
 @router.post("/", response_model=schemas.ColposcopyExam)
 def create_exam(exam: schemas.ColposcopyExamCreate, db: Session = Depends(database.get_db)):
-    return crud.create_patient_exam(db=db, exam=exam)
+    db_exam = crud.create_patient_exam(db=db, exam=exam)
+    return responses.model_response(schemas.ColposcopyExam, db_exam)
+
+def _check_slots(image_paths, slots, file_count: int):
+    if len(slots) not in (0, file_count):
+        raise HTTPException(status_code=400, detail="Send one slot per file")
+    max_slot = max(len(image_paths or []), upload.UPLOAD_BATCH_LIMIT)
+    for slot in slots:
+        if not 0 <= slot < max_slot:
+            raise HTTPException(status_code=400, detail=f"Invalid image slot {slot}")
+
+def _place_images(image_paths, urls, slots):
+    # Each file goes to its slot in image_paths (the form's fixed image positions), else the first empty one
+    paths = list(image_paths or [])
+    for index, url in enumerate(urls):
+        slot = slots[index] if slots else next((i for i, path in enumerate(paths) if not path), len(paths))
+        paths.extend([""] * (slot + 1 - len(paths)))
+        paths[slot] = url
+    return paths
+
+@router.post("/with-images", response_model=schemas.ColposcopyExam)
+def create_exam_with_images(
+    exam: str = Form(..., description="ColposcopyExamCreate as JSON"),
+    files: List[UploadFile] = File([]),
+    slots: List[int] = Form([]),
+    db: Session = Depends(database.get_db),
+):
+    # The exam form and its images in one request. Files are stored before the exam is
+    # committed; if the insert fails they are unreferenced and storage_gc.py collects them.
+    try:
+        exam_create = schemas.ColposcopyExamCreate(**json.loads(exam))
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=422, detail="exam must be a JSON object")
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail="; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+    if len(files) > upload.UPLOAD_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {upload.UPLOAD_BATCH_LIMIT} files per request")
+    _check_slots(exam_create.image_paths, slots, len(files))
+
+    try:
+        filenames = upload.store_uploads(files)
+    except upload.UploadTooLarge:
+        raise upload.too_large()
+    finally:
+        for file in files:
+            file.file.close()
+    # Host-independent, like the url POST /upload/ returns; the pages resolve it against the API base
+    urls = [f"/static/{filename}" for filename in filenames]
+    exam_create.image_paths = _place_images(exam_create.image_paths, urls, slots)
+
+    db_exam = crud.create_patient_exam(db=db, exam=exam_create)
+    for filename in filenames:
+        if images.has_derivatives(filename):
+            images.schedule_derivatives(filename)
+    return responses.model_response(schemas.ColposcopyExam, db_exam)
+
+@router.delete("/", response_model=schemas.ExamBulkDeleteResult)
+def delete_exams(
+    ids: str = Query(..., pattern=r"^\d+(,\d+)*$", description="Comma-separated exam ids"),
+    db: Session = Depends(database.get_db),
+):
+    exam_ids = list(dict.fromkeys(int(value) for value in ids.split(",")))
+    if len(exam_ids) > EXAM_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {EXAM_BATCH_LIMIT} exams per request")
+    deleted = crud.delete_colposcopy_exams(db, exam_ids)
+    return {"deleted": deleted, "missing": sorted(set(exam_ids) - set(deleted))}
+
+@router.get("/search", response_model=schemas.ExamSearchPage)
+def search_exams(
+    q: str = Query(..., min_length=1),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    referred_by: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(database.get_db),
+):
+    # Full-text search over diagnosis, observations, plan and clinical history text
+    return crud.search_exams(db, q=q, start=start, end=end, referred_by=referred_by, skip=skip, limit=limit)
 
 @router.get("/{exam_id}", response_model=schemas.ColposcopyExamWithPatient)
-def read_exam(exam_id: int, db: Session = Depends(database.get_db)):
+def read_exam(exam_id: int, request: Request, session: Callable[[], Session] = Depends(database.get_lazy_db)):
+    key = cache.exam_key(exam_id)
+    response, generation = cache.cached_response(request, key)
+    if response is not None:
+        return response
+
+    db_exam = crud.get_patient_exam(session(), exam_id=exam_id)
+    if db_exam is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    content = schemas.from_orm(schemas.ColposcopyExamWithPatient, db_exam)
+    return cache.store_response(request, key, content, generation, tags=[cache.patient_key(db_exam.patient_id)])
+
+@router.post("/reports", response_class=StreamingResponse)
+def download_exam_reports(batch: schemas.ExamReportBatch, db: Session = Depends(database.get_db)):
+    # ZIP of PDF reports, streamed as the worker pool renders them
+    exam_ids = list(dict.fromkeys(batch.exam_ids))
+    if not exam_ids or len(exam_ids) > pdf_reports.PDF_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Request between 1 and {pdf_reports.PDF_BATCH_LIMIT} exams")
+    db_exams = crud.get_patient_exams_by_ids(db, exam_ids)
+    missing = set(exam_ids) - {db_exam.id for db_exam in db_exams}
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Exam not found", "exam_ids": sorted(missing)})
+    # Snapshot everything before streaming: the session is not used once the response starts
+    payloads = [pdf_reports.report_payload(db_exam) for db_exam in db_exams]
+    return StreamingResponse(
+        pdf_reports.iter_zip(payloads),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="reportes_colposcopia.zip"'},
+    )
+
+@router.get("/{exam_id}/report.pdf", response_class=FileResponse)
+def read_exam_report(exam_id: int, request: Request, db: Session = Depends(database.get_db)):
     db_exam = crud.get_patient_exam(db, exam_id=exam_id)
+    if db_exam is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    payload = pdf_reports.report_payload(db_exam)
+    # The fingerprint is the ETag: a revalidation that still matches skips rendering and the file
+    fingerprint = pdf_reports.report_fingerprint(payload)
+    headers = {"ETag": f'"{fingerprint}"', "Cache-Control": "private, no-cache"}
+    if cache.etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    path, _ = pdf_reports.ensure_report(payload)
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        filename=pdf_reports.report_filename(payload),
+        content_disposition_type="inline",
+        headers=headers,
+    )
+
+@router.get("/{exam_id}/history", response_model=schemas.ColposcopyExamHistory)
+def read_exam_history(exam_id: int, db: Session = Depends(database.get_db)):
+    db_exam = crud.get_exam_history(db, exam_id=exam_id)
     if db_exam is None:
         raise HTTPException(status_code=404, detail="Exam not found")
     return db_exam
@@ -24,7 +162,27 @@ def update_exam(exam_id: int, exam: schemas.ColposcopyExamBase, db: Session = De
     db_exam = crud.update_colposcopy_exam(db, exam_id=exam_id, exam_update=exam)
     if db_exam is None:
         raise HTTPException(status_code=404, detail="Exam not found")
-    return db_exam
+    return responses.model_response(schemas.ColposcopyExam, db_exam)
+
+@router.patch("/{exam_id}", response_model=schemas.ColposcopyExam)
+def patch_exam(
+    exam_id: int,
+    patch: schemas.ColposcopyExamPatch,
+    expected_version: Optional[int] = Depends(cache.if_match_version),
+    db: Session = Depends(database.get_db),
+):
+    # Only the fields sent are written; If-Match: "<version>" rejects stale edits with 412
+    try:
+        values = schemas.patch_values(patch, EXAM_REQUIRED)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        db_exam = crud.patch_colposcopy_exam(db, exam_id=exam_id, values=values, expected_version=expected_version)
+    except crud.VersionMismatch as e:
+        raise HTTPException(status_code=412, detail={"message": "Exam was modified since it was read", "version": e.current_version})
+    if db_exam is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    return responses.model_response(schemas.ColposcopyExam, db_exam)
 
 @router.delete("/{exam_id}", response_model=bool)
 def delete_exam(exam_id: int, db: Session = Depends(database.get_db)):
@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import date
+import database, schemas, crud_async, cache, responses
+from routers.exams import EXAM_BATCH_LIMIT, EXAM_REQUIRED
+import crud
+
+# Async variants of the core exam endpoints, mounted ahead of routers/exams.py when DB_ASYNC=true
+router = APIRouter(
+    prefix="/exams",
+    tags=["exams"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.post("/", response_model=schemas.ColposcopyExam)
+async def create_exam(exam: schemas.ColposcopyExamCreate, db: AsyncSession = Depends(database.get_async_db)):
+    db_exam = await crud_async.create_patient_exam(db=db, exam=exam)
+    return responses.model_response(schemas.ColposcopyExam, db_exam)
+
+@router.delete("/", response_model=schemas.ExamBulkDeleteResult)
+async def delete_exams(
+    ids: str = Query(..., pattern=r"^\d+(,\d+)*$", description="Comma-separated exam ids"),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    exam_ids = list(dict.fromkeys(int(value) for value in ids.split(",")))
+    if len(exam_ids) > EXAM_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {EXAM_BATCH_LIMIT} exams per request")
+    deleted = await crud_async.delete_colposcopy_exams(db, exam_ids)
+    return {"deleted": deleted, "missing": sorted(set(exam_ids) - set(deleted))}
+
+@router.get("/search", response_model=schemas.ExamSearchPage)
+async def search_exams(
+    q: str = Query(..., min_length=1),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    referred_by: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    return await crud_async.search_exams(db, q=q, start=start, end=end, referred_by=referred_by, skip=skip, limit=limit)
+
+@router.get("/{exam_id}", response_model=schemas.ColposcopyExamWithPatient)
+async def read_exam(exam_id: int, request: Request, session=Depends(database.get_lazy_async_db)):
+    key = cache.exam_key(exam_id)
+    response, generation = cache.cached_response(request, key)
+    if response is not None:
+        return response
+
+    db_exam = await crud_async.get_patient_exam(await session(), exam_id=exam_id)
+    if db_exam is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    content = schemas.from_orm(schemas.ColposcopyExamWithPatient, db_exam)
+    return cache.store_response(request, key, content, generation, tags=[cache.patient_key(db_exam.patient_id)])
+
+@router.get("/{exam_id}/history", response_model=schemas.ColposcopyExamHistory)
+async def read_exam_history(exam_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    db_exam = await crud_async.get_exam_history(db, exam_id=exam_id)
+    if db_exam is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    return db_exam
+
+@router.put("/{exam_id}", response_model=schemas.ColposcopyExam)
+async def update_exam(exam_id: int, exam: schemas.ColposcopyExamBase, db: AsyncSession = Depends(database.get_async_db)):
+    db_exam = await crud_async.update_colposcopy_exam(db, exam_id=exam_id, exam_update=exam)
+    if db_exam is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    return responses.model_response(schemas.ColposcopyExam, db_exam)
+
+@router.patch("/{exam_id}", response_model=schemas.ColposcopyExam)
+async def patch_exam(
+    exam_id: int,
+    patch: schemas.ColposcopyExamPatch,
+    expected_version: Optional[int] = Depends(cache.if_match_version),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    try:
+        values = schemas.patch_values(patch, EXAM_REQUIRED)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        db_exam = await crud_async.patch_colposcopy_exam(db, exam_id=exam_id, values=values, expected_version=expected_version)
+    except crud.VersionMismatch as e:
+        raise HTTPException(status_code=412, detail={"message": "Exam was modified since it was read", "version": e.current_version})
+    if db_exam is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    return responses.model_response(schemas.ColposcopyExam, db_exam)
+
+@router.delete("/{exam_id}", response_model=bool)
+async def delete_exam(exam_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    success = await crud_async.delete_colposcopy_exam(db, exam_id=exam_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    return success
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import List
-import database, schemas, crud
+from typing import Callable, List, Optional
+from datetime import date
+import database, schemas, crud, cache, responses
 
 router = APIRouter(
     prefix="/patients",
@@ -9,6 +10,10 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+PATIENT_BATCH_LIMIT = 100
+# Columns a PATCH may change but not clear
+PATIENT_REQUIRED = ("name", "birth_date", "age")
+
 @router.post("/", response_model=schemas.Patient)
 def create_patient(patient: schemas.PatientCreate, db: Session = Depends(database.get_db)):
     return crud.create_patient(db=db, patient=patient)
@@ -16,14 +21,61 @@ def create_patient(patient: schemas.PatientCreate, db: Session = Depends(databas
 @router.get("/", response_model=List[schemas.Patient])
 def read_patients(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
     patients = crud.get_patients(db, skip=skip, limit=limit)
-    return patients
+    return responses.models_response(schemas.Patient, patients)
+
+@router.get("/summary", response_model=schemas.PatientPage)
+def read_patient_summaries(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    order_by: str = Query("id", pattern="^(id|name)$"),
+    db: Session = Depends(database.get_db),
+):
+    try:
+        return crud.get_patient_summaries(db, cursor=cursor, limit=limit, order_by=order_by)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/search", response_model=List[schemas.PatientBrief])
+def search_patients(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(database.get_db),
+):
+    return crud.search_patients(db, q=q, limit=limit)
+
+@router.get("/batch", response_model=List[schemas.Patient])
+def read_patients_batch(
+    ids: str = Query(..., pattern=r"^\d+(,\d+)*$", description="Comma-separated patient ids"),
+    db: Session = Depends(database.get_db),
+):
+    # Several patients in one round trip, in the requested order; unknown ids are left out
+    patient_ids = list(dict.fromkeys(int(value) for value in ids.split(",")))
+    if len(patient_ids) > PATIENT_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {PATIENT_BATCH_LIMIT} patients per request")
+    return responses.models_response(schemas.Patient, crud.get_patients_by_ids(db, patient_ids))
 
 @router.get("/{patient_id}", response_model=schemas.Patient)
-def read_patient(patient_id: int, db: Session = Depends(database.get_db)):
-    db_patient = crud.get_patient(db, patient_id=patient_id)
+def read_patient(patient_id: int, request: Request, session: Callable[[], Session] = Depends(database.get_lazy_db)):
+    key = cache.patient_key(patient_id)
+    response, generation = cache.cached_response(request, key)
+    if response is not None:
+        return response
+
+    db_patient = crud.get_patient(session(), patient_id=patient_id)
     if db_patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
-    return db_patient
+    return cache.store_response(request, key, schemas.from_orm(schemas.Patient, db_patient), generation)
+
+@router.get("/{patient_id}/history", response_model=schemas.PatientHistory)
+def read_patient_history(patient_id: int, at: Optional[date] = None, db: Session = Depends(database.get_db)):
+    db_history = crud.get_patient_history_at(db, patient_id=patient_id, at=at or date.today())
+    if db_history is None:
+        raise HTTPException(status_code=404, detail="History not found")
+    return db_history
+
+@router.get("/{patient_id}/history/versions", response_model=List[schemas.PatientHistory])
+def read_patient_history_versions(patient_id: int, db: Session = Depends(database.get_db)):
+    return crud.get_patient_history_versions(db, patient_id=patient_id)
 
 @router.put("/{patient_id}", response_model=schemas.Patient)
 def update_patient(patient_id: int, patient_update: schemas.PatientBase, db: Session = Depends(database.get_db)):
@@ -32,6 +84,26 @@ def update_patient(patient_id: int, patient_update: schemas.PatientBase, db: Ses
         raise HTTPException(status_code=404, detail="Patient not found")
     return db_patient
 
+@router.patch("/{patient_id}", response_model=schemas.Patient)
+def patch_patient(
+    patient_id: int,
+    patch: schemas.PatientPatch,
+    expected_version: Optional[int] = Depends(cache.if_match_version),
+    db: Session = Depends(database.get_db),
+):
+    # Only the fields sent are written; If-Match: "<version>" rejects stale edits with 412
+    try:
+        values = schemas.patch_values(patch, PATIENT_REQUIRED)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        db_patient = crud.patch_patient(db, patient_id=patient_id, values=values, expected_version=expected_version)
+    except crud.VersionMismatch as e:
+        raise HTTPException(status_code=412, detail={"message": "Patient was modified since it was read", "version": e.current_version})
+    if not db_patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return db_patient
+
 @router.delete("/{patient_id}")
 def delete_patient(patient_id: int, db: Session = Depends(database.get_db)):
     success = crud.delete_patient(db, patient_id=patient_id)
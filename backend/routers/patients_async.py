@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import database, schemas, crud_async, cache, responses
+from routers.patients import PATIENT_BATCH_LIMIT, PATIENT_REQUIRED
+import crud
+
+# Async variants of the core patient endpoints, mounted ahead of routers/patients.py when DB_ASYNC=true
+router = APIRouter(
+    prefix="/patients",
+    tags=["patients"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.post("/", response_model=schemas.Patient)
+async def create_patient(patient: schemas.PatientCreate, db: AsyncSession = Depends(database.get_async_db)):
+    return await crud_async.create_patient(db=db, patient=patient)
+
+@router.get("/summary", response_model=schemas.PatientPage)
+async def read_patient_summaries(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    order_by: str = Query("id", pattern="^(id|name)$"),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    try:
+        return await crud_async.get_patient_summaries(db, cursor=cursor, limit=limit, order_by=order_by)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/search", response_model=List[schemas.PatientBrief])
+async def search_patients(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    return await crud_async.search_patients(db, q=q, limit=limit)
+
+@router.get("/batch", response_model=List[schemas.Patient])
+async def read_patients_batch(
+    ids: str = Query(..., pattern=r"^\d+(,\d+)*$", description="Comma-separated patient ids"),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    patient_ids = list(dict.fromkeys(int(value) for value in ids.split(",")))
+    if len(patient_ids) > PATIENT_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {PATIENT_BATCH_LIMIT} patients per request")
+    return responses.models_response(schemas.Patient, await crud_async.get_patients_by_ids(db, patient_ids))
+
+@router.get("/{patient_id}", response_model=schemas.Patient)
+async def read_patient(patient_id: int, request: Request, session=Depends(database.get_lazy_async_db)):
+    key = cache.patient_key(patient_id)
+    response, generation = cache.cached_response(request, key)
+    if response is not None:
+        return response
+
+    db_patient = await crud_async.get_patient(await session(), patient_id=patient_id)
+    if db_patient is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return cache.store_response(request, key, schemas.from_orm(schemas.Patient, db_patient), generation)
+
+@router.put("/{patient_id}", response_model=schemas.Patient)
+async def update_patient(patient_id: int, patient_update: schemas.PatientBase, db: AsyncSession = Depends(database.get_async_db)):
+    db_patient = await crud_async.update_patient(db, patient_id=patient_id, patient_update=patient_update)
+    if not db_patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return db_patient
+
+@router.patch("/{patient_id}", response_model=schemas.Patient)
+async def patch_patient(
+    patient_id: int,
+    patch: schemas.PatientPatch,
+    expected_version: Optional[int] = Depends(cache.if_match_version),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    try:
+        values = schemas.patch_values(patch, PATIENT_REQUIRED)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        db_patient = await crud_async.patch_patient(db, patient_id=patient_id, values=values, expected_version=expected_version)
+    except crud.VersionMismatch as e:
+        raise HTTPException(status_code=412, detail={"message": "Patient was modified since it was read", "version": e.current_version})
+    if not db_patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return db_patient
+
+@router.delete("/{patient_id}")
+async def delete_patient(patient_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    success = await crud_async.delete_patient(db, patient_id=patient_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return {"message": "Patient deleted successfully"}
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+from database import get_db
+import reporting, schemas
+
+router = APIRouter(
+    prefix="/reports",
+    tags=["reports"]
+)
+
+def _check_range(start: Optional[date], end: Optional[date]):
+    if start and end and end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+
+@router.get("/diagnoses", response_model=List[schemas.ReportCount])
+def read_diagnosis_counts(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    _check_range(start, end)
+    return reporting.count_by(db, "diagnosis", start=start, end=end, limit=limit)
+
+@router.get("/referrers", response_model=List[schemas.ReportCount])
+def read_referrer_counts(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    _check_range(start, end)
+    return reporting.count_by(db, "referred_by", start=start, end=end, limit=limit)
+
+@router.get("/positivity", response_model=List[schemas.PositivityRate])
+def read_positivity_rates(start: Optional[date] = None, end: Optional[date] = None, db: Session = Depends(get_db)):
+    # Schiller test "Positivo" and acetowhite epithelium "Presente" over exams where the field was recorded
+    _check_range(start, end)
+    return [reporting.positivity(db, field, start=start, end=end) for field in reporting.POSITIVE_VALUES]
+
+@router.get("/exams-per-month", response_model=List[schemas.MonthlyCount])
+def read_exams_per_month(start: Optional[date] = None, end: Optional[date] = None, db: Session = Depends(get_db)):
+    _check_range(start, end)
+    return reporting.exams_per_month(db, start=start, end=end)
@@ -1,28 +1,178 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-import shutil
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List
+import hashlib
 import os
+import re
 import uuid
+import images
+import storage
 
 router = APIRouter(
     prefix="/upload",
     tags=["upload"]
 )
 
-UPLOAD_DIR = "uploads"
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024
+UPLOAD_BATCH_LIMIT = int(os.getenv("UPLOAD_BATCH_LIMIT", "10"))
+# Room for multipart boundaries and the other form fields (e.g. the exam JSON of /exams/with-images)
+FORM_OVERHEAD_BYTES = 1024 * 1024
 
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+# Leading bytes -> extension, so identical images share one key whatever the client named them
+_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"II*\x00", ".tif"),
+    (b"MM\x00*", ".tif"),
+    (b"%PDF-", ".pdf"),
+)
+# Spellings of the same type that clients send when the content is not recognized
+_EXTENSION_ALIASES = {".jpeg": ".jpg", ".jpe": ".jpg", ".tiff": ".tif"}
+
+def ensure_upload_dirs():
+    # Called once at startup (main.startup)
+    storage.get_storage().prepare()
+
+class UploadTooLarge(Exception):
+    pass
+
+def _safe_extension(filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    extension = _EXTENSION_ALIASES.get(extension, extension)
+    return extension if re.fullmatch(r"\.[a-z0-9]{1,10}", extension) else ""
+
+def sniff_extension(head: bytes):
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1"):
+        return ".heic"
+    for signature, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+def store_upload(source, extension: str) -> str:
+    # Blocking: stream to a temp file while hashing, then move into the content-addressed store.
+    # The key's extension comes from the content; the client's one is only a fallback.
+    backend = storage.get_storage()
+    digest = hashlib.sha256()
+    size = 0
+    sniffed = None
+    tmp_path = os.path.join(backend.staging_dir(), f"{uuid.uuid4()}.part")
+    try:
+        with open(tmp_path, "wb") as buffer:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if size == 0:
+                    sniffed = sniff_extension(chunk[:16])
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                buffer.write(chunk)
+
+        filename = f"{digest.hexdigest()}{sniffed or extension}"
+        if backend.exists(filename):
+            # Identical image already stored: reuse it, restarting its garbage collection grace period
+            backend.touch(filename)
+        else:
+            backend.save_file(filename, tmp_path, move=True)
+        return filename
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def store_uploads(files: List[UploadFile]) -> List[str]:
+    # Blocking; all files of a request in one threadpool hop
+    return [store_upload(file.file, _safe_extension(file.filename)) for file in files]
+
+def too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+
+def upload_body_limits() -> dict:
+    # Largest accepted request body per multipart endpoint (path without trailing slash)
+    batch = MAX_UPLOAD_BYTES * UPLOAD_BATCH_LIMIT + FORM_OVERHEAD_BYTES
+    return {"/upload": MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES, "/upload/batch": batch, "/exams/with-images": batch}
+
+class UploadLimitMiddleware:
+    # Pure ASGI: Starlette spools multipart bodies to disk before the endpoint runs, so the
+    # size check in store_upload alone does not protect the disk. Requests announcing a larger
+    # Content-Length are refused unread; chunked ones are cut off once they exceed the limit.
+    def __init__(self, app, limits: dict = None):
+        self.app = app
+        self.limits = limits if limits is not None else upload_body_limits()
+
+    async def __call__(self, scope, receive, send):
+        limit = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            limit = self.limits.get(scope["path"].rstrip("/"))
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body exceeds {limit // (1024 * 1024)} MB limit"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            await JSONResponse(status_code=413, content={"detail": detail})(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+def upload_result(filename: str) -> dict:
+    url = f"/static/{filename}"
+    response = {"url": url}
+    if images.has_derivatives(filename):
+        images.schedule_derivatives(filename)
+        response["variants"] = images.derivative_urls(url)
+    download_url = storage.get_storage().url(filename)
+    if download_url:
+        # Direct object storage URL (presigned unless S3_PUBLIC_URL is set)
+        response["download_url"] = download_url
+    return response
 
 @router.post("/")
 async def upload_file(file: UploadFile = File(...)):
     try:
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        return {"url": f"/static/{unique_filename}"}
+        filename = await run_in_threadpool(store_upload, file.file, _safe_extension(file.filename))
+        return upload_result(filename)
+    except UploadTooLarge:
+        raise too_large()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await file.close()
+
+@router.post("/batch")
+async def upload_files(files: List[UploadFile] = File(...)):
+    # Several images in one request; results are in the order the files were sent
+    try:
+        if len(files) > UPLOAD_BATCH_LIMIT:
+            raise HTTPException(status_code=400, detail=f"At most {UPLOAD_BATCH_LIMIT} files per request")
+        filenames = await run_in_threadpool(store_uploads, files)
+        return [upload_result(filename) for filename in filenames]
+    except HTTPException:
+        raise
+    except UploadTooLarge:
+        raise too_large()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for file in files:
+            await file.close()
@@ -0,0 +1,87 @@
+from datetime import datetime, time, timedelta
+from bisect import bisect_right
+import os
+
+# Clinic hours used by the availability search (local, naive datetimes like Appointment.date_time)
+CLINIC_OPEN = time.fromisoformat(os.getenv("CLINIC_OPEN", "09:00"))
+CLINIC_CLOSE = time.fromisoformat(os.getenv("CLINIC_CLOSE", "19:00"))
+# Weekdays with consultations, Monday=0 ... Sunday=6
+CLINIC_DAYS = {int(day) for day in os.getenv("CLINIC_DAYS", "0,1,2,3,4,5").split(",") if day.strip()}
+
+DEFAULT_DURATION_MINUTES = 30
+MAX_DURATION_MINUTES = 480
+SLOT_STEP_MINUTES = int(os.getenv("SLOT_STEP_MINUTES", "15"))
+
+# Appointments in these states do not occupy their slot
+NON_BLOCKING_STATUSES = ("Cancelada",)
+
+class AppointmentConflict(Exception):
+    def __init__(self, conflict_ids):
+        super().__init__("Appointment overlaps an existing booking")
+        self.conflict_ids = conflict_ids
+
+def appointment_end(start: datetime, duration_minutes: int) -> datetime:
+    return start + timedelta(minutes=duration_minutes)
+
+def days_spanned(start: datetime, end: datetime):
+    day = start.date()
+    last = (end - timedelta(microseconds=1)).date()
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+class IntervalIndex:
+    # Busy intervals merged and sorted by start, so "is [a, b) free?" is a bisect lookup
+    def __init__(self, intervals):
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+    def next_free(self, start: datetime, duration: timedelta):
+        # Earliest moment >= start where [t, t + duration) does not hit a busy interval
+        i = bisect_right(self.starts, start) - 1
+        if i >= 0 and self.ends[i] > start:
+            start = self.ends[i]
+        i += 1
+        while i < len(self.starts) and self.starts[i] < start + duration:
+            start = max(start, self.ends[i])
+            i += 1
+        return start
+
+def _align(moment: datetime, step: timedelta) -> datetime:
+    day_start = datetime.combine(moment.date(), time.min)
+    offset = moment - day_start
+    remainder = offset % step
+    return moment if not remainder else moment + (step - remainder)
+
+def working_windows(start: datetime, end: datetime):
+    day = start.date()
+    while day <= end.date():
+        if day.weekday() in CLINIC_DAYS:
+            window_start = max(start, datetime.combine(day, CLINIC_OPEN))
+            window_end = min(end, datetime.combine(day, CLINIC_CLOSE))
+            if window_start < window_end:
+                yield window_start, window_end
+        day += timedelta(days=1)
+
+def free_slots(busy: IntervalIndex, start: datetime, end: datetime, duration_minutes: int, limit: int):
+    duration = timedelta(minutes=duration_minutes)
+    step = timedelta(minutes=SLOT_STEP_MINUTES)
+    slots = []
+    for window_start, window_end in working_windows(start, end):
+        candidate = _align(window_start, step)
+        while candidate + duration <= window_end:
+            free_at = busy.next_free(candidate, duration)
+            if free_at != candidate:
+                candidate = _align(free_at, step)
+                continue
+            slots.append((candidate, candidate + duration))
+            if len(slots) >= limit:
+                return slots
+            candidate += step
+    return slots
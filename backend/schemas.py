@@ -1,23 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Any
 from datetime import date, datetime
 
 # Exam Schemas
-class ColposcopyExamBase(BaseModel):
-    study_date: date
-    vulva_vagina_desc: Optional[str] = None
-    observations: Optional[str] = None
-    diagnosis: Optional[str] = None
-    others: Optional[str] = None
-    referred_by: Optional[str] = 'GENERICO'
-    plan: Optional[str] = None
-    colposcopy_quality: Optional[str] = None
-    cervix_status: Optional[str] = None
-    zone_transform: Optional[str] = None
-    borders: Optional[str] = None
-    surface: Optional[str] = None
-    schiller_test: Optional[str] = None
-    acetowhite_epithelium: Optional[str] = None
+# Gineco-obstetric data and clinical history; stored as versioned PatientHistory rows shared by exams
+class ExamHistoryFields(BaseModel):
     menarche_age: Optional[int] = None
     menstrual_rhythm: Optional[str] = None
     contraceptive_method: Optional[str] = None
@@ -28,7 +15,6 @@ class ColposcopyExamBase(BaseModel):
     cesareas: Optional[int] = None
     fum: Optional[date] = None
     last_pap_smear: Optional[str] = None
-    image_paths: Optional[List[str]] = None
 
     # Patient History (Historial Clínico)
     h_enfermedades: Optional[str] = None
@@ -51,9 +37,49 @@ class ColposcopyExamBase(BaseModel):
     h_dispareunia: Optional[str] = None
     h_registro_embarazos: Optional[List[Any]] = None
 
+class ColposcopyExamBase(ExamHistoryFields):
+    study_date: date
+    vulva_vagina_desc: Optional[str] = None
+    observations: Optional[str] = None
+    diagnosis: Optional[str] = None
+    others: Optional[str] = None
+    referred_by: Optional[str] = 'GENERICO'
+    plan: Optional[str] = None
+    colposcopy_quality: Optional[str] = None
+    cervix_status: Optional[str] = None
+    zone_transform: Optional[str] = None
+    borders: Optional[str] = None
+    surface: Optional[str] = None
+    schiller_test: Optional[str] = None
+    acetowhite_epithelium: Optional[str] = None
+    image_paths: Optional[List[str]] = None
+
 class ColposcopyExamCreate(ColposcopyExamBase):
     patient_id: int
 
+# Partial updates (PATCH): only the fields sent are written, null clears an optional field.
+# Unknown fields are rejected (422) rather than dropped, so a PATCH never "succeeds" without
+# writing what was sent, e.g. patient_id: exams cannot be moved to another patient.
+class ColposcopyExamPatch(ExamHistoryFields):
+    study_date: Optional[date] = None
+    vulva_vagina_desc: Optional[str] = None
+    observations: Optional[str] = None
+    diagnosis: Optional[str] = None
+    others: Optional[str] = None
+    referred_by: Optional[str] = None
+    plan: Optional[str] = None
+    colposcopy_quality: Optional[str] = None
+    cervix_status: Optional[str] = None
+    zone_transform: Optional[str] = None
+    borders: Optional[str] = None
+    surface: Optional[str] = None
+    schiller_test: Optional[str] = None
+    acetowhite_epithelium: Optional[str] = None
+    image_paths: Optional[List[str]] = None
+
+    class Config:
+        extra = "forbid"
+
 class PatientBase(BaseModel):
     name: str
     birth_date: date
@@ -67,44 +93,200 @@ class PatientBase(BaseModel):
 class PatientCreate(PatientBase):
     pass
 
+class PatientPatch(BaseModel):
+    name: Optional[str] = None
+    birth_date: Optional[date] = None
+    age: Optional[int] = None
+    sex: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    referrer: Optional[str] = None
+    additional_data: Optional[str] = None
+
+    class Config:
+        extra = "forbid"
+
 class Patient(PatientBase):
     id: int
-    exams: List["ColposcopyExam"] = []
+    version: Optional[int] = None
+    exams: List["ColposcopyExamSummary"] = []
 
     class Config:
         orm_mode = True
 
-# Simple exam schema for listing inside Patient
+# Lightweight patient row for paginated listings (no nested exams)
+class PatientSummary(BaseModel):
+    id: int
+    name: str
+    age: Optional[int] = None
+    sex: Optional[str] = None
+    exam_count: int = 0
+    last_study_date: Optional[date] = None
+
+class PatientPage(BaseModel):
+    items: List[PatientSummary]
+    next_cursor: Optional[str] = None
+
+# Patient without nested exams (search hits, exam headers)
+class PatientBrief(PatientBase):
+    id: int
+
+    class Config:
+        orm_mode = True
+
+# Summary exam row for listing inside Patient; only non-deferred columns
+class ColposcopyExamSummary(BaseModel):
+    id: int
+    patient_id: int
+    study_date: date
+    diagnosis: Optional[str] = None
+    referred_by: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+# Clinical history of one exam, fetched on demand
+class ColposcopyExamHistory(ExamHistoryFields):
+    id: int
+    patient_id: int
+    study_date: date
+
+    class Config:
+        orm_mode = True
+
+# One stored version of a patient's clinical history
+class PatientHistory(ExamHistoryFields):
+    id: int
+    patient_id: int
+    version: int
+    effective_date: Optional[date] = None
+
+    class Config:
+        orm_mode = True
+
+# Full exam detail
 class ColposcopyExam(ColposcopyExamBase):
     id: int
     patient_id: int
+    version: Optional[int] = None
 
     class Config:
         orm_mode = True
 
 # Extended exam schema with Patient details (for single exam view)
 class ColposcopyExamWithPatient(ColposcopyExam):
-    patient: Optional[Patient] = None
+    patient: Optional[PatientBrief] = None
+
+# Ranked exam search hit (see crud.search_exams)
+class ExamSearchHit(BaseModel):
+    id: int
+    patient_id: Optional[int] = None
+    patient_name: Optional[str] = None
+    study_date: Optional[date] = None
+    diagnosis: Optional[str] = None
+    referred_by: Optional[str] = None
+    score: int
+
+class ExamSearchPage(BaseModel):
+    items: List[ExamSearchHit]
+    next_skip: Optional[int] = None
+
+class ExamReportBatch(BaseModel):
+    exam_ids: List[int]
+
+class ExamBulkDeleteResult(BaseModel):
+    deleted: List[int]
+    missing: List[int]
 
 # Appointment Schemas
 class AppointmentBase(BaseModel):
     date_time: datetime
+    duration_minutes: int = Field(30, ge=5, le=480)
     reason: Optional[str] = None
     status: Optional[str] = "Pendiente"
 
 class AppointmentCreate(AppointmentBase):
     patient_id: int
 
+class AppointmentPatch(BaseModel):
+    date_time: Optional[datetime] = None
+    duration_minutes: Optional[int] = Field(None, ge=5, le=480)
+    reason: Optional[str] = None
+    status: Optional[str] = None
+
+    class Config:
+        extra = "forbid"
+
 class Appointment(AppointmentBase):
     id: int
     patient_id: int
+    version: Optional[int] = None
+    duration_minutes: Optional[int] = 30
+    ends_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+# Compact patient projection for agenda rows
+class AppointmentPatient(BaseModel):
+    id: int
+    name: str
+    age: Optional[int] = None
+    phone: Optional[str] = None
 
     class Config:
         orm_mode = True
 
 class AppointmentWithPatient(Appointment):
-    patient: Optional[Patient] = None
+    patient: Optional[AppointmentPatient] = None
+
+class AvailableSlot(BaseModel):
+    start: datetime
+    end: datetime
+
+class AppointmentDayCount(BaseModel):
+    day: date
+    count: int
+
+# Reports
+class ReportCount(BaseModel):
+    value: Optional[str] = None
+    count: int
+
+class MonthlyCount(BaseModel):
+    month: str # YYYY-MM
+    count: int
+
+class PositivityRate(BaseModel):
+    field: str
+    total: int
+    positive: int
+    rate: Optional[float] = None
 
 # Update forward refs
 Patient.update_forward_refs()
 
+def from_orm(schema, obj):
+    # Works with both pydantic v1 (orm_mode) and v2 (from_attributes)
+    if hasattr(schema, "model_validate"):
+        return schema.model_validate(obj, from_attributes=True)
+    return schema.from_orm(obj)
+
+def non_nullable_string_fields(schema) -> set:
+    # Fields typed plain str (not Optional): "" is a value for them, never a missing one
+    if hasattr(schema, "model_fields"):
+        return {name for name, field in schema.model_fields.items() if field.annotation is str}
+    return {name for name, field in schema.__fields__.items() if field.outer_type_ is str and not field.allow_none}
+
+def patch_values(patch, required=()) -> dict:
+    # Fields sent in a PATCH body; ValueError when one that cannot be empty is sent as null
+    values = patch.dict(exclude_unset=True)
+    cleared = [field for field in required if field in values and values[field] is None]
+    if cleared:
+        raise ValueError(f"{', '.join(cleared)} cannot be null")
+    return values
+
+def dump(model):
+    if hasattr(model, "model_dump"):
+        return model.model_dump()
+    return model.dict()
@@ -0,0 +1,83 @@
+import re
+import unicodedata
+
+TERM_MAX_LENGTH = 64
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def fold(text: str) -> str:
+    # Lowercase and strip accents so "María Peña" matches "maria pena"
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return stripped.lower()
+
+def tokenize(text: str):
+    return [token[:TERM_MAX_LENGTH] for token in _TOKEN_RE.findall(fold(text))]
+
+def patient_terms(name: str = None, phone: str = None, email: str = None):
+    terms = set(tokenize(name))
+    terms.update(tokenize(email))
+    # Phones are indexed as a single digit string, whatever the separators ("442-123-4567")
+    digits = re.sub(r"\D", "", phone or "")
+    if digits:
+        terms.add(digits[:TERM_MAX_LENGTH])
+    return terms
+
+def patient_query_terms(q: str):
+    # Consecutive digit-only tokens are joined to match the phone term: "442-123-4567" and
+    # "442 123" become "4421234567" and "442123", which prefix-match "4421234567"
+    terms = []
+    for token in tokenize(q):
+        if token.isdigit() and terms and terms[-1].isdigit():
+            terms[-1] = (terms[-1] + token)[:TERM_MAX_LENGTH]
+        else:
+            terms.append(token)
+    return list(dict.fromkeys(terms))
+
+# Exam narrative search: folded, lightly stemmed Spanish terms weighted by the field they appear in
+EXAM_FIELD_WEIGHTS = {
+    "diagnosis": 3,
+    "observations": 2,
+    "plan": 1,
+    "others": 1,
+    "vulva_vagina_desc": 1,
+    "h_enfermedades": 1,
+    "h_medicamentos": 1,
+    "h_adicciones": 1,
+    "h_alergicos": 1,
+    "h_transfusionales": 1,
+    "h_quirurgicos": 1,
+    "h_no_patologicos": 1,
+    "h_familiares_oncologicos": 1,
+}
+
+# "no" and "sin" are kept: "sin alteraciones" and "no se observa" are findings
+STOPWORDS = frozenset(
+    "a al con de del e el en es la las lo los o para por que se su sus u un una unos unas y".split()
+)
+
+_PLURAL_SUFFIXES = (("ces", "z"), ("iones", "ion"), ("es", ""), ("s", ""))
+
+def stem(token: str) -> str:
+    # Light Spanish stemmer: folds plural and gender endings ("lesiones" -> "lesion",
+    # "acetoblancas" -> "acetoblanc") and leaves short tokens such as "nic" or "ii" alone
+    if len(token) <= 4 or token.isdigit():
+        return token
+    for suffix, replacement in _PLURAL_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            token = token[:-len(suffix)] + replacement
+            break
+    if len(token) > 4 and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+def text_terms(text: str):
+    return [stem(token) for token in tokenize(text) if token not in STOPWORDS]
+
+def exam_terms(values: dict):
+    # term -> weight (occurrences times field weight) for one exam's indexed fields
+    weights = {}
+    for field, weight in EXAM_FIELD_WEIGHTS.items():
+        for term in text_terms(values.get(field)):
+            weights[term] = weights.get(term, 0) + weight
+    return weights
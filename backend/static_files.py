@@ -0,0 +1,68 @@
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, RedirectResponse, Response
+import os
+import re
+import storage
+from storage import IMMUTABLE_CACHE_CONTROL
+
+# Uploads are named by content hash (or UUID for older files) and never rewritten,
+# so the name itself is a strong validator and clients may cache them forever.
+IMMUTABLE_NAME_RE = re.compile(r"^(?P<key>[0-9a-f]{64}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})(?P<suffix>(\.[a-z0-9]+)*)$", re.IGNORECASE)
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+
+class ImmutableStaticFiles(StaticFiles):
+    def get_path(self, scope) -> str:
+        path = super().get_path(scope)
+        # Never expose in-progress uploads or other hidden entries
+        if any(part.startswith(".") for part in path.replace("\\", "/").split("/") if part):
+            raise HTTPException(status_code=404)
+        return path
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = {"X-Content-Type-Options": "nosniff"}
+
+        match = IMMUTABLE_NAME_RE.match(os.path.basename(full_path))
+        if match:
+            headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+            headers["ETag"] = f'"{match.group("key").lower()}{match.group("suffix").lower()}"'
+        else:
+            headers["Cache-Control"] = DEFAULT_CACHE_CONTROL
+
+        # FileResponse handles Range requests and uses zero-copy "pathsend" when the server supports it
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class StorageStaticFiles(ImmutableStaticFiles):
+    # /static for object storage: files still in the local fallback directory (during a
+    # migration, see storage_migrate.py) are served directly, anything else is redirected to
+    # the storage URL so the bytes never pass through the application.
+    def __init__(self, directory: str = None, redirect_max_age: int = 0):
+        super().__init__(directory=directory, check_dir=False)
+        self.redirect_max_age = redirect_max_age
+
+    async def check_config(self):
+        # The fallback directory is optional and goes away once the migration is done
+        return
+
+    async def get_response(self, path: str, scope) -> Response:
+        if self.directory is not None:
+            try:
+                return await super().get_response(path, scope)
+            except HTTPException as e:
+                if e.status_code != 404:
+                    raise
+        elif scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405, headers={"Allow": "GET, HEAD"})
+
+        key = path.replace("\\", "/")
+        if not IMMUTABLE_NAME_RE.match(key):
+            raise HTTPException(status_code=404)
+        # Presigned URLs expire, so the redirect may only be cached for part of their lifetime
+        cache_control = f"private, max-age={self.redirect_max_age}" if self.redirect_max_age else "no-store"
+        return RedirectResponse(storage.get_storage().url(key), status_code=307, headers={"Cache-Control": cache_control})
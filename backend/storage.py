@@ -0,0 +1,256 @@
+from contextlib import contextmanager
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import uuid
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import ClientError
+except ImportError: # optional: only needed for STORAGE_BACKEND=s3
+    boto3 = None
+
+# Where uploaded images live. Files are addressed by key, the name after /static/ in the URLs
+# stored in ColposcopyExam.image_paths, so those references stay valid whichever backend holds
+# the bytes. "local" keeps them in UPLOAD_DIR (served by main.py's /static mount); "s3" keeps
+# them in an S3-compatible bucket (AWS, MinIO, ...) and /static redirects to presigned URLs.
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+# While moving to S3 (see storage_migrate.py), files still in this directory are served from it
+STORAGE_FALLBACK_DIR = os.getenv("STORAGE_FALLBACK_DIR")
+
+S3_BUCKET = os.getenv("S3_BUCKET", "colposcopia")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") # e.g. http://minio:9000
+# Endpoint the browser reaches the storage service at, when it differs from S3_ENDPOINT_URL
+# (e.g. http://localhost:9000 for the compose MinIO); presigned URLs are signed for this host
+S3_PUBLIC_ENDPOINT_URL = os.getenv("S3_PUBLIC_ENDPOINT_URL")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_PRESIGN_SECONDS = int(os.getenv("S3_PRESIGN_SECONDS", "3600"))
+# Set for a public bucket or CDN to hand out direct URLs instead of presigned ones
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL")
+S3_MULTIPART_MB = int(os.getenv("S3_MULTIPART_MB", "8"))
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+QUARANTINE_PREFIX = ".quarantine"
+
+_KEY_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{0,254}")
+
+class StorageError(Exception):
+    pass
+
+def valid_key(key: str) -> bool:
+    # Flat names only: no directories, no hidden entries such as the staging area
+    return bool(key) and _KEY_RE.fullmatch(key) is not None
+
+def key_from_url(path: str):
+    # "/static/abc.jpg" or "http://host:8000/static/abc.jpg" -> "abc.jpg"; None for foreign URLs
+    if not path:
+        return None
+    _, found, key = path.split("?")[0].split("#")[0].rpartition("/static/")
+    return key if found and valid_key(key) else None
+
+def _content_type(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+def _iter_staging(directory: str):
+    # (path, modified timestamp) of temp files, including leftovers of interrupted uploads
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_file():
+                yield entry.path, entry.stat().st_mtime
+
+class LocalStorage:
+    def __init__(self, root: str = UPLOAD_DIR):
+        self.root = root
+
+    def prepare(self):
+        os.makedirs(self.staging_dir(), exist_ok=True)
+
+    def staging_dir(self) -> str:
+        # Same filesystem as the files, so finished uploads are moved into place atomically
+        return os.path.join(self.root, ".tmp")
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.path(key))
+
+    def size(self, key: str):
+        try:
+            return os.path.getsize(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def save_file(self, key: str, source_path: str, move: bool = False):
+        target = self.path(key)
+        if move:
+            os.replace(source_path, target)
+            return
+        tmp_target = os.path.join(self.staging_dir(), f"{uuid.uuid4()}.part")
+        shutil.copyfile(source_path, tmp_target)
+        os.replace(tmp_target, target)
+
+    def open(self, key: str):
+        return open(self.path(key), "rb")
+
+    @contextmanager
+    def local_file(self, key: str):
+        yield self.path(key)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def touch(self, key: str):
+        # Marks a reused file as fresh so storage_gc.py gives it a new grace period
+        os.utime(self.path(key))
+
+    def quarantine(self, key: str):
+        # Out of /static and of iter_files, but recoverable by moving it back
+        os.makedirs(os.path.join(self.root, QUARANTINE_PREFIX), exist_ok=True)
+        os.replace(self.path(key), os.path.join(self.root, QUARANTINE_PREFIX, key))
+
+    def iter_staging(self):
+        return _iter_staging(self.staging_dir())
+
+    def iter_files(self):
+        # (key, size, modified timestamp) for every stored file
+        try:
+            entries = os.scandir(self.root)
+        except FileNotFoundError:
+            return
+        with entries:
+            for entry in entries:
+                if entry.is_file() and valid_key(entry.name):
+                    stat = entry.stat()
+                    yield entry.name, stat.st_size, stat.st_mtime
+
+    def url(self, key: str):
+        # Served by the /static mount
+        return None
+
+class S3Storage:
+    def __init__(self, bucket: str = S3_BUCKET, client=None, signing_client=None):
+        if client is None:
+            if boto3 is None:
+                raise StorageError("STORAGE_BACKEND=s3 requires boto3")
+            # Credentials come from the usual AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY variables
+            client = boto3.client("s3", endpoint_url=S3_ENDPOINT_URL, region_name=S3_REGION)
+            if S3_PUBLIC_ENDPOINT_URL:
+                # The host is part of the signature, so URLs are signed against the public endpoint
+                signing_client = boto3.client("s3", endpoint_url=S3_PUBLIC_ENDPOINT_URL, region_name=S3_REGION)
+        self.bucket = bucket
+        self.client = client
+        self.signing_client = signing_client or client
+        chunk = S3_MULTIPART_MB * 1024 * 1024
+        self.transfer_config = TransferConfig(multipart_threshold=chunk, multipart_chunksize=chunk)
+
+    def prepare(self):
+        os.makedirs(self.staging_dir(), exist_ok=True)
+
+    def staging_dir(self) -> str:
+        return os.getenv("STORAGE_STAGING_DIR", os.path.join(tempfile.gettempdir(), "colposcopia-uploads"))
+
+    def _head(self, key: str):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def size(self, key: str):
+        head = self._head(key)
+        return head["ContentLength"] if head is not None else None
+
+    def save_file(self, key: str, source_path: str, move: bool = False):
+        # upload_file switches to a multipart upload above S3_MULTIPART_MB, streaming from disk
+        self.client.upload_file(
+            source_path, self.bucket, key,
+            ExtraArgs={"ContentType": _content_type(key), "CacheControl": IMMUTABLE_CACHE_CONTROL},
+            Config=self.transfer_config,
+        )
+        if move:
+            os.remove(source_path)
+
+    def open(self, key: str):
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+
+    @contextmanager
+    def local_file(self, key: str):
+        # Temporary local copy for code that needs a real file (Pillow, reportlab)
+        self.prepare()
+        path = os.path.join(self.staging_dir(), f"{uuid.uuid4()}-{key}")
+        try:
+            self.client.download_file(self.bucket, key, path)
+            yield path
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def touch(self, key: str):
+        # Objects cannot be touched: copying one onto itself resets LastModified
+        self.client.copy_object(
+            Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": key},
+            MetadataDirective="REPLACE", ContentType=_content_type(key), CacheControl=IMMUTABLE_CACHE_CONTROL,
+        )
+
+    def quarantine(self, key: str):
+        self.client.copy_object(Bucket=self.bucket, Key=f"{QUARANTINE_PREFIX}/{key}", CopySource={"Bucket": self.bucket, "Key": key})
+        self.delete(key)
+
+    def iter_staging(self):
+        return _iter_staging(self.staging_dir())
+
+    def iter_files(self):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket):
+            for item in page.get("Contents", []):
+                if valid_key(item["Key"]):
+                    yield item["Key"], item["Size"], item["LastModified"].timestamp()
+
+    def url(self, key: str):
+        if S3_PUBLIC_URL:
+            return f"{S3_PUBLIC_URL.rstrip('/')}/{key}"
+        # Signed locally, no request to the storage service
+        return self.signing_client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=S3_PRESIGN_SECONDS,
+        )
+
+BACKENDS = {"local": LocalStorage, "s3": S3Storage}
+
+_storage = None
+_storage_pid = None
+
+def get_storage():
+    # Built from the environment once per process (image and PDF workers build their own)
+    global _storage, _storage_pid
+    if _storage is None or _storage_pid != os.getpid():
+        if STORAGE_BACKEND not in BACKENDS:
+            raise StorageError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}")
+        _storage = BACKENDS[STORAGE_BACKEND]()
+        _storage_pid = os.getpid()
+    return _storage
+
+def set_storage(backend):
+    # Any object with the LocalStorage/S3Storage methods
+    global _storage, _storage_pid
+    _storage = backend
+    _storage_pid = os.getpid()
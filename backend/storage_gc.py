@@ -0,0 +1,144 @@
+from collections import defaultdict
+import argparse
+import json
+import logging
+import os
+import time
+import crud, images, models, storage
+from database import SessionLocal
+
+# Garbage collection for uploaded images. Uploads are not tied to an exam until it is saved,
+# and deleting an exam or patient leaves its files behind, so this job (run from cron, e.g.
+# "docker-compose exec backend python storage_gc.py --delete") compares the stored files with
+# the image_paths of every exam and removes or quarantines the unreferenced ones. Files younger
+# than the grace period are kept: they may belong to an exam form that is still being filled in
+# (re-uploading an identical image refreshes the stored file, see routers/upload.py).
+
+GC_GRACE_HOURS = float(os.getenv("GC_GRACE_HOURS", "24"))
+
+logger = logging.getLogger(__name__)
+
+def scan_references(db, batch_size: int = 1000):
+    # {key: patient ids} for every referenced image and rendition, streamed in exam id batches
+    references = defaultdict(set)
+    for batch in crud.iter_exam_image_paths(db, batch_size):
+        for _, patient_id, image_paths in batch:
+            for path in image_paths or []:
+                key = storage.key_from_url(path)
+                if key is None:
+                    continue
+                for referenced in [key] + [images.derivative_name(key, variant) for variant in images.VARIANTS]:
+                    references[referenced].add(patient_id)
+    return references
+
+def collect(backend, db, grace_hours: float = GC_GRACE_HOURS, action: str = None, batch_size: int = 1000):
+    # action: None (report only), "delete" or "quarantine"
+    # References are read before listing files: anything uploaded meanwhile is within the grace period
+    references = scan_references(db, batch_size)
+    cutoff = time.time() - grace_hours * 3600
+
+    usage = defaultdict(lambda: [0, 0]) # patient id -> [files, bytes]
+    result = {"files": 0, "bytes": 0, "orphans": 0, "orphan_bytes": 0, "recent_orphans": 0, "reclaimed_bytes": 0, "failed": 0}
+    found = set()
+    for key, size, modified in backend.iter_files():
+        result["files"] += 1
+        result["bytes"] += size
+        patients = references.get(key)
+        if patients:
+            found.add(key)
+            # A file shared by several patients counts towards each of them
+            for patient_id in patients:
+                usage[patient_id][0] += 1
+                usage[patient_id][1] += size
+            continue
+
+        result["orphans"] += 1
+        result["orphan_bytes"] += size
+        if modified > cutoff:
+            result["recent_orphans"] += 1
+            continue
+        if action is None:
+            continue
+        try:
+            if action == "quarantine":
+                backend.quarantine(key)
+            else:
+                backend.delete(key)
+            result["reclaimed_bytes"] += size
+        except Exception as e:
+            logger.warning("%s: %s", key, e)
+            result["failed"] += 1
+
+    # Leftovers of interrupted uploads
+    for path, modified in backend.iter_staging():
+        if modified <= cutoff and action is not None:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                result["reclaimed_bytes"] += size
+            except FileNotFoundError:
+                pass
+
+    result["missing"] = sorted(key for key in references if key not in found and not images.is_derivative(key))
+    result["usage"] = usage
+    return result
+
+def patient_usage(db, usage, limit: int = None):
+    # [{patient_id, name, files, bytes}] largest first
+    ranked = sorted(usage.items(), key=lambda item: (-item[1][1], item[0] or 0))
+    if limit:
+        ranked = ranked[:limit]
+    ids = [patient_id for patient_id, _ in ranked if patient_id is not None]
+    names = dict(db.query(models.Patient.id, models.Patient.name).filter(models.Patient.id.in_(ids)).all()) if ids else {}
+    return [
+        {"patient_id": patient_id, "name": names.get(patient_id), "files": files, "bytes": size}
+        for patient_id, (files, size) in ranked
+    ]
+
+def _size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remove uploaded images no exam references and report storage usage")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--delete", action="store_true", help="Delete unreferenced files past the grace period")
+    action.add_argument("--quarantine", action="store_true", help=f"Move them under {storage.QUARANTINE_PREFIX}/ instead of deleting")
+    parser.add_argument("--grace-hours", type=float, default=GC_GRACE_HOURS, help="Keep unreferenced files younger than this")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Exams read per query")
+    parser.add_argument("--top", type=int, default=20, help="Patients listed in the usage report (0 for all)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    backend = storage.get_storage()
+    db = SessionLocal()
+    try:
+        result = collect(backend, db, args.grace_hours, "delete" if args.delete else "quarantine" if args.quarantine else None, args.batch_size)
+        result["usage"] = patient_usage(db, result["usage"], args.top)
+    finally:
+        db.close()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"Stored: {result['files']} file(s), {_size(result['bytes'])}")
+    print(f"Unreferenced: {result['orphans']} file(s), {_size(result['orphan_bytes'])} "
+          f"({result['recent_orphans']} within the {args.grace_hours:g} h grace period)")
+    if args.delete or args.quarantine:
+        verb = "Deleted" if args.delete else "Quarantined"
+        print(f"{verb}: {_size(result['reclaimed_bytes'])}" + (f", {result['failed']} failed" if result["failed"] else ""))
+    else:
+        print("Dry run: pass --delete or --quarantine to reclaim space")
+    if result["missing"]:
+        print(f"Referenced but missing: {len(result['missing'])} image(s)")
+    print("Storage by patient:")
+    for row in result["usage"]:
+        print(f"  {row['patient_id']:>6}  {_size(row['bytes']):>10}  {row['files']:>5} file(s)  {row['name'] or ''}")
+
+if __name__ == "__main__":
+    main()
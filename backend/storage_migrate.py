@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import logging
+import crud, images, storage
+from database import SessionLocal
+
+# Copies uploaded images from a local uploads directory into the configured storage backend.
+# Exams keep referencing /static/<key>, so nothing in the database changes and the move can
+# happen while the application serves traffic:
+#   1. deploy with STORAGE_BACKEND=s3 and STORAGE_FALLBACK_DIR=<old uploads directory>;
+#      new uploads go to the bucket, existing files are still served from the directory
+#   2. python storage_migrate.py --source-dir <old uploads directory> (re-runnable: copied
+#      files are skipped)
+#   3. drop STORAGE_FALLBACK_DIR and remove the directory (or use --delete-source)
+
+logger = logging.getLogger(__name__)
+
+def referenced_keys(db, batch_size: int = 1000):
+    # Keys of every image referenced by an exam plus their renditions, streamed in id batches
+    seen = set()
+    for batch in crud.iter_exam_image_paths(db, batch_size):
+        for _, _, image_paths in batch:
+            for path in image_paths or []:
+                key = storage.key_from_url(path)
+                if key is None or key in seen:
+                    continue
+                seen.add(key)
+                yield key
+                for variant in images.VARIANTS:
+                    yield images.derivative_name(key, variant)
+
+def copy_key(source, target, key: str, dry_run: bool = False, delete_source: bool = False):
+    # Returns (outcome, bytes): "copied", "skipped" (already in the target) or "missing"
+    size = source.size(key)
+    if size is None:
+        return ("skipped" if target.exists(key) else "missing"), 0
+    if target.size(key) == size:
+        outcome = "skipped"
+    elif dry_run:
+        return "copied", size
+    else:
+        with source.local_file(key) as path:
+            target.save_file(key, path)
+        if target.size(key) != size:
+            raise storage.StorageError(f"Size mismatch after copying {key}")
+        outcome = "copied"
+    if delete_source and not dry_run:
+        source.delete(key)
+    return outcome, size
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copy uploaded images into the configured storage backend")
+    parser.add_argument("--source-dir", default=storage.UPLOAD_DIR, help="Local uploads directory to copy from")
+    parser.add_argument("--all", action="store_true", help="Copy every file in the directory, not only images referenced by exams")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent transfers")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Exams read per query")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be copied")
+    parser.add_argument("--delete-source", action="store_true", help="Remove local files once they are in the target")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    source = storage.LocalStorage(args.source_dir)
+    target = storage.get_storage()
+    if isinstance(target, storage.LocalStorage):
+        parser.error("STORAGE_BACKEND must point at the destination (e.g. STORAGE_BACKEND=s3)")
+    target.prepare()
+
+    totals = {"copied": 0, "skipped": 0, "missing": 0, "failed": 0}
+    copied_bytes = 0
+    db = SessionLocal()
+    try:
+        if args.all:
+            keys = (key for key, _, _ in source.iter_files())
+        else:
+            keys = referenced_keys(db, args.batch_size)
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(copy_key, source, target, key, args.dry_run, args.delete_source): key for key in keys}
+            for future, key in futures.items():
+                try:
+                    outcome, size = future.result()
+                except Exception as e:
+                    logger.warning("%s: %s", key, e)
+                    outcome, size = "failed", 0
+                totals[outcome] += 1
+                if outcome == "copied":
+                    copied_bytes += size
+                if outcome == "missing" and not images.is_derivative(key):
+                    logger.warning("%s: referenced but not found in %s", key, args.source_dir)
+    finally:
+        db.close()
+
+    prefix = "Would copy" if args.dry_run else "Copied"
+    print(f"{prefix} {totals['copied']} file(s) ({copied_bytes / (1024 * 1024):.1f} MB); "
+          f"{totals['skipped']} already stored, {totals['missing']} missing, {totals['failed']} failed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+// Exams created with POST /exams/with-images store "/static/abc.jpg"; older ones the absolute URL
+export function imageUrl(path) {
+    if (!path || path.startsWith('http')) return path;
+    return `${import.meta.env.VITE_API_URL || 'http://localhost:8000'}${path}`;
+}
+
+// Derivative renditions generated by the backend next to each upload:
+// "/static/abc.jpg" -> "/static/abc.thumb.webp" / "/static/abc.web.webp"
+export function variantUrl(path, variant) {
+    if (!path || !path.includes('/static/')) return path;
+    const slash = path.lastIndexOf('/');
+    const filename = path.slice(slash + 1);
+    const dot = filename.lastIndexOf('.');
+    const stem = dot > 0 ? filename.slice(0, dot) : filename;
+    return `${path.slice(0, slash + 1)}${stem}.${variant}.webp`;
+}
+
+// Fall back to the original file for images uploaded before renditions existed
+export function fallbackToOriginal(path) {
+    return (e) => {
+        if (e.currentTarget.src !== path) e.currentTarget.src = path;
+    };
+}
@@ -18,24 +18,35 @@ export default function Appointments() {
 
     useEffect(() => {
         fetchAppointments();
-        fetchPatients();
     }, []);
 
+    useEffect(() => {
+        if (!searchTerm || selectedPatient) {
+            setPatients([]);
+            return;
+        }
+        const timer = setTimeout(() => searchPatients(searchTerm), 150);
+        return () => clearTimeout(timer);
+    }, [searchTerm, selectedPatient]);
+
     const fetchAppointments = async () => {
         try {
-            const response = await axios.get(`${API_BASE_URL}/appointments/`);
-            // Only show future appointments (from now onwards)
-            const now = new Date();
-            const futureOnly = response.data.filter(appt => new Date(appt.date_time) > now);
-            setAppointments(futureOnly);
+            // Only future appointments (from now onwards), filtered by the API
+            const now = new Date().toLocaleString('sv-SE').replace(' ', 'T');
+            const response = await axios.get(`${API_BASE_URL}/appointments/`, {
+                params: { start: now, limit: 500 }
+            });
+            setAppointments(response.data);
         } catch (err) {
             console.error('Error fetching appointments:', err);
         }
     };
 
-    const fetchPatients = async () => {
+    const searchPatients = async (term) => {
         try {
-            const response = await axios.get(`${API_BASE_URL}/patients/`);
+            const response = await axios.get(`${API_BASE_URL}/patients/search`, {
+                params: { q: term, limit: 5 }
+            });
             setPatients(response.data);
         } catch (err) {
             console.error('Error fetching patients:', err);
@@ -66,7 +77,11 @@ export default function Appointments() {
             setSearchTerm('');
             fetchAppointments();
         } catch (err) {
-            setError('Error al crear la cita. Verifique los datos.');
+            if (err.response?.status === 409) {
+                setError('El horario se empalma con otra cita. Elija otra hora.');
+            } else {
+                setError('Error al crear la cita. Verifique los datos.');
+            }
             console.error(err);
         } finally {
             setLoading(false);
@@ -83,10 +98,6 @@ export default function Appointments() {
         }
     };
 
-    const filteredPatients = patients.filter(p =>
-        p.name.toLowerCase().includes(searchTerm.toLowerCase())
-    ).slice(0, 5);
-
     return (
         <div className="max-w-6xl mx-auto space-y-8 animate-in fade-in duration-500">
             <div className="flex items-center justify-between">
@@ -125,7 +136,7 @@ export default function Appointments() {
 
                                     {searchTerm && !selectedPatient && (
                                         <div className="absolute z-10 w-full mt-1 bg-white border border-slate-100 rounded-xl shadow-2xl overflow-hidden">
-                                            {filteredPatients.map(p => (
+                                            {patients.map(p => (
                                                 <button
                                                     key={p.id}
                                                     type="button"
@@ -139,7 +150,7 @@ export default function Appointments() {
                                                     <span className="text-xs text-slate-400">Edad: {p.age} años</span>
                                                 </button>
                                             ))}
-                                            {filteredPatients.length === 0 && (
+                                            {patients.length === 0 && (
                                                 <div className="px-4 py-3 text-xs text-slate-400 italic">No se encontraron pacientes</div>
                                             )}
                                         </div>
@@ -1,14 +1,32 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import api from '../api';
+import { imageUrl, variantUrl, fallbackToOriginal } from '../images';
 import { Save, ArrowLeft, Plus } from 'lucide-react';
 
+const numericFields = ['menarche_age', 'ivsa_age', 'gestas', 'partos', 'abortos', 'cesareas', 'h_parejas'];
+
+// Form values in the shape the API expects
+const cleanExam = (data) => {
+    const cleanedData = { ...data };
+    numericFields.forEach(field => {
+        if (cleanedData[field] === '' || cleanedData[field] === null) cleanedData[field] = null;
+        else cleanedData[field] = parseInt(cleanedData[field]);
+    });
+
+    if (cleanedData.fum === '') cleanedData.fum = null;
+    if (cleanedData.h_fpp === '') cleanedData.h_fpp = null;
+    return cleanedData;
+};
+
 export default function EditExam() {
     const { examId } = useParams();
     const navigate = useNavigate();
     const [saving, setSaving] = useState(false);
     const [loading, setLoading] = useState(true);
     const [activeTab, setActiveTab] = useState('study'); // 'study' or 'history'
+    // Exam as loaded: only fields that differ from it are sent, guarded by its version
+    const [original, setOriginal] = useState(null);
 
     const [formData, setFormData] = useState({
         study_date: '',
@@ -65,7 +83,6 @@ export default function EditExam() {
 
                 // Ensure nulls are handled for the form
                 const mappedData = { ...data };
-                const numericFields = ['menarche_age', 'ivsa_age', 'gestas', 'partos', 'abortos', 'cesareas', 'h_parejas'];
                 numericFields.forEach(field => {
                     if (mappedData[field] === null) mappedData[field] = '';
                 });
@@ -75,6 +92,7 @@ export default function EditExam() {
                 if (!mappedData.h_registro_embarazos) mappedData.h_registro_embarazos = [];
 
                 setFormData(mappedData);
+                setOriginal(cleanExam(mappedData));
             } catch (error) {
                 console.error("Error fetching exam", error);
                 alert("Error al cargar el estudio");
@@ -143,22 +161,25 @@ export default function EditExam() {
         e.preventDefault();
         setSaving(true);
 
-        const cleanedData = { ...formData };
-        const numericFields = ['menarche_age', 'ivsa_age', 'gestas', 'partos', 'abortos', 'cesareas', 'h_parejas'];
-        numericFields.forEach(field => {
-            if (cleanedData[field] === '') cleanedData[field] = null;
-            else cleanedData[field] = parseInt(cleanedData[field]);
+        const cleanedData = cleanExam(formData);
+        const changes = {};
+        Object.keys(cleanedData).forEach(field => {
+            if (JSON.stringify(cleanedData[field]) !== JSON.stringify(original?.[field])) changes[field] = cleanedData[field];
         });
 
-        if (cleanedData.fum === '') cleanedData.fum = null;
-        if (cleanedData.h_fpp === '') cleanedData.h_fpp = null;
-
         try {
-            await api.put(`/exams/${examId}`, cleanedData);
+            if (Object.keys(changes).length > 0) {
+                const headers = original?.version ? { 'If-Match': `"${original.version}"` } : {};
+                await api.patch(`/exams/${examId}`, changes, { headers });
+            }
             navigate(`/exams/${examId}`);
         } catch (error) {
             console.error("Error updating exam", error);
-            alert("Error al actualizar estudio");
+            if (error.response?.status === 412 || error.response?.status === 409) {
+                alert("El estudio fue modificado por otro usuario. Recargue la página para ver los cambios.");
+            } else {
+                alert("Error al actualizar estudio");
+            }
         } finally {
             setSaving(false);
         }
@@ -564,7 +585,7 @@ export default function EditExam() {
                                         onChange={(e) => handleImageUpload(index, e)}
                                     />
                                     {path ? (
-                                        <img src={path} alt={`Exam ${index + 1}`} className="w-full h-full object-cover" />
+                                        <img src={variantUrl(imageUrl(path), 'thumb')} onError={fallbackToOriginal(imageUrl(path))} alt={`Exam ${index + 1}`} className="w-full h-full object-cover" />
                                     ) : (
                                         <div className="text-center">
                                             <Plus className="mx-auto text-slate-400 mb-1 group-hover:text-indigo-500" />
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import api from '../api';
+import { imageUrl, variantUrl, fallbackToOriginal } from '../images';
 import { ArrowLeft, Printer } from 'lucide-react';
 
 export default function ExamDetail() {
@@ -296,7 +297,8 @@ export default function ExamDetail() {
                             {exam.image_paths && exam.image_paths.slice(0, 4).map((path, idx) => path && (
                                 <div key={idx} className="relative aspect-square border border-slate-300 overflow-hidden bg-slate-50">
                                     <img
-                                        src={path.startsWith('http') ? path : `${import.meta.env.VITE_API_URL || 'http://localhost:8000'}${path}`}
+                                        src={variantUrl(imageUrl(path), 'web')}
+                                        onError={fallbackToOriginal(imageUrl(path))}
                                         className="w-full h-full object-cover"
                                         alt="Colpo"
                                     />
@@ -51,8 +51,10 @@ export default function Home() {
 
     const fetchAppointments = async () => {
         try {
-            const response = await axios.get(`${API_BASE_URL}/appointments/`);
             const now = new Date();
+            const response = await axios.get(`${API_BASE_URL}/appointments/`, {
+                params: { start: now.toLocaleString('sv-SE').replace(' ', 'T'), limit: 500 }
+            });
             const todayStr = now.toLocaleDateString('en-CA');
             const endOfDay = new Date(now);
             endOfDay.setHours(23, 59, 59, 999);
@@ -1,13 +1,18 @@
 import React, { useState } from 'react';
-import { useParams, useNavigate } from 'react-router-dom';
+import { useParams, useNavigate, useLocation } from 'react-router-dom';
 import api from '../api';
 import { Save, Printer, ArrowLeft, Plus } from 'lucide-react';
 
 export default function NewExam() {
     const { id } = useParams();
     const navigate = useNavigate();
+    // PatientDetail passes the patient's referrer along, so the form needs no patient request
+    const { state: patientState } = useLocation();
     const [saving, setSaving] = useState(false);
     const [activeTab, setActiveTab] = useState('study'); // 'study' or 'history'
+    // Selected images are sent together with the exam when it is saved (POST /exams/with-images)
+    const [imageFiles, setImageFiles] = useState([null, null, null, null]);
+    const [imagePreviews, setImagePreviews] = useState(['', '', '', '']);
 
     const [formData, setFormData] = useState({
         study_date: new Date().toISOString().split('T')[0],
@@ -35,7 +40,7 @@ export default function NewExam() {
         cesareas: '',
         fum: '',
         last_pap_smear: '',
-        referred_by: 'GENERICO',
+        referred_by: patientState?.referrer || 'GENERICO',
 
         image_paths: ['', '', '', ''], // 4 slots
 
@@ -62,6 +67,8 @@ export default function NewExam() {
     });
 
     React.useEffect(() => {
+        // Only when the page is opened directly (bookmark, typed URL) without navigation state
+        if (patientState) return;
         const fetchPatient = async () => {
             try {
                 const response = await api.get(`/patients/${id}`);
@@ -73,30 +80,16 @@ export default function NewExam() {
             }
         };
         fetchPatient();
-    }, [id]);
+    }, [id, patientState]);
 
-    const handleImageUpload = async (index, e) => {
+    const handleImageUpload = (index, e) => {
         const file = e.target.files[0];
         if (!file) return;
 
-        const uploadFormData = new FormData();
-        uploadFormData.append('file', file);
-
-        try {
-            const response = await api.post('/upload/', uploadFormData, {
-                headers: { 'Content-Type': 'multipart/form-data' }
-            });
-            const imageUrl = import.meta.env.VITE_API_URL ? `${import.meta.env.VITE_API_URL}${response.data.url}` : `http://localhost:8000${response.data.url}`;
-
-            setFormData(prev => {
-                const newPaths = [...prev.image_paths];
-                newPaths[index] = imageUrl;
-                return { ...prev, image_paths: newPaths };
-            });
-        } catch (error) {
-            console.error("Error uploading image", error);
-            alert("Error al subir imagen");
-        }
+        setImageFiles(prev => prev.map((current, i) => (i === index ? file : current)));
+        if (imagePreviews[index]) URL.revokeObjectURL(imagePreviews[index]);
+        const preview = URL.createObjectURL(file);
+        setImagePreviews(prev => prev.map((current, i) => (i === index ? preview : current)));
     };
 
     const handleChange = (e) => {
@@ -144,8 +137,19 @@ export default function NewExam() {
         if (cleanedData.fum === '') cleanedData.fum = null;
         if (cleanedData.h_fpp === '') cleanedData.h_fpp = null;
 
+        const payload = new FormData();
+        payload.append('exam', JSON.stringify(cleanedData));
+        imageFiles.forEach((file, index) => {
+            if (file) {
+                payload.append('files', file);
+                payload.append('slots', index);
+            }
+        });
+
         try {
-            await api.post('/exams/', cleanedData);
+            await api.post('/exams/with-images', payload, {
+                headers: { 'Content-Type': 'multipart/form-data' }
+            });
             navigate(`/patients/${id}`);
         } catch (error) {
             console.error("Error saving exam", error);
@@ -611,7 +615,7 @@ export default function NewExam() {
                         <h3 className="text-sm font-bold text-slate-700 mb-3 text-center">Imágenes Colposcópicas</h3>
 
                         <div className="grid grid-cols-2 grid-rows-2 gap-2 h-[500px]">
-                            {formData.image_paths.map((path, index) => (
+                            {imagePreviews.map((preview, index) => (
                                 <div key={index} className="border-2 border-dashed border-slate-300 rounded-lg flex items-center justify-center bg-slate-50 hover:bg-slate-100 transition-colors cursor-pointer relative group overflow-hidden">
                                     <input
                                         type="file"
@@ -619,8 +623,8 @@ export default function NewExam() {
                                         className="absolute inset-0 w-full h-full opacity-0 cursor-pointer z-10"
                                         onChange={(e) => handleImageUpload(index, e)}
                                     />
-                                    {path ? (
-                                        <img src={path} alt={`Exam ${index + 1}`} className="w-full h-full object-cover" />
+                                    {preview ? (
+                                        <img src={preview} alt={`Exam ${index + 1}`} className="w-full h-full object-cover" />
                                     ) : (
                                         <div className="text-center">
                                             <Plus className="mx-auto text-slate-400 mb-1 group-hover:text-indigo-500" />
@@ -39,11 +39,23 @@ export default function PatientDetail() {
         }
     };
 
+    const handleViewHistory = async (examId) => {
+        try {
+            // History fields are not part of the patient payload; fetch them on demand
+            const response = await api.get(`/exams/${examId}/history`);
+            setViewingHistory(response.data);
+        } catch (error) {
+            console.error("Error fetching exam history", error);
+            alert("Error al cargar el historial");
+        }
+    };
+
     const handleDeleteExam = async (examId) => {
         if (window.confirm("¿Está seguro de eliminar este estudio específico? Esta acción no se puede deshacer.")) {
             try {
                 await api.delete(`/exams/${examId}`);
-                fetchPatient(); // Refresh list
+                // Drop it locally instead of fetching the whole patient again
+                setPatient(prev => ({ ...prev, exams: prev.exams.filter(exam => exam.id !== examId) }));
             } catch (error) {
                 console.error("Error deleting exam", error);
                 alert("Error al eliminar el estudio");
@@ -244,6 +256,7 @@ export default function PatientDetail() {
                 <div className="flex gap-2">
                     <Link
                         to={`/patients/${id}/new-exam`}
+                        state={{ referrer: patient.referrer }}
                         className="bg-indigo-600 hover:bg-indigo-700 text-white px-4 py-2 rounded-lg flex items-center gap-2 transition-colors shadow-md shadow-indigo-200"
                     >
                         <Plus size={20} />
@@ -343,7 +356,7 @@ export default function PatientDetail() {
                                             <div className="flex flex-col gap-2">
                                                 <div className="flex justify-center gap-3">
                                                     <button
-                                                        onClick={() => setViewingHistory(exam)}
+                                                        onClick={() => handleViewHistory(exam.id)}
                                                         className="flex items-center gap-1.5 text-indigo-600 hover:text-indigo-800 text-xs font-bold uppercase transition-colors"
                                                     >
                                                         <Eye size={14} /> Ver Historial
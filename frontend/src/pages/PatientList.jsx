@@ -8,11 +8,17 @@ export default function PatientList() {
     const [patients, setPatients] = useState([]);
     const [loading, setLoading] = useState(true);
     const [showForm, setShowForm] = useState(false);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [query, setQuery] = useState('');
+    const [results, setResults] = useState(null); // search hits; null while the box is empty
 
-    const fetchPatients = async () => {
+    const fetchPatients = async (cursor = null) => {
         try {
-            const response = await api.get('/patients');
-            setPatients(response.data);
+            const response = await api.get('/patients/summary', {
+                params: { order_by: 'name', limit: 50, cursor: cursor || undefined }
+            });
+            setPatients(prev => cursor ? [...prev, ...response.data.items] : response.data.items);
+            setNextCursor(response.data.next_cursor);
         } catch (error) {
             console.error("Error fetching patients", error);
         } finally {
@@ -24,6 +30,30 @@ export default function PatientList() {
         fetchPatients();
     }, []);
 
+    // Name, phone or email search (GET /patients/search), once typing pauses
+    useEffect(() => {
+        const q = query.trim();
+        if (!q) {
+            setResults(null);
+            return;
+        }
+        let stale = false;
+        const timer = setTimeout(async () => {
+            try {
+                const response = await api.get('/patients/search', { params: { q, limit: 50 } });
+                if (!stale) setResults(response.data);
+            } catch (error) {
+                console.error("Error searching patients", error);
+            }
+        }, 250);
+        return () => {
+            stale = true;
+            clearTimeout(timer);
+        };
+    }, [query]);
+
+    const rows = results ?? patients;
+
     return (
         <div>
             <div className="flex justify-between items-center mb-6">
@@ -44,6 +74,8 @@ export default function PatientList() {
                         <input
                             type="text"
                             placeholder="Buscar paciente..."
+                            value={query}
+                            onChange={(e) => setQuery(e.target.value)}
                             className="w-full pl-10 pr-4 py-2 border rounded-lg focus:outline-none focus:ring-2 focus:ring-indigo-500"
                         />
                     </div>
@@ -62,10 +94,10 @@ export default function PatientList() {
                     <tbody className="divide-y divide-slate-100">
                         {loading ? (
                             <tr><td colSpan="5" className="px-6 py-8 text-center text-slate-500">Cargando...</td></tr>
-                        ) : patients.length === 0 ? (
-                            <tr><td colSpan="5" className="px-6 py-8 text-center text-slate-500">No hay pacientes registrados.</td></tr>
+                        ) : rows.length === 0 ? (
+                            <tr><td colSpan="5" className="px-6 py-8 text-center text-slate-500">{results ? 'Sin resultados.' : 'No hay pacientes registrados.'}</td></tr>
                         ) : (
-                            patients.map(patient => (
+                            rows.map(patient => (
                                 <tr key={patient.id} className="hover:bg-slate-50 transition-colors">
                                     <td className="px-6 py-4 text-slate-500">#{patient.id}</td>
                                     <td className="px-6 py-4 font-medium text-slate-900">{patient.name}</td>
@@ -84,6 +116,17 @@ export default function PatientList() {
                         )}
                     </tbody>
                 </table>
+
+                {nextCursor && !results && (
+                    <div className="p-4 border-t text-center">
+                        <button
+                            onClick={() => fetchPatients(nextCursor)}
+                            className="text-indigo-600 hover:text-indigo-800 font-medium text-sm"
+                        >
+                            Cargar más
+                        </button>
+                    </div>
+                )}
             </div>
 
             {showForm && (